@@ -0,0 +1,238 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BAR_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+
+# `preferred` where it holds a price and `fallback` where it is NaN (no price for that market this tick)
+def _coalesce(preferred, fallback):
+    if np.ndim(preferred) == 0:
+        return fallback if preferred != preferred else preferred
+    return np.where(np.isnan(preferred), fallback, preferred)
+
+
+# Closed bars for one timeframe in a fixed-size ring, one array per field. Prices are scalars (one market)
+# or 1-D arrays (one column per market); the arrays are sized from the first bar.
+class BarBuffer:
+
+    def __init__(self, interval, capacity=500):
+        self.interval = interval
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.ticks = np.zeros(capacity, dtype=np.int64)
+        self.fields = None
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, bar):
+        if self.fields is None:
+            shape = (self.capacity,) + np.shape(bar["Close"])
+            self.fields = {field: np.full(shape, np.nan) for field in BAR_FIELDS}
+        i = self._next
+        self.timestamps[i] = bar["Timestamp"]
+        self.ticks[i] = bar["Ticks"]
+        for field in BAR_FIELDS:
+            self.fields[field][i] = bar[field]
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def last(self):
+        if self._size == 0:
+            return None
+        i = (self._next - 1) % self.capacity
+        bar = {"Timestamp": int(self.timestamps[i]), "Ticks": int(self.ticks[i])}
+        for field in BAR_FIELDS:
+            bar[field] = self.fields[field][i].copy()
+        return bar
+
+    # Oldest-to-newest copies of the last n bars (all of them by default), keyed by field
+    def arrays(self, n=None):
+        order = (self._next - self._size + np.arange(self._size)) % self.capacity
+        if n is not None:
+            order = order[len(order) - min(n, len(order)):]
+        arrays = {"Timestamp": self.timestamps[order], "Ticks": self.ticks[order]}
+        for field in BAR_FIELDS:
+            arrays[field] = self.fields[field][order] if self.fields is not None else np.empty(0)
+        return arrays
+
+
+# Streaming OHLCV aggregation of price ticks into several timeframes at once.
+#
+# A bar closes once the watermark (newest tick time seen minus allowed_lateness) passes its end, so ticks
+# that arrive out of order or up to allowed_lateness seconds late still land in the right bar. Older ticks
+# are dropped and counted in `late_ticks`. With fill_gaps, buckets that got no ticks are emitted as flat
+# bars at the previous close so the signal stage sees an unbroken series.
+class TickAggregator:
+
+    def __init__(self, intervals=(900,), capacity=500, allowed_lateness=0, fill_gaps=False, on_bar=None):
+        self.intervals = tuple(sorted(intervals))
+        self.allowed_lateness = allowed_lateness
+        self.fill_gaps = fill_gaps
+        self.on_bar = on_bar
+        self.buffers = {interval: BarBuffer(interval, capacity) for interval in self.intervals}
+        self.late_ticks = 0
+        self._open = {interval: {} for interval in self.intervals}
+        self._closed_until = {interval: None for interval in self.intervals}
+        self._newest = None
+
+    @property
+    def watermark(self):
+        return None if self._newest is None else self._newest - self.allowed_lateness
+
+    # Feed one tick; returns the (interval, bar) pairs it closed, oldest first within each interval
+    def add(self, timestamp, price, volume=0.0):
+        if self._newest is None or timestamp > self._newest:
+            self._newest = timestamp
+        watermark = self._newest - self.allowed_lateness
+        closed = []
+        late = False
+        for interval in self.intervals:
+            bucket = int(timestamp // interval) * interval
+            closed_until = self._closed_until[interval]
+            if bucket + interval <= watermark or (closed_until is not None and bucket < closed_until):
+                late = True
+            else:
+                self._merge(self._open[interval], bucket, timestamp, price, volume)
+            self._close_through(interval, watermark, closed)
+        if late:
+            self.late_ticks += 1
+            logger.debug("Dropped late tick at %s (watermark %s).", timestamp, watermark)
+        return closed
+
+    def _merge(self, open_bars, bucket, timestamp, price, volume):
+        bar = open_bars.get(bucket)
+        if bar is None:
+            open_bars[bucket] = {"Timestamp": bucket, "Open": price, "High": price, "Low": price, "Close": price,
+                                 "Volume": volume, "Ticks": 1, "first": timestamp, "last": timestamp}
+            return
+        bar["High"] = np.fmax(bar["High"], price)
+        bar["Low"] = np.fmin(bar["Low"], price)
+        if timestamp < bar["first"]:
+            bar["Open"] = _coalesce(price, bar["Open"])
+            bar["first"] = timestamp
+        else:
+            bar["Open"] = _coalesce(bar["Open"], price)
+        if timestamp >= bar["last"]:
+            bar["Close"] = _coalesce(price, bar["Close"])
+            bar["last"] = timestamp
+        else:
+            bar["Close"] = _coalesce(bar["Close"], price)
+        bar["Volume"] = bar["Volume"] + volume
+        bar["Ticks"] += 1
+
+    def _close_through(self, interval, watermark, closed):
+        open_bars = self._open[interval]
+        for bucket in sorted(bucket for bucket in open_bars if bucket + interval <= watermark):
+            partial = open_bars.pop(bucket)
+            if self.fill_gaps:
+                self._fill_gap(interval, bucket, closed)
+            bar = {"Timestamp": bucket, "Open": partial["Open"], "High": partial["High"], "Low": partial["Low"],
+                   "Close": partial["Close"], "Volume": partial["Volume"], "Ticks": partial["Ticks"]}
+            self._emit(interval, bar, closed)
+
+    def _fill_gap(self, interval, bucket, closed):
+        previous = self.buffers[interval].last()
+        closed_until = self._closed_until[interval]
+        if previous is None or closed_until is None:
+            return
+        # A long outage only needs as many flat bars as the buffer holds
+        start = max(closed_until, bucket - self.buffers[interval].capacity * interval)
+        for missing in range(start, bucket, interval):
+            close = previous["Close"]
+            self._emit(interval, {"Timestamp": missing, "Open": close, "High": close, "Low": close, "Close": close,
+                                  "Volume": 0.0, "Ticks": 0}, closed)
+
+    def _emit(self, interval, bar, closed):
+        self.buffers[interval].append(bar)
+        self._closed_until[interval] = bar["Timestamp"] + interval
+        closed.append((interval, bar))
+        if self.on_bar is not None:
+            self.on_bar(interval, bar)
+
+    # The still-forming bar of a timeframe, if any ticks have arrived for it
+    def current(self, interval):
+        open_bars = self._open[interval]
+        if not open_bars:
+            return None
+        partial = open_bars[max(open_bars)]
+        return {field: partial[field] for field in ("Timestamp",) + BAR_FIELDS + ("Ticks",)}
+
+    def bars(self, interval, n=None):
+        return self.buffers[interval].arrays(n)
+
+
+# Read a recorded tick file: CSV with Timestamp (epoch seconds), Price and optionally Volume columns
+def read_ticks(path):
+    import pandas as pd
+
+    ticks = pd.read_csv(path)
+    volume = ticks["Volume"].to_numpy(dtype=np.float64) if "Volume" in ticks else np.zeros(len(ticks))
+    return ticks["Timestamp"].to_numpy(dtype=np.float64), ticks["Price"].to_numpy(dtype=np.float64), volume
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import tempfile
+
+    import pandas as pd
+
+    # Replay a recorded tick file (or a synthetic one) and check the bars against a pandas groupby
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        rng = np.random.default_rng(3)
+        timestamps = 1_700_000_000 + np.cumsum(rng.uniform(1, 9, 20000))
+        path = os.path.join(tempfile.mkdtemp(), "ticks.csv")
+        pd.DataFrame({
+            "Timestamp": timestamps,
+            "Price": 2000 + np.cumsum(rng.normal(0, 0.5, len(timestamps))),
+            "Volume": rng.uniform(0, 3, len(timestamps)),
+        }).to_csv(path, index=False)
+        print(f"No tick file given; replaying synthetic ticks from {path}")
+
+    timestamps, prices, volumes = read_ticks(path)
+    intervals = (60, 300, 900)
+
+    def expected_bars(interval):
+        frame = pd.DataFrame({"Timestamp": timestamps, "Price": prices, "Volume": volumes}).sort_values("Timestamp")
+        grouped = frame.groupby((frame["Timestamp"] // interval * interval).astype(np.int64))
+        bars = pd.DataFrame({
+            "Open": grouped["Price"].first(), "High": grouped["Price"].max(), "Low": grouped["Price"].min(),
+            "Close": grouped["Price"].last(), "Volume": grouped["Volume"].sum(), "Ticks": grouped["Price"].size(),
+        })
+        return bars.iloc[:-1]  # The newest bar is still open at the end of the replay
+
+    def replay(order, allowed_lateness):
+        aggregator = TickAggregator(intervals, capacity=len(timestamps), allowed_lateness=allowed_lateness)
+        for i in order:
+            aggregator.add(timestamps[i], prices[i], volumes[i])
+        return aggregator
+
+    def check(aggregator, label):
+        for interval in intervals:
+            bars = aggregator.bars(interval)
+            expected = expected_bars(interval)
+            np.testing.assert_array_equal(bars["Timestamp"], expected.index.to_numpy())
+            for field in ("Open", "High", "Low", "Close", "Volume", "Ticks"):
+                np.testing.assert_allclose(bars[field], expected[field].to_numpy(), rtol=1e-12)
+        print(f"{label}: {', '.join(f'{len(aggregator.buffers[i])} x {i}s' for i in intervals)} bars match")
+
+    in_order = np.argsort(timestamps, kind="stable")
+    check(replay(in_order, 0), "In-order replay")
+
+    # Deliver every tick up to 30s late in shuffled order; a 30s lateness allowance must give the same bars
+    delays = np.random.default_rng(5).uniform(0, 30, len(timestamps))
+    shuffled = np.argsort(timestamps + delays, kind="stable")
+    check(replay(shuffled, 30), "Out-of-order replay")
+
+    # Without the allowance some of those ticks arrive after their bar closed and are dropped
+    strict = replay(shuffled, 0)
+    assert strict.late_ticks > 0
+    print(f"Strict replay dropped {strict.late_ticks} late ticks.")
@@ -0,0 +1,208 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from signals import default_registry, threshold_signal
+from strategy import next_action, position_after
+
+
+# Load OHLCV candles from CSV or Parquet (at least Timestamp and Close columns, as written by initialize_historical_data)
+def load_candles(path):
+    if str(path).endswith((".parquet", ".pq")):
+        candles = pd.read_parquet(path)
+    else:
+        candles = pd.read_csv(path)
+    if "Timestamp" not in candles.columns:
+        candles = candles.rename(columns={candles.columns[0]: "Timestamp"})
+    return candles
+
+
+# generate_signals equivalent over a whole array: 1 long, -1 short, 0 neutral
+def compute_signals(rsi, long_threshold=41, short_threshold=60):
+    # NaN compares False on both sides, so the warm-up period is neutral just like np.where in the live code
+    return threshold_signal(rsi, long_threshold, short_threshold)
+
+
+# Vectorized version of the next_action/position_after state machine.
+# A position is opened by the first non-zero signal after a neutral bar and held until the signal
+# returns to 0, so inside each run of non-zero signals the position equals the run's first signal.
+def compute_positions(signals):
+    signals = np.asarray(signals, dtype=np.int8)
+    n = len(signals)
+    if n == 0:
+        return signals.copy()
+    previous = np.concatenate(([0], signals[:-1]))
+    run_start = (signals != 0) & (previous == 0)
+    start_index = np.where(run_start, np.arange(n), 0)
+    np.maximum.accumulate(start_index, out=start_index)
+    return np.where(signals != 0, signals[start_index], 0).astype(np.int8)
+
+
+# Reference implementation: step through the live loop's state machine one bar at a time
+def replay_live_loop(signals):
+    positions = np.zeros(len(signals), dtype=np.int8)
+    current_position = 0
+    for i, signal in enumerate(signals):
+        current_position = position_after(next_action(signal, current_position), current_position)
+        positions[i] = current_position
+    return positions
+
+
+# Simulate trades and mark-to-market equity for a position series.
+# Each trade uses open_percentage of current equity at `leverage`, and pays fee_rate on entry and exit
+# notional. Slippage moves every fill against the trade. The live loop closes (1 - close_percentage)
+# of the position value and then treats itself as flat, so the retained slice is closed with the rest.
+def simulate(timestamps, closes, positions, initial_equity=10000.0, leverage=5,
+             open_percentage=0.1, close_percentage=0.1, fee_rate=0.0006, slippage=0.0005):
+    closes = np.asarray(closes, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.int8)
+    n = len(closes)
+    previous = np.concatenate(([0], positions[:-1]))
+    entry_idx = np.flatnonzero((positions != 0) & (previous == 0))
+    exit_idx = np.flatnonzero((positions == 0) & (previous != 0))
+    is_open = len(exit_idx) < len(entry_idx)
+    # An open trade at the end of the data is marked at the last close
+    exit_marks = np.append(exit_idx, n - 1) if is_open else exit_idx
+
+    direction = positions[entry_idx].astype(np.float64)
+    entry_price = closes[entry_idx] * (1 + direction * slippage)
+    exit_price = closes[exit_marks] * (1 - direction * slippage)
+    exposure = open_percentage * leverage
+
+    trade_return = direction * (exit_price - entry_price) / entry_price
+    growth = exposure * (trade_return - fee_rate * (1 + exit_price / entry_price))
+    equity_after = initial_equity * np.concatenate(([1.0], np.cumprod(1 + growth)))
+    equity_before = equity_after[:-1]
+
+    # Per-bar equity: flat bars carry the equity after the last closed trade,
+    # bars in a position are marked to market against that trade's entry price
+    exit_mask = np.zeros(n, dtype=bool)
+    exit_mask[exit_idx] = True
+    entry_mask = np.zeros(n, dtype=bool)
+    entry_mask[entry_idx] = True
+    equity = equity_after[np.cumsum(exit_mask)]
+    in_position = positions != 0
+    trade_id = np.cumsum(entry_mask)[in_position] - 1
+    entry_for_bar = entry_price[trade_id]
+    equity[in_position] = equity_before[trade_id] * (
+        1 + exposure * (direction[trade_id] * (closes[in_position] - entry_for_bar) / entry_for_bar - fee_rate)
+    )
+
+    running_peak = np.maximum.accumulate(equity)
+    drawdown = 1 - equity / running_peak
+    timestamps = np.asarray(timestamps)
+    notional = equity_before * exposure
+    trades = pd.DataFrame({
+        "entry_time": timestamps[entry_idx],
+        "exit_time": timestamps[exit_marks],
+        "side": np.where(direction > 0, "long", "short"),
+        "entry_price": entry_price,
+        "exit_price": exit_price,
+        "size_usd": notional,
+        "close_size_usd": notional / leverage * (1 - close_percentage),
+        "pnl_usd": equity_before * growth,
+        "return_pct": trade_return * 100,
+        "open": np.arange(len(entry_idx)) == len(exit_idx),
+    })
+
+    wins = int((trades["pnl_usd"] > 0).sum())
+    return {
+        "initial_equity": initial_equity,
+        "final_equity": float(equity[-1]) if n else initial_equity,
+        "total_return_pct": (float(equity[-1]) / initial_equity - 1) * 100 if n else 0.0,
+        "max_drawdown_pct": float(drawdown.max()) * 100 if n else 0.0,
+        "num_trades": len(trades),
+        "win_rate_pct": wins / len(trades) * 100 if len(trades) else 0.0,
+        "equity": equity,
+        "trades": trades,
+    }
+
+
+# Backtest a registry strategy (by default the RSI one) over a candle DataFrame. Strategies reading
+# funding or open interest need those columns in `candles`, e.g. from signals.stats_columns().
+def run_backtest(candles, rsi_period=14, long_threshold=41, short_threshold=60, strategy="rsi", registry=None,
+                 **simulate_args):
+    registry = registry or default_registry(rsi_period=rsi_period, long_threshold=long_threshold,
+                                            short_threshold=short_threshold)
+    closes = candles["Close"].to_numpy(dtype=np.float64)
+    columns = {name: candles[name].to_numpy(dtype=np.float64) for name in registry.columns([strategy]) if name in candles}
+    signals = registry.compute(columns, [strategy])[strategy]
+    positions = compute_positions(signals)
+    return simulate(candles["Timestamp"].to_numpy(), closes, positions, **simulate_args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest a signal strategy (RSI by default) on local OHLCV candles")
+    parser.add_argument("path", nargs="?", help="CSV or Parquet file with Timestamp and Close columns")
+    parser.add_argument("--strategy", default="rsi",
+                        help="Signal from signals.default_registry(): rsi, ema_cross, bollinger, funding, open_interest, rsi_funding")
+    parser.add_argument("--stats-root", help="StatsSnapshotStore directory supplying funding/open-interest columns")
+    parser.add_argument("--rsi-period", type=int, default=14)
+    parser.add_argument("--long-threshold", type=float, default=41)
+    parser.add_argument("--short-threshold", type=float, default=60)
+    parser.add_argument("--leverage", type=float, default=5)
+    parser.add_argument("--open-percentage", type=float, default=0.1)
+    parser.add_argument("--close-percentage", type=float, default=0.1)
+    parser.add_argument("--fee-rate", type=float, default=0.0006)
+    parser.add_argument("--slippage", type=float, default=0.0005)
+    parser.add_argument("--initial-equity", type=float, default=10000.0)
+    parser.add_argument("--trades-csv", help="Optional path to write the trade list")
+    parser.add_argument("--check", action="store_true",
+                        help="Check compute_positions against replay_live_loop on random signal sequences and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        rng = np.random.default_rng(3)
+        for trial in range(2000):
+            length = int(rng.integers(0, 300))
+            # Mix flickering signals with long runs, so flips without a neutral bar and runs ending at the data's
+            # edge both come up
+            if trial % 2:
+                signals = rng.choice(np.array([-1, 0, 1], dtype=np.int8), size=length, p=rng.dirichlet([1, 1, 1]))
+            else:
+                signals = np.repeat(rng.integers(-1, 2, size=length).astype(np.int8), rng.integers(1, 20, size=length))
+            expected = replay_live_loop(signals)
+            got = compute_positions(signals)
+            assert np.array_equal(got, expected), f"trial {trial}: {signals.tolist()} -> {got.tolist()} != {expected.tolist()}"
+        print("compute_positions matches the live loop's state machine on 2000 random signal sequences.")
+        raise SystemExit(0)
+    if not args.path:
+        parser.error("the following arguments are required: path")
+
+    print(f"Loading candles from {args.path}...")
+    candles = load_candles(args.path)
+    print(f"Loaded {len(candles)} candles.")
+    if args.stats_root:
+        from signals import stats_columns
+        from stats_store import StatsSnapshotStore
+
+        timestamps = candles["Timestamp"]
+        if not pd.api.types.is_numeric_dtype(timestamps):
+            timestamps = (pd.to_datetime(timestamps, utc=True) - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+        candles = candles.assign(**stats_columns(StatsSnapshotStore(args.stats_root), timestamps.to_numpy()))
+
+    started = time.perf_counter()
+    report = run_backtest(
+        candles,
+        rsi_period=args.rsi_period,
+        long_threshold=args.long_threshold,
+        short_threshold=args.short_threshold,
+        strategy=args.strategy,
+        initial_equity=args.initial_equity,
+        leverage=args.leverage,
+        open_percentage=args.open_percentage,
+        close_percentage=args.close_percentage,
+        fee_rate=args.fee_rate,
+        slippage=args.slippage,
+    )
+    elapsed = time.perf_counter() - started
+
+    print(f"Backtest completed in {elapsed:.3f}s")
+    print(f"Trades: {report['num_trades']}, win rate: {report['win_rate_pct']:.1f}%")
+    print(f"Final equity: ${report['final_equity']:.2f} ({report['total_return_pct']:.2f}%)")
+    print(f"Max drawdown: {report['max_drawdown_pct']:.2f}%")
+    if args.trades_csv:
+        report["trades"].to_csv(args.trades_csv, index=False)
+        print(f"Trade list written to {args.trades_csv}")
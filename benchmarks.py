@@ -0,0 +1,801 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+
+# Offline benchmarks for the bot's hot paths.
+#
+# The GMX SDK is replaced by in-process stubs and every HTTP/RPC request the bot makes is answered
+# by FixtureAdapter, so nothing here touches the network. Results are written as JSON and can be
+# compared against a stored baseline to catch regressions:
+#
+#   python benchmarks.py --output baseline.json
+#   python benchmarks.py --baseline baseline.json --max-regression 0.25
+#
+# numpy and pandas are imported where they are used, so the startup probe measures the bot's own imports.
+
+RPC_URL = "http://rpc.bench.invalid"
+ORACLE_URL = "https://arbitrum-api.gmxinfra.io/signed_prices/latest"
+WALLET_ADDRESS = "0x" + "11" * 20
+ETH_ADDRESS = "0x82aF49447D8a07e3bd95BD0d56f35241523fBab1"
+USDC_ADDRESS = "0xaf88d065e77c8cC2239327C5EDb3A432268e5831"
+ETH_MARKET_ADDRESS = "0x70d95587d40A2caf56bd97485aB3Eec10Bee6336"
+ETH_USD = 3000.0
+LARGE_PAYLOAD_TOKENS = 2000
+STATS_SYMBOLS = ("ETH", "BTC", "SOL", "ARB", "LINK", "DOGE", "AVAX", "UNI")
+BALANCE_WEI = 2 * 10 ** 18
+
+logger = logging.getLogger(__name__)
+
+
+# One entry of the GMX signed-prices API; prices are scaled to 30 - token decimals like the real feed
+def _signed_price(rng, address, symbol, price, decimals=18):
+    scale = 10 ** (30 - decimals)
+    min_price = int(price * 0.9995 * scale)
+    max_price = int(price * 1.0005 * scale)
+    block = int(rng.integers(2e8, 3e8))
+    return {
+        "id": rng.bytes(12).hex(),
+        "minBlockNumber": block,
+        "minBlockHash": "0x" + rng.bytes(32).hex(),
+        "oracleDecimals": 30 - decimals,
+        "tokenSymbol": symbol,
+        "tokenAddress": address,
+        "minPrice": None,
+        "maxPrice": None,
+        "signer": "0x" + rng.bytes(20).hex(),
+        "signature": "0x" + rng.bytes(65).hex(),
+        "signatureWithoutBlockHash": "0x" + rng.bytes(65).hex(),
+        "createdAt": "2024-01-01T00:00:00.000Z",
+        "minBlockTimestamp": 1704067200,
+        "oracleKeeperKey": "realtimeFeed",
+        "maxBlockTimestamp": 1704067200,
+        "maxBlockNumber": block,
+        "maxBlockHash": "0x" + rng.bytes(32).hex(),
+        "maxPriceFull": str(max_price),
+        "minPriceFull": str(min_price),
+        "oracleKeeperRecordId": None,
+        "oracleKeeperFetchJobId": None,
+        "oracleKeeperFetchJobRecordId": None,
+    }
+
+
+# Oracle payload with n_tokens entries, USDC (the collateral) first; ETH is listed last so a scan by
+# symbol pays the full cost
+def make_oracle_payload(n_tokens=90, eth_price=ETH_USD, seed=0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    entries = [_signed_price(rng, USDC_ADDRESS, "USDC", 1.0, decimals=6)]
+    entries += [
+        _signed_price(rng, "0x" + rng.bytes(20).hex(), f"TKN{i}", float(rng.uniform(0.01, 5000)))
+        for i in range(n_tokens - 2)
+    ]
+    entries.append(_signed_price(rng, ETH_ADDRESS, "ETH", eth_price))
+    return {"signedPrices": entries}
+
+
+def make_markets():
+    return {
+        ETH_MARKET_ADDRESS: {
+            "gmx_market_address": ETH_MARKET_ADDRESS,
+            "market_symbol": "ETH",
+            "index_token_address": ETH_ADDRESS,
+            "long_token_address": ETH_ADDRESS,
+            "short_token_address": USDC_ADDRESS,
+            "market_metadata": {"symbol": "ETH", "decimals": 18},
+            "long_token_metadata": {"symbol": "ETH", "decimals": 18},
+            "short_token_metadata": {"symbol": "USDC", "decimals": 6},
+        }
+    }
+
+
+# 15m candles ending at the last closed candle, drifting down at the end so RSI sits in the long zone
+def write_candle_fixture(path, bars=2880, interval=900, seed=0):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    end = int(time.time() // interval) * interval - interval
+    timestamps = pd.to_datetime(np.arange(end - (bars - 1) * interval, end + 1, interval), unit="s", utc=True)
+    drift = np.where(np.arange(bars) >= bars - 60, -4.0, 0.0)
+    closes = ETH_USD + np.cumsum(rng.normal(0, 5, bars) + drift)
+    pd.DataFrame({
+        "Datetime": timestamps,
+        "Open": closes,
+        "High": closes + 2,
+        "Low": closes - 2,
+        "Close": closes,
+        "Volume": rng.uniform(1e6, 5e6, bars),
+    }).to_csv(path, index=False)
+    return path
+
+
+# Answers the bot's HTTP traffic from fixtures: GMX oracle, CoinGecko and JSON-RPC (single or batch)
+class FixtureAdapter(BaseAdapter):
+
+    def __init__(self, oracle_payload, eth_usd=ETH_USD, balance_wei=BALANCE_WEI, chain_id=42161):
+        super().__init__()
+        self.oracle_body = json.dumps(oracle_payload).encode()
+        self.coingecko_body = json.dumps({"ethereum": {"usd": eth_usd}}).encode()
+        self.rpc_results = {
+            "eth_getBalance": hex(balance_wei),
+            "eth_chainId": hex(chain_id),
+            "eth_blockNumber": hex(250_000_000),
+            "eth_gasPrice": hex(10 ** 7),
+        }
+
+    def _rpc(self, payload):
+        if isinstance(payload, list):
+            return [self._rpc(request) for request in payload]
+        return {"jsonrpc": "2.0", "id": payload.get("id"), "result": self.rpc_results.get(payload.get("method"))}
+
+    def send(self, request, **kwargs):
+        host = urlparse(request.url).netloc
+        if "gmxinfra" in host:
+            body = self.oracle_body
+        elif "coingecko" in host:
+            body = self.coingecko_body
+        else:
+            body = json.dumps(self._rpc(json.loads(request.body))).encode()
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        response._content = body
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+# Minimal stand-ins for the GMX SDK modules the bot imports. Orders follow the SDK's flow:
+# the constructor calls order_builder(), which determines gas limits and submits the transaction.
+def install_sdk_stubs(markets=None, oracle_url=ORACLE_URL):
+    markets = markets if markets is not None else make_markets()
+
+    class ConfigManager:
+
+        def __init__(self, chain):
+            self.chain = chain
+            self.rpc = None
+            self.user_wallet_address = None
+
+        def set_config(self, filepath=None):
+            self.rpc = RPC_URL
+            self.user_wallet_address = WALLET_ADDRESS
+
+    class _Getter:
+
+        def __init__(self, config):
+            self.value = config
+
+        def call(self):
+            return self.value
+
+    class _Eth:
+
+        def get_block(self, block):
+            return {"number": 250_000_000, "baseFeePerGas": 10 ** 7}
+
+    def create_connection(config):
+        return types.SimpleNamespace(eth=_Eth())
+
+    def get_datastore_contract(config):
+        return types.SimpleNamespace(address="0xFD70de6b91282D8017aA4E741e9Ae325CAb992d8")
+
+    def get_gas_limits(datastore):
+        limits = {
+            "deposit": 1_800_000, "withdraw": 1_500_000, "single_swap": 1_000_000, "swap_order": 2_000_000,
+            "increase_order": 3_000_000, "decrease_order": 3_000_000,
+            "estimated_fee_base_gas_limit": 500_000, "estimated_fee_multiplier_factor": 10 ** 30,
+        }
+        return {key: _Getter(value) for key, value in limits.items()}
+
+    class Order:
+
+        _gas_limits_key = None
+
+        def __init__(self, config, market_key, collateral_address, index_token_address, is_long, size_delta,
+                     initial_collateral_delta_amount, slippage_percent, swap_path, max_fee_per_gas=None,
+                     auto_cancel=False, debug_mode=False, execution_buffer=1.3):
+            self.config = config
+            self.market_key = market_key
+            self.collateral_address = collateral_address
+            self.index_token_address = index_token_address
+            self.is_long = is_long
+            self.size_delta = size_delta
+            self.initial_collateral_delta_amount = initial_collateral_delta_amount
+            self.slippage_percent = slippage_percent
+            self.swap_path = swap_path
+            self.max_fee_per_gas = max_fee_per_gas
+            self.auto_cancel = auto_cancel
+            self.debug_mode = debug_mode
+            self.execution_buffer = execution_buffer
+            self._gas_limits = {}
+            self._gas_limits_order_type = None
+
+        def determine_gas_limits(self):
+            self._gas_limits = get_gas_limits(get_datastore_contract(self.config))
+            self._gas_limits_order_type = self._gas_limits[self._gas_limits_key]
+
+        def order_builder(self, is_open=False, is_close=False, is_swap=False):
+            self.determine_gas_limits()
+            max_fee_per_gas = self.max_fee_per_gas or create_connection(self.config).eth.get_block("latest")["baseFeePerGas"] * 1.35
+            execution_fee = int(self._gas_limits_order_type.call() * max_fee_per_gas * self.execution_buffer)
+            arguments = (
+                (self.config.user_wallet_address, self.config.user_wallet_address, "0x" + "00" * 20,
+                 "0x" + "00" * 20, self.market_key, self.collateral_address, self.swap_path),
+                (self.size_delta, self.initial_collateral_delta_amount, 0, 0, execution_fee, 0, 0),
+                2 if is_open else 4, 0, self.is_long, False, b"\x00" * 32,
+            )
+            self._submit_transaction(self.config.user_wallet_address, execution_fee, [arguments], self._gas_limits)
+
+        def _submit_transaction(self, user_wallet_address, value_amount, multicall_args, gas_limits):
+            self.submitted = multicall_args
+
+    class IncreaseOrder(Order):
+        _gas_limits_key = "increase_order"
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.order_builder(is_open=True)
+
+    class DecreaseOrder(Order):
+        _gas_limits_key = "decrease_order"
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.order_builder(is_close=True)
+
+    class SwapOrder(Order):
+        pass
+
+    class OrderArgumentParser:
+
+        def __init__(self, config, is_increase=False, is_decrease=False, is_swap=False):
+            self.config = config
+
+    class OraclePrices:
+
+        def __init__(self, chain):
+            self.chain = chain
+            self.oracle_url = {"arbitrum": oracle_url, "avalanche": oracle_url}
+
+        def get_recent_prices(self):
+            return self._process_output(self._make_query().json())
+
+        def _make_query(self):
+            return requests.get(self.oracle_url[self.chain])
+
+        def _process_output(self, output):
+            return {entry["tokenAddress"]: entry for entry in output["signedPrices"]}
+
+    class Markets:
+
+        def __init__(self, config):
+            self.config = config
+
+        def get_available_markets(self):
+            return markets
+
+    # Shaped like the SDK's stats output: per-side values keyed by market symbol, plus the parameter name
+    class StatsGetter:
+
+        calls = 0
+
+        def __init__(self, config):
+            self.config = config
+
+        def get_data(self, to_csv=False, to_json=False):
+            StatsGetter.calls += 1
+            return {
+                "long": {symbol: 0.01 * i + 1e-4 * StatsGetter.calls for i, symbol in enumerate(STATS_SYMBOLS)},
+                "short": {symbol: 0.02 * i + 1e-4 * StatsGetter.calls for i, symbol in enumerate(STATS_SYMBOLS)},
+                "parameter": type(self).__name__,
+            }
+
+        get_pool_balances = get_price_traders = get_data
+
+        def get_glv_stats(self):
+            return {}
+
+    # The benchmark wallet holds no positions, so reconciliation on start finds nothing to change
+    class GetOpenPositions:
+
+        def __init__(self, config, address):
+            self.config = config
+            self.address = address
+
+        def get_data(self):
+            return {}
+
+    root = "gmx_python_sdk.scripts.v2"
+    modules = {
+        "gmx_python_sdk": {},
+        "gmx_python_sdk.scripts": {},
+        root: {},
+        f"{root}.gmx_utils": {"ConfigManager": ConfigManager, "create_connection": create_connection,
+                              "get_datastore_contract": get_datastore_contract},
+        f"{root}.gas_utils": {"get_gas_limits": get_gas_limits},
+        f"{root}.order": {},
+        f"{root}.order.create_increase_order": {"IncreaseOrder": IncreaseOrder},
+        f"{root}.order.create_decrease_order": {"DecreaseOrder": DecreaseOrder},
+        f"{root}.order.create_swap_order": {"SwapOrder": SwapOrder},
+        f"{root}.order.order_argument_parser": {"OrderArgumentParser": OrderArgumentParser},
+        f"{root}.get": {},
+        f"{root}.get.get_available_liquidity": {"GetAvailableLiquidity": StatsGetter},
+        f"{root}.get.get_borrow_apr": {"GetBorrowAPR": StatsGetter},
+        f"{root}.get.get_claimable_fees": {"GetClaimableFees": StatsGetter},
+        f"{root}.get.get_contract_balance": {"GetPoolTVL": StatsGetter},
+        f"{root}.get.get_funding_apr": {"GetFundingFee": StatsGetter},
+        f"{root}.get.get_gm_prices": {"GMPrices": StatsGetter},
+        f"{root}.get.get_markets": {"Markets": Markets},
+        f"{root}.get.get_open_interest": {"OpenInterest": StatsGetter},
+        f"{root}.get.get_open_positions": {"GetOpenPositions": GetOpenPositions},
+        f"{root}.get.get_oracle_prices": {"OraclePrices": OraclePrices},
+        f"{root}.get.get_pool_tvl": {"GetPoolTVL": StatsGetter},
+        f"{root}.get.get_glv_stats": {"GlvStats": StatsGetter},
+    }
+    for name, attributes in modules.items():
+        module = types.ModuleType(name)
+        module.__path__ = []
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+
+# Point the bot at the SDK stubs and answer the shared HTTP session from FixtureAdapter
+def prepare_environment(adapter):
+    install_sdk_stubs()
+    os.environ["RPC_URL"] = RPC_URL
+    os.environ["WALLET_ADDRESS"] = WALLET_ADDRESS
+    os.environ.setdefault("LOG_LEVEL", "OFF")
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    if repo_dir not in sys.path:
+        sys.path.insert(0, repo_dir)  # The benchmarks run from a scratch directory
+    from http_pool import get_session
+
+    session = get_session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def load_bot(adapter, snapshot_path=None):
+    prepare_environment(adapter)
+    import bot
+
+    bot.start(snapshot_path=snapshot_path or bot.MARKET_SNAPSHOT_PATH)
+    return bot
+
+
+# Run in a fresh interpreter: time `import bot`, then bot.start() with the market snapshot already on disk
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import bot
+imported = time.perf_counter()
+import benchmarks
+with open(sys.argv[1]) as f:
+    benchmarks.prepare_environment(benchmarks.FixtureAdapter(json.load(f)))
+ready = time.perf_counter()
+bot.start()
+print(json.dumps({"import_bot": imported - started, "warm_start": time.perf_counter() - ready}))
+"""
+
+
+# Startup timings from `iterations` fresh interpreters, summarized like measure() (no allocation data)
+def measure_startup(workdir, oracle_payload, iterations=10):
+    import numpy as np
+
+    payload_path = os.path.join(workdir, "oracle.json")
+    with open(payload_path, "w") as f:
+        json.dump(oracle_payload, f)
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo_dir, os.environ.get("PYTHONPATH")])))
+    samples = {"import_bot": [], "warm_start": []}
+    for _ in range(iterations):
+        output = subprocess.run([sys.executable, "-c", STARTUP_PROBE, payload_path], cwd=workdir, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        for name, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            samples[name].append(seconds)
+
+    results = {}
+    for name, values in samples.items():
+        values = np.array(values)
+        results[name] = {
+            "iterations": iterations,
+            "mean": float(values.mean()),
+            "min": float(values.min()),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99)),
+            "max": float(values.max()),
+            "alloc_peak_bytes": None,
+            "alloc_retained_bytes": None,
+        }
+    return results
+
+
+FEED_PROBE = """
+import json, sys, time
+import numpy as np
+from market_feed import MarketFeedReader
+reader = MarketFeedReader(sys.argv[1], max_age=3600)
+reads = int(sys.argv[3])
+while time.time() < float(sys.argv[2]):  # Start together once every consumer is up
+    time.sleep(0.001)
+samples = np.empty(reads)
+started = time.perf_counter()
+for i in range(reads):
+    before = time.perf_counter()
+    reader.price("ETH")
+    samples[i] = time.perf_counter() - before
+elapsed = time.perf_counter() - started
+print(json.dumps({"p50": float(np.percentile(samples, 50)), "p99": float(np.percentile(samples, 99)),
+                  "reads_per_second": reads / elapsed, "retries": reader.retried}))
+"""
+
+
+# Shared-feed readers in separate processes, `consumers` at a time, while the writer republishes
+# prices every millisecond (so reads regularly hit an update in progress and a changed version)
+def measure_feed_scaling(workdir, consumers=(1, 8, 32), reads=20000):
+    import numpy as np
+
+    from market_feed import MarketFeedWriter
+    from price_table import OraclePriceTable
+
+    path = os.path.join(workdir, "market_feed.bin")
+    writer = MarketFeedWriter(path)
+    table = OraclePriceTable.from_payload({entry["tokenAddress"]: entry for entry in make_oracle_payload()["signedPrices"]})
+    writer.publish_prices(table)
+    stop = threading.Event()
+
+    def publish():
+        while not stop.wait(0.001):
+            writer.publish_prices(table)
+
+    publisher = threading.Thread(target=publish, daemon=True)
+    publisher.start()
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo_dir, os.environ.get("PYTHONPATH")])))
+    results = {}
+    try:
+        for count in consumers:
+            go = time.time() + 1 + 0.1 * count
+            readers = [subprocess.Popen([sys.executable, "-c", FEED_PROBE, path, str(go), str(reads)], cwd=workdir,
+                                        env=env, stdout=subprocess.PIPE, text=True) for _ in range(count)]
+            outputs = [json.loads(reader.communicate()[0].strip().splitlines()[-1]) for reader in readers]
+            results[str(count)] = {
+                "consumers": count,
+                "p50": float(np.median([output["p50"] for output in outputs])),
+                "p99": float(max(output["p99"] for output in outputs)),
+                "reads_per_second": float(sum(output["reads_per_second"] for output in outputs)),
+                "retries": int(sum(output["retries"] for output in outputs)),
+            }
+    finally:
+        stop.set()
+        publisher.join()
+        writer.close()
+    return results
+
+
+# Stored candles carry pandas Timestamps, scheduler candles carry epoch seconds
+def _epoch_seconds(timestamp):
+    import pandas as pd
+
+    if isinstance(timestamp, pd.Timestamp):
+        return int(timestamp.timestamp())
+    return int(timestamp)
+
+
+# One candle of the live loop on a simulated clock: a candle's ticks, its close, signal, order
+def simulated_iteration(bot, engine, poll_interval=5, candle_interval=900):
+    from scheduler import TradingScheduler
+
+    bot.current_position = 0  # Flat again, so every iteration opens a position
+    # Start on a candle boundary: the scheduler skips a candle it joined partway through
+    now = [_epoch_seconds(engine.last_timestamp) + candle_interval]
+
+    async def sleep(seconds):
+        now[0] += seconds
+        await asyncio.sleep(0)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+
+        def execute_signal(signal, price, wallet_balance_usd):
+            try:
+                return bot.handle_signal(signal, price, wallet_balance_usd)
+            finally:
+                loop.call_soon_threadsafe(scheduler.stop)
+
+        scheduler = TradingScheduler(
+            fetch_price=bot.fetch_market_data,
+            engine=engine,
+            execute_signal=execute_signal,
+            candle_interval=candle_interval,
+            poll_interval=poll_interval,
+            clock=lambda: now[0],
+            sleep=sleep,
+        )
+        # The balance refresher's first read, done up front so the order always has a balance
+        scheduler.wallet_balance_usd = await loop.run_in_executor(None, bot.get_wallet_balance)
+        await scheduler.run()
+
+    asyncio.run(main())
+
+
+def build_benchmarks(bot, fixture_path):
+    import numpy as np
+
+    from candle_store import CandleStore, FileSource
+    from indicators import IndicatorEngine
+    from market_feed import MarketFeedReader, MarketFeedWriter
+    from price_table import OraclePriceTable
+    from signals import FUNDING_COLUMNS, OPEN_INTEREST_COLUMNS, default_registry
+    from ta_numpy import load_ta
+
+    oracle_prices = {entry["tokenAddress"]: entry for entry in make_oracle_payload()["signedPrices"]}
+    large_prices = {entry["tokenAddress"]: entry for entry in make_oracle_payload(LARGE_PAYLOAD_TOKENS)["signedPrices"]}
+    large_table = OraclePriceTable.from_payload(large_prices)
+    large_addresses = list(large_prices)
+    source = FileSource(fixture_path)
+    historical_data = bot.initialize_historical_data(source=source)
+
+    feed_writer = MarketFeedWriter(os.path.abspath("market_feed_bench.bin"))
+    feed_writer.publish_prices(OraclePriceTable.from_payload(oracle_prices))
+    feed_writer.publish_candles("ETH-USD", CandleStore().load_arrays("ETH-USD", "15m"))
+    feed_reader = MarketFeedReader(feed_writer.path, max_age=3600)
+
+    def seeded_engine(registry=None):
+        engine = IndicatorEngine(rsi_period=14, volume_ma_period=200, long_threshold=41, short_threshold=60,
+                                 registry=registry)
+        engine.seed(historical_data)
+        return engine
+
+    signal_engine = seeded_engine()
+    update_engine = seeded_engine()
+    # The bot's engine computes its strategy from the registry on each candle
+    registry_engine = seeded_engine(default_registry())
+    loop_engine = seeded_engine(default_registry())
+    step = [_epoch_seconds(update_engine.last_timestamp)]
+
+    def engine_update(engine=update_engine):
+        step[0] += 900
+        engine.update(step[0], ETH_USD, 2e6)
+
+    # Every default strategy over the engine's 200-bar window, funding/open interest included
+    window = {"Close": historical_data["Close"].to_numpy(dtype=np.float64),
+              "Volume": historical_data["Volume"].to_numpy(dtype=np.float64)}
+    for name in FUNDING_COLUMNS + OPEN_INTEREST_COLUMNS:
+        window[name] = np.full(len(window["Close"]), 1e7 if name.startswith("OI") else 0.0)
+    registries = {backend: default_registry(ta=load_ta(backend)) for backend in ("talib", "numpy")}
+
+    # name -> (callable, default iterations)
+    return {
+        "generate_signals": (lambda: bot.generate_signals(signal_engine), 2000),
+        "engine_update": (engine_update, 2000),
+        "engine_update_registry": (lambda: engine_update(registry_engine), 2000),
+        "signal_registry_talib": (lambda: registries["talib"].compute(window), 2000),
+        "signal_registry_numpy": (lambda: registries["numpy"].compute(window), 2000),
+        "get_eth_prices": (lambda: bot.get_eth_prices(oracle_prices), 2000),
+        "oracle_scan_large": (lambda: bot.get_eth_prices(large_prices), 500),
+        "oracle_table_lookup_large": (lambda: large_table.prices("ETH"), 2000),
+        "oracle_table_build_large": (lambda: OraclePriceTable.from_payload(large_prices), 100),
+        "oracle_parse_all_large": (lambda: [bot.parse_oracle_entry(entry) for entry in large_prices.values()], 100),
+        "oracle_table_mid_all_large": (lambda: large_table.mid_prices(large_addresses), 100),
+        "fetch_market_data": (bot.fetch_market_data, 2000),
+        "feed_price": (lambda: feed_reader.price("ETH"), 2000),
+        "feed_candles_200": (lambda: feed_reader.candles("ETH-USD", 200), 2000),
+        "risk_open_size": (lambda: bot.risk.open_size("ETH", is_long=True), 2000),
+        "get_wallet_balance": (bot.get_wallet_balance, 500),
+        "journal_record_signal": (lambda: bot.journal.record_signal({"ETH": 1}, 0), 2000),
+        "initialize_historical_data": (lambda: bot.initialize_historical_data(source=source), 100),
+        "open_position": (lambda: bot.open_position(is_long=True, eth_price=ETH_USD, leverage=bot.LEVERAGE,
+                                                    size_delta_usd=100.0, percentage=bot.ORDER_PERCENTAGE), 500),
+        "close_position": (lambda: bot.close_position(is_long=True, eth_price=ETH_USD, size_delta_usd=90.0,
+                                                      percentage=bot.ORDER_PERCENTAGE), 500),
+        "run_trading_bot_iteration": (lambda: simulated_iteration(bot, loop_engine), 50),
+    }
+
+
+# Bytes still allocated after build() returns, i.e. what keeping its result around costs
+def retained_bytes(build):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+    return retained
+
+
+# Memory held by the parsed oracle payload (address -> entry dicts) versus the OraclePriceTable built from it
+def measure_footprints(n_tokens=LARGE_PAYLOAD_TOKENS):
+    from price_table import OraclePriceTable
+
+    body = json.dumps(make_oracle_payload(n_tokens))
+
+    def payload_dict():
+        return {entry["tokenAddress"]: entry for entry in json.loads(body)["signedPrices"]}
+
+    return {
+        "oracle_payload_dict": retained_bytes(payload_dict),
+        "oracle_price_table": retained_bytes(lambda: OraclePriceTable.from_payload(payload_dict())),
+        "tokens": n_tokens,
+    }
+
+
+# Per-call latency percentiles from a timed pass, then allocations from a separate tracemalloc pass
+def measure(func, iterations, warmup=5, alloc_iterations=20):
+    import numpy as np
+
+    for _ in range(warmup):
+        func()
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples[i] = time.perf_counter() - started
+
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(alloc_iterations, iterations)):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func()
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "mean": float(samples.mean()),
+        "min": float(samples.min()),
+        "p50": float(np.percentile(samples, 50)),
+        "p95": float(np.percentile(samples, 95)),
+        "p99": float(np.percentile(samples, 99)),
+        "max": float(samples.max()),
+        "alloc_peak_bytes": int(np.median(peaks)),
+        "alloc_retained_bytes": int(np.median(retained)),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(names=None, iteration_scale=1.0):
+    import numpy as np
+    import pandas as pd
+
+    workdir = tempfile.mkdtemp(prefix="acid-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # CandleStore writes under ./data/candles, the market snapshot under ./data
+    try:
+        oracle_payload = make_oracle_payload()
+        bot = load_bot(FixtureAdapter(oracle_payload))
+        benchmarks = build_benchmarks(bot, write_candle_fixture(os.path.join(workdir, "ETH-USD_15m.csv")))
+        results = {}
+        for name, (func, iterations) in benchmarks.items():
+            if names and name not in names:
+                continue
+            results[name] = measure(func, max(1, int(iterations * iteration_scale)))
+            logger.debug("%s: %s", name, results[name])
+        if not names or {"import_bot", "warm_start"} & set(names):
+            startup = measure_startup(workdir, oracle_payload, max(1, int(10 * iteration_scale)))
+            results.update((name, result) for name, result in startup.items() if not names or name in names)
+        footprints = measure_footprints()
+        feed_scaling = None
+        if not names or "feed_scaling" in names:
+            feed_scaling = measure_feed_scaling(workdir, reads=max(1000, int(20000 * iteration_scale)))
+    finally:
+        os.chdir(cwd)
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+        },
+        "benchmarks": results,
+        "footprints": footprints,
+        "feed_scaling": feed_scaling,
+    }
+
+
+# Benchmarks whose `stat` grew by more than max_regression (a fraction) relative to the baseline
+def compare(results, baseline, max_regression=0.2, stat="p50"):
+    rows = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None:
+            continue
+        change = current[stat] / previous[stat] - 1 if previous[stat] else 0.0
+        rows.append((name, previous[stat], current[stat], change, change > max_regression))
+    return rows
+
+
+def _format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+
+def print_results(results):
+    print(f"{'benchmark':<28}{'p50':>10}{'p95':>10}{'p99':>10}{'peak alloc':>14}")
+    for name, result in results["benchmarks"].items():
+        peak = "-" if result["alloc_peak_bytes"] is None else f"{result['alloc_peak_bytes'] / 1024:.1f}kB"
+        print(f"{name:<28}{_format_seconds(result['p50']):>10}{_format_seconds(result['p95']):>10}"
+              f"{_format_seconds(result['p99']):>10}{peak:>14}")
+    footprints = results.get("footprints")
+    if footprints:
+        print(f"Retained memory for {footprints['tokens']} oracle prices: "
+              f"payload dict {footprints['oracle_payload_dict'] / 1024:.1f}kB, "
+              f"OraclePriceTable {footprints['oracle_price_table'] / 1024:.1f}kB")
+    feed_scaling = results.get("feed_scaling")
+    if feed_scaling:
+        print(f"{'feed consumers':<28}{'p50':>10}{'p99':>10}{'reads/s':>14}{'retries':>10}")
+        for row in feed_scaling.values():
+            print(f"{row['consumers']:<28}{_format_seconds(row['p50']):>10}{_format_seconds(row['p99']):>10}"
+                  f"{row['reads_per_second']:>14,.0f}{row['retries']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the trading bot's hot paths")
+    parser.add_argument("--only", help="Comma-separated benchmark names to run")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every benchmark's iteration count")
+    parser.add_argument("--output", help="Write results to this JSON file (e.g. to store a new baseline)")
+    parser.add_argument("--baseline", help="Compare against a stored results JSON file")
+    parser.add_argument("--stat", default="p50", choices=("mean", "p50", "p95", "p99"), help="Statistic to compare")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Fail when a benchmark is slower than the baseline by more than this fraction")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only.split(",") if args.only else None, args.scale)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.max_regression, args.stat)
+        print(f"\nCompared with {args.baseline} ({args.stat}, max regression {args.max_regression:.0%}):")
+        for name, previous, current, change, regressed in rows:
+            print(f"{name:<28}{_format_seconds(previous):>10} -> {_format_seconds(current):>10}  "
+                  f"{change:+.1%}{'  REGRESSION' if regressed else ''}")
+        if any(regressed for *_, regressed in rows):
+            sys.exit(1)
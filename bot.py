@@ -1,373 +1,679 @@
-# Download and extract TA-Lib libraries
-print("Downloading and extracting TA-Lib libraries...")
-url = 'https://anaconda.org/conda-forge/libta-lib/0.4.0/download/linux-64/libta-lib-0.4.0-h166bdaf_1.tar.bz2'
-!curl -L $url | tar xj -C /usr/lib/x86_64-linux-gnu/ lib --strip-components=1
-url = 'https://anaconda.org/conda-forge/ta-lib/0.4.19/download/linux-64/ta-lib-0.4.19-py310hde88566_4.tar.bz2'
-!curl -L $url | tar xj -C /usr/local/lib/python3.10/dist-packages/ lib/python3.10/site-packages/talib --strip-components=3
-print("TA-Lib libraries downloaded and extracted.")
-
-from gmx_python_sdk.scripts.v2.gmx_utils import ConfigManager
-from gmx_python_sdk.scripts.v2.order.create_increase_order import IncreaseOrder
-from gmx_python_sdk.scripts.v2.order.create_decrease_order import DecreaseOrder
-from gmx_python_sdk.scripts.v2.order.create_swap_order import SwapOrder
-from get_gmx_stats import GetGMXv2Stats
-from gmx_python_sdk.scripts.v2.order.order_argument_parser import OrderArgumentParser
-import pandas as pd
-import numpy as np
-import talib as ta
+import functools
+import json
+import logging
 import os
-from datetime import datetime
+import threading
 import time
-import yfinance as yf
-from web3 import Web3
-import requests
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Access environment variables
-rpc_url = os.getenv("RPC_URL")
-private_key = os.getenv("PRIVATE_KEY")
-wallet_address = os.getenv("WALLET_ADDRESS")
-
-# Setup configuration
-print("Setting up configuration for GMX...")
-config = ConfigManager("arbitrum")
-config.set_config(filepath="config.yaml")
-print("Configuration setup complete.")
-
-w3 = Web3(Web3.HTTPProvider(rpc_url))
-
-
-# Modify the instantiation of GetGMXv2Stats with additional arguments
-stats = GetGMXv2Stats(config, to_json=True, to_csv=False)  # Adjust these flags as needed
-print("GetGMXv2Stats initialized.")
+from metrics import JsonlMetricsWriter, configure_logging, metrics, start_metrics_server
+from strategy import CLOSE_LONG, CLOSE_SHORT, OPEN_LONG, OPEN_SHORT, next_action, position_after
+
+# Importing this module has no side effects: the SDK, pandas and TA-Lib are imported and the clients
+# built by start(), so tools and tests can import the bot cheaply. web3 (and eth_account, which it
+# pulls in) takes over a second to import, so the bot's RPC client is built by get_w3() on first use.
+
+logger = logging.getLogger(__name__)
+
+# Markets rarely change; a warm restart reads them from this snapshot instead of querying the chain
+MARKET_SNAPSHOT_PATH = os.getenv("MARKET_SNAPSHOT", "data/markets.json")
+MARKET_SNAPSHOT_MAX_AGE = int(os.getenv("MARKET_SNAPSHOT_MAX_AGE", "86400"))
+# Write-ahead journal of signals, orders and positions, replayed on start
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "data/journal")
+# Seconds between checks of the journal against the chain (sooner while an order is unresolved), and
+# how long an order may stay unresolved before it is given up on
+RECONCILE_INTERVAL = int(os.getenv("RECONCILE_INTERVAL", "300"))
+PENDING_ORDER_TIMEOUT = int(os.getenv("PENDING_ORDER_TIMEOUT", "900"))
+# Shared market feed written by `python market_feed.py`; when set, prices, candles and markets come from it
+MARKET_FEED_PATH = os.getenv("MARKET_FEED")
+# Signal from signals.default_registry() that drives the single-market loop (rsi, ema_cross, bollinger, ...)
+SIGNAL_STRATEGY = os.getenv("SIGNAL_STRATEGY", "rsi")
+
+# Set by start()
+rpc_url = None
+private_key = None
+wallet_address = None
+config = None
+http = None
+rpc_batcher = None
+w3 = None  # Built by get_w3()
+_w3_lock = threading.Lock()
+stats = None
+markets = None
+market_table = None
+MARKET_KEY = INDEX_TOKEN_ADDRESS = LONG_TOKEN_ADDRESS = SHORT_TOKEN_ADDRESS = COLLATERAL_ADDRESS = None
+ETH_MARKET = None
+order_preparer = None
+journal = None
+position_reader = None
+last_reconcile = None
+feed = None
+risk = None
+market_stats = {}  # Latest ETH funding rates and open interest, read by the signal sources
+
+# Convert an oracle price entry's max/min prices to USD (GMX scales them by 10 ** (30 - token decimals))
+def parse_oracle_entry(entry_data):
+    from price_table import price_exponent
+
+    if entry_data is None:
+        return None, None
+    scale = 10 ** price_exponent(entry_data, token_decimals=stats.token_decimals if stats is not None else None)
+    max_price = int(entry_data.get("maxPriceFull")) / scale
+    min_price = int(entry_data.get("minPriceFull")) / scale
+    return max_price, min_price
 
 # Fetch max and min prices for ETH
 def get_eth_prices(oracle_prices, symbol="ETH"):
     for entry_data in oracle_prices.values():
         if entry_data.get("tokenSymbol") == symbol:
-            max_price = int(entry_data.get("maxPriceFull")) / 1e18  # Convert from Wei to Ether
-            min_price = int(entry_data.get("minPriceFull")) / 1e18  # Convert from Wei to Ether
-            return max_price, min_price
+            return parse_oracle_entry(entry_data)
     return None, None  # Return None if the symbol is not found
 
-# Fetch oracle prices
+# Oracle price table from the shared market feed (None if it has gone stale) or from GMX, cached
+def get_price_table():
+    if feed is not None:
+        return feed.prices()
+    return stats.get_oracle_price_table()
+
+# Candle source for backfills: the shared market feed when configured, otherwise Yahoo Finance
+def candle_source():
+    if feed is not None:
+        from market_feed import FeedSource
+
+        return FeedSource(feed)
+    from candle_store import YahooSource
+
+    return YahooSource()
+
+# Fetch oracle prices (parsed once per payload into the cached price table and looked up by symbol in O(1))
+@metrics.timed("bot.fetch_market_data")
 def fetch_market_data():
-    oracle_prices = stats.get_oracle_prices()
-    max_price, min_price = get_eth_prices(oracle_prices, "ETH")
+    table = get_price_table()
+    max_price, min_price = table.prices("ETH") if table is not None else (None, None)
 
     if max_price and min_price:
-        print(f"Fetched Max Price for ETH: {max_price} ETH")
-        print(f"Fetched Min Price for ETH: {min_price} ETH")
+        logger.debug("Fetched Max Price for ETH: %s USD", max_price)
+        logger.debug("Fetched Min Price for ETH: %s USD", min_price)
         # You might want to choose either max or min price depending on your logic
         eth_price = (max_price + min_price) / 2  # Take the average price as an example
         return eth_price
     else:
-        print("ETH data not found in oracle prices.")
+        logger.warning("ETH data not found in oracle prices.")
         return None
 
-# Fetch available markets and inspect structure
-markets = stats.get_available_markets()
-#print("Markets data structure:", markets)  # Print the structure of markets for debugging
-
-# Assuming markets is a dictionary where keys are addresses and values contain market details
-try:
-    eth_market = next((details for address, details in markets.items() if details.get("market_symbol") == "ETH"), None)
-except AttributeError as e:
-    print("Error accessing market details:", e)
-    eth_market = None
-
-if eth_market:
-    MARKET_KEY = eth_market["gmx_market_address"]
-    INDEX_TOKEN_ADDRESS = eth_market["index_token_address"]
-    LONG_TOKEN_ADDRESS = eth_market["long_token_address"]
-    SHORT_TOKEN_ADDRESS = eth_market["short_token_address"]
-    COLLATERAL_ADDRESS = eth_market["short_token_address"]
-    print(f"Market Key for ETH: {MARKET_KEY}")
-    print(f"Index Token Address: {INDEX_TOKEN_ADDRESS}")
-    print(f"Long Token Address: {LONG_TOKEN_ADDRESS}")
-    print(f"Short Token Address: {SHORT_TOKEN_ADDRESS}")
-    print(f"Collateral Address: {COLLATERAL_ADDRESS}")
-else:
-    print("ETH market not found in GMX markets.")
-    exit()
+# Available markets from the snapshot file when it is fresh enough, otherwise from GMX (refreshing the snapshot)
+def load_markets(stats, snapshot_path=MARKET_SNAPSHOT_PATH, max_age=MARKET_SNAPSHOT_MAX_AGE):
+    if snapshot_path and os.path.exists(snapshot_path) and time.time() - os.path.getmtime(snapshot_path) < max_age:
+        try:
+            with open(snapshot_path) as f:
+                markets = json.load(f)
+            logger.info("Loaded %s markets from %s.", len(markets), snapshot_path)
+            return markets
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable market snapshot %s: %s", snapshot_path, e)
+
+    markets = stats.get_available_markets()
+    if snapshot_path:
+        try:
+            os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+            with open(snapshot_path + ".tmp", "w") as f:
+                json.dump(markets, f, default=str)
+            os.replace(snapshot_path + ".tmp", snapshot_path)
+        except OSError as e:
+            logger.warning("Could not write market snapshot %s: %s", snapshot_path, e)
+    return markets
+
+# Load configuration, build the shared clients and discover markets; run once before trading.
+# Raises RuntimeError when the ETH market cannot be found.
+def start(snapshot_path=MARKET_SNAPSHOT_PATH, snapshot_max_age=MARKET_SNAPSHOT_MAX_AGE):
+    global rpc_url, private_key, wallet_address, config, http, stats, markets, market_table
+    global MARKET_KEY, INDEX_TOKEN_ADDRESS, LONG_TOKEN_ADDRESS, SHORT_TOKEN_ADDRESS, COLLATERAL_ADDRESS
+    global ETH_MARKET, order_preparer, journal, feed, risk, current_position, current_position_value, position_reader
+    if stats is not None:
+        return
+
+    from dotenv import load_dotenv
+    from gmx_python_sdk.scripts.v2.gmx_utils import ConfigManager
+    from get_gmx_stats import GetGMXv2Stats
+    from http_pool import get_session
+    from journal import GMXPositionReader, PositionJournal
+    from multi_market import MarketTable
+    from order_prep import GasCache, OrderPreparer
+    from price_table import token_decimals_from_markets
+    from risk import RiskEngine
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    # LOG_LEVEL=DEBUG shows every fetch step, LOG_LEVEL=OFF silences the bot
+    configure_logging()
+
+    # Access environment variables
+    rpc_url = os.getenv("RPC_URL")
+    private_key = os.getenv("PRIVATE_KEY")
+    wallet_address = os.getenv("WALLET_ADDRESS")
+
+    # Setup configuration
+    logger.debug("Setting up configuration for GMX...")
+    config = ConfigManager("arbitrum")
+    config.set_config(filepath="config.yaml")
+    logger.debug("Configuration setup complete.")
+
+    # Shared keep-alive pool for RPC, CoinGecko and oracle calls
+    http = get_session()
+
+    # Liquidity, funding and open interest are re-read every minute for sizing and signals; with to_json
+    # or to_csv the SDK would write a file per call (record history with a snapshot_store instead)
+    stats = GetGMXv2Stats(config, to_json=False, to_csv=False, http=http)
+    logger.debug("GetGMXv2Stats initialized.")
+
+    if MARKET_FEED_PATH:
+        from market_feed import MarketFeedReader
+
+        feed = MarketFeedReader(MARKET_FEED_PATH)
+        logger.info("Reading market data from the shared feed at %s.", MARKET_FEED_PATH)
+
+    # Fetch available markets (from the feed, the snapshot or GMX) and inspect structure
+    markets = feed.markets() if feed is not None else None
+    if markets is None:
+        markets = load_markets(stats, snapshot_path, snapshot_max_age)
+    #print("Markets data structure:", markets)  # Print the structure of markets for debugging
+    # Token decimals from the markets' metadata convert oracle prices to USD
+    stats.token_decimals = token_decimals_from_markets(markets)
+
+    # Assuming markets is a dictionary where keys are addresses and values contain market details;
+    # they are parsed once into market states indexed by symbol, market key and index token
+    try:
+        market_table = MarketTable.from_gmx(markets)
+        eth_market = market_table.get("ETH")
+    except AttributeError as e:
+        logger.error("Error accessing market details: %s", e)
+        eth_market = None
+
+    if eth_market:
+        MARKET_KEY = eth_market.market_key
+        INDEX_TOKEN_ADDRESS = eth_market.index_token_address
+        LONG_TOKEN_ADDRESS = eth_market.long_token_address
+        SHORT_TOKEN_ADDRESS = eth_market.short_token_address
+        COLLATERAL_ADDRESS = eth_market.collateral_address
+        ETH_MARKET = eth_market
+        logger.debug("Market Key for ETH: %s", MARKET_KEY)
+        logger.debug("Index Token Address: %s", INDEX_TOKEN_ADDRESS)
+        logger.debug("Long Token Address: %s", LONG_TOKEN_ADDRESS)
+        logger.debug("Short Token Address: %s", SHORT_TOKEN_ADDRESS)
+        logger.debug("Collateral Address: %s", COLLATERAL_ADDRESS)
+    else:
+        stats = None  # Not started, so a later start() tries again
+        raise RuntimeError("ETH market not found in GMX markets.")
+
+    # Order templates per (market, side) and gas estimates refreshed in the background
+    order_preparer = OrderPreparer(config, GasCache(config, refresh_interval=30), debug_mode=True,
+                                   token_decimals=stats.token_decimals)  # Set debug_mode=False to execute for real
+    order_preparer.prepare([ETH_MARKET])
+
+    # Pick up the position held before a restart, then check it (and any order in flight) against the chain
+    journal = PositionJournal(JOURNAL_DIR, pending_timeout=PENDING_ORDER_TIMEOUT).open()
+    position_reader = GMXPositionReader(config, wallet_address, leverage=LEVERAGE) if wallet_address else None
+    reconcile_positions()
+    current_position, current_position_value = journal.position("ETH")
+    journal.start()
+
+    # Equity valued at the ETH/USD price and sizing limits, refreshed by the scheduler's balance stage
+    risk = RiskEngine(get_native_balance, price_source=get_eth_usd_price, liquidity_source=stats.get_available_liquidity,
+                      leverage=LEVERAGE, open_percentage=OPEN_PERCENTAGE, close_percentage=CLOSE_PERCENTAGE,
+                      max_exposure=MAX_EXPOSURE, max_liquidity_share=MAX_LIQUIDITY_SHARE, refresh_interval=60)
+    risk.set_exposure("ETH", current_position_value)
+
+    # HTTP pool, stats cache and order latencies show up next to the per-stage timings
+    metrics.register_collector("http", http.metrics)
+    metrics.register_collector("stats_cache", stats.cache_stats)
+    metrics.register_collector("order_latency", order_preparer.latency_stats)
+    metrics.register_collector("risk", risk.stats)
+
+# The bot's Web3 client, built on the first RPC read rather than in start()
+def get_w3():
+    global rpc_batcher, w3
+    with _w3_lock:
+        if w3 is None:
+            from web3 import Web3
+
+            from rpc_batch import BatchingHTTPProvider, RpcBatcher
+
+            # Reads issued together (e.g. from concurrent scheduler stages) go out as one JSON-RPC batch
+            rpc_batcher = RpcBatcher(rpc_url, http=http, max_batch_size=50, flush_interval=0.005)
+            w3 = Web3(BatchingHTTPProvider(rpc_batcher))
+        return w3
 
 # Function to get the ETH to USD conversion rate using CoinGecko's API
+@metrics.timed("bot.get_eth_to_usd_price")
 def get_eth_to_usd_price():
+    import requests
+
+    if feed is not None:
+        eth_price_usd = feed.eth_usd()
+        if eth_price_usd is None:
+            logger.error("No recent ETH price in the market feed.")
+        return eth_price_usd
+
     url = 'https://api.coingecko.com/api/v3/simple/price'
     params = {
         'ids': 'ethereum',
         'vs_currencies': 'usd'
     }
     try:
-        response = requests.get(url, params=params)
+        response = http.get(url, params=params, endpoint="coingecko")
         response.raise_for_status()  # Check for HTTP errors
         data = response.json()
         eth_price_usd = data['ethereum']['usd']
-        print(f"Fetched ETH price from CoinGecko: ${eth_price_usd} USD.")
+        logger.debug("Fetched ETH price from CoinGecko: $%s USD.", eth_price_usd)
         return eth_price_usd
     except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error occurred while fetching ETH price: {http_err}")
+        logger.error("HTTP error occurred while fetching ETH price: %s", http_err)
     except Exception as err:
-        print(f"An error occurred while fetching ETH price: {err}")
+        logger.error("An error occurred while fetching ETH price: %s", err)
     return None
 
-# Function to fetch wallet balance in USD
-def get_wallet_balance():
+# Native (ETH) wallet balance over RPC
+@metrics.timed("bot.get_native_balance")
+def get_native_balance():
     try:
-        #wallet_address = config.user_wallet_address
-        print("Fetching balance for wallet address:", wallet_address)
-
-        # Step 1: Get balance in native token (ETH)
-        native_balance_wei = w3.eth.get_balance(wallet_address)
-        print("Native balance (in Wei):", native_balance_wei)
-
-        # Step 2: Convert Wei to ETH manually
-        native_balance_eth = native_balance_wei / 1e18
-        print("Native balance (in ETH):", native_balance_eth)
-
-        # Ensure balance is in a compatible format
-        native_balance_eth = float(native_balance_eth)
-        print("Native balance (converted to float):", native_balance_eth, "ETH")
-
-        # Step 3: Fetch ETH to USD conversion rate from CoinGecko
-        max_price_in_usd = get_eth_to_usd_price()  # Fetch ETH price in USD equivalent
-        if max_price_in_usd is None:
-            print("Error: Unable to fetch ETH price for USD conversion.")
-            return None
-
-        # Step 4: Calculate wallet balance in USD
-        wallet_balance_usd = native_balance_eth * max_price_in_usd
-        print(f"Wallet balance in USD: ${wallet_balance_usd:.2f}")
-        return wallet_balance_usd
-
-    except AttributeError as e:
-        print("Error fetching balance or price from oracle:", e)
-        return None
+        native_balance_eth = float(get_w3().eth.get_balance(wallet_address) / 1e18)  # Convert from Wei to Ether
+        logger.debug("Native balance for %s: %s ETH", wallet_address, native_balance_eth)
+        return native_balance_eth
     except Exception as e:
-        print(f"Error fetching wallet balance: {e}")
+        logger.error("Error fetching wallet balance: %s", e)
         return None
 
+# ETH price in USD for valuing the wallet: the GMX oracle price the bot trades on, or the CoinGecko
+# rate (through the feed when configured) while the oracle has none
+def get_eth_usd_price():
+    eth_price = fetch_market_data()
+    if eth_price is None:
+        logger.warning("No oracle ETH price; valuing the wallet at the CoinGecko rate.")
+        eth_price = get_eth_to_usd_price()
+    return eth_price
 
-# Helper function to calculate size_delta_usd for opening position
-def calculate_open_position_amount(wallet_balance, open_percentage):
-    if wallet_balance is None:
-        print("Error: Wallet balance is None. Skipping position calculation.")
+# Wallet balance in USD
+@metrics.timed("bot.get_wallet_balance")
+def get_wallet_balance():
+    native_balance_eth = get_native_balance()
+    if native_balance_eth is None:
         return None
-    return wallet_balance * open_percentage
-
-# Helper function to calculate size_delta_usd for closing position
-def calculate_close_position_amount(current_position_value, close_percentage):
-    if current_position_value is None:
-        print("Error: Current position value is None. Skipping position calculation.")
+    eth_price = get_eth_usd_price()
+    if eth_price is None:
+        logger.error("Error: Unable to fetch ETH price for USD conversion.")
         return None
-    return current_position_value * (1 - close_percentage)
+    return native_balance_eth * eth_price
 
-# Initialize historical data
-def initialize_historical_data():
-    print("Initializing historical data...")
-    eth_data = yf.download("ETH-USD", period="1mo", interval="15m").tail(200)
-    eth_data = eth_data.reset_index()[['Datetime', 'Close', 'Volume']]
-    eth_data.columns = ['Timestamp', 'Close', 'Volume']
+# Initialize historical data from the local candle store, fetching only bars newer than the last stored one
+def initialize_historical_data(source=None):
+    from candle_store import CandleStore
+    from ta_numpy import load_ta
+
+    logger.debug("Initializing historical data...")
+    store = CandleStore()
+    try:
+        store.backfill("ETH-USD", "15m", source or candle_source())
+    except Exception as e:
+        # Stored candles are still usable when the network is down
+        logger.error("Error backfilling candles: %s", e)
+    eth_data = store.load("ETH-USD", "15m", tail=200)[['Timestamp', 'Close', 'Volume']]
 
     # Calculate the moving average explicitly using .loc
-    eth_data.loc[:, 'Volume_MA'] = ta.SMA(eth_data['Volume'], timeperiod=200)
+    eth_data.loc[:, 'Volume_MA'] = load_ta().SMA(eth_data['Volume'], timeperiod=200)
 
-    print("Historical data initialized.")
+    logger.info("Historical data initialized.")
     return eth_data
 
 
-# Generate trading signals based on RSI
-def generate_signals(data):
-    print("Generating RSI-based trading signals...")
-    data['RSI'] = ta.RSI(data['Close'], timeperiod=14)
-    data['Long'] = np.where(data['RSI'] < 41, 1, 0)
-    data['Short'] = np.where(data['RSI'] > 60, -1, 0)
-    data['Position'] = data['Long'] + data['Short']
-    signal = data.iloc[-1]
-    print(f"Generated signal - RSI: {signal['RSI']}, Position: {signal['Position']}")
+# Traded volume of a closed 15m ETH candle from the candle source; None while the source does not have it yet
+def fetch_candle_volume(timestamp):
+    candles = candle_source().fetch("ETH-USD", "15m", start=timestamp)
+    volumes = candles.loc[candles["Timestamp"] == timestamp, "Volume"]
+    return float(volumes.iloc[-1]) if len(volumes) else None
+
+# Closed and forming 15m ETH candles from `start` on; the scheduler takes the closed ones between the stored
+# history and its first full live candle, so the indicators have no hole after a restart
+def fetch_recent_candles(start):
+    return candle_source().fetch("ETH-USD", "15m", start=start)
+
+
+# Generate trading signals from the indicator engine's strategy (RSI thresholds by default)
+@metrics.timed("bot.generate_signals")
+def generate_signals(engine):
+    logger.debug("Generating %s trading signals...", engine.strategy)
+    signal = engine.latest()
+    logger.debug("Generated signal - RSI: %s, Position: %s", signal['RSI'], signal['Position'])
     return signal
 
+# Fetch the funding/open-interest figures among `columns` into market_stats; GetGMXv2Stats caches them
+def refresh_market_stats(columns):
+    from signals import FUNDING_COLUMNS, OPEN_INTEREST_COLUMNS
+
+    for getter, names in ((stats.get_funding_apr, FUNDING_COLUMNS), (stats.get_open_interest, OPEN_INTEREST_COLUMNS)):
+        if not set(names) & set(columns):
+            continue
+        try:
+            result = getter()
+            market_stats[names[0]] = result["long"].get("ETH")
+            market_stats[names[1]] = result["short"].get("ETH")
+        except Exception as e:
+            logger.error("Error fetching %s for signals: %s", getter.__name__, e)
+
+# Collateral for an order of notional_usd at `leverage`, in the collateral token's smallest units and valued
+# at its oracle price. Raises rather than send an order with a guessed amount.
+def order_collateral(market, is_long, is_open, notional_usd, leverage):
+    template = order_preparer.template(market, is_long, is_open)
+    table = get_price_table()
+    max_price, min_price = table.prices(template.collateral_address) if table is not None else (None, None)
+    amount = None
+    if max_price and min_price:
+        amount = order_preparer.collateral_amount(market, is_long, is_open, notional_usd, leverage, (max_price + min_price) / 2)
+    if amount is None:
+        raise ValueError(f"Cannot size the collateral in {template.collateral_address} for {market.symbol}")
+    return amount
+
 # Increase Position
-def open_position(is_long, eth_price, leverage, size_delta_usd, percentage):
+@metrics.timed("bot.open_position")
+def open_position(is_long, eth_price, leverage, size_delta_usd, percentage, market=None):
     if eth_price is None:
-        print("Invalid ETH price; cannot open position.")
+        logger.warning("Invalid ETH price; cannot open position.")
         return
 
-    # Determine collateral and index token based on position type
-    if is_long:
-        collateral_address = COLLATERAL_ADDRESS  # Assume stablecoin (e.g., USDC) as collateral
-        index_token_address = INDEX_TOKEN_ADDRESS  # ETH as the index token
-    else:
-        collateral_address = LONG_TOKEN_ADDRESS  # ETH as collateral
-        index_token_address = SHORT_TOKEN_ADDRESS  # Stablecoin (e.g., USDC) as the index token
+    logger.info("Opening %s position...", 'long' if is_long else 'short')
+    market = market or ETH_MARKET
+    notional_usd = size_delta_usd * leverage
 
-    print(f"Opening {'long' if is_long else 'short'} position...")
+    # The SDK builds its own web3 connection; make it reuse the pooled session in this thread
+    http.bind_web3_session(rpc_url)
 
-    # Initialize the order with parameters as per the Order class requirements
-    order = IncreaseOrder(
-        config=config,
-        market_key=MARKET_KEY,
-        collateral_address=collateral_address,
-        index_token_address=index_token_address,
+    # The SDK order builds, estimates gas and submits in one go; the template supplies the
+    # collateral/index tokens and swap path, so only size and collateral are filled in here
+    order_preparer.submit(
+        market,
         is_long=is_long,
-        size_delta=int(size_delta_usd * leverage * 1e30),
-        initial_collateral_delta_amount=int(eth_price * 1e6 * percentage),  # Collateral in USD scaled
+        is_open=True,
+        size_delta=int(notional_usd * 1e30),
+        initial_collateral_delta_amount=order_collateral(market, is_long, True, notional_usd, leverage),
         slippage_percent=percentage,
-        swap_path=[collateral_address, index_token_address],
-        debug_mode=True  # Set to False to execute for real; True for simulation
-    )
-
-    # Call order_builder to set up the transaction details
-    order.order_builder(is_open=True)  # Indicate this is an opening order
-
-    # Fetch the gas limits using the determine_gas_limits method
-    order.determine_gas_limits()  # This method should set self._gas_limits within the order instance
-
-    # Assuming that `user_wallet_address` and `private_key` are set in the config
-    user_wallet_address = wallet_address
-
-    # Setting multicall_args based on the order details
-    value_amount = int(eth_price * 1e6 * percentage)  # Value amount in Wei or smallest unit if needed
-    multicall_args = [
-        HexBytes(order._send_wnt(value_amount)),
-        HexBytes(order._create_order((user_wallet_address,)))  # Replace with correct arguments if needed
-    ]
-
-    # Submit the transaction with dynamically fetched gas limits
-    order._submit_transaction(
-        user_wallet_address=user_wallet_address,
-        value_amount=value_amount,
-        multicall_args=multicall_args,
-        gas_limits=order._gas_limits  # Uses the dynamically set gas limits
     )
-    print(f"{'Long' if is_long else 'Short'} position opened.")
-
+    logger.info("%s position opened.", 'Long' if is_long else 'Short')
 
 
 # Decrease Position
-def close_position(is_long, eth_price, size_delta_usd, percentage):
+@metrics.timed("bot.close_position")
+def close_position(is_long, eth_price, size_delta_usd, percentage, market=None, leverage=None):
     if eth_price is None:
-        print("Invalid ETH price; cannot close position.")
+        logger.warning("Invalid ETH price; cannot close position.")
         return
 
-    # Determine collateral and index token based on position type
-    if is_long:
-        collateral_address = COLLATERAL_ADDRESS  # Assume stablecoin (e.g., USDC) as collateral
-        index_token_address = INDEX_TOKEN_ADDRESS  # ETH as the index token
-    else:
-        collateral_address = LONG_TOKEN_ADDRESS  # ETH as collateral
-        index_token_address = SHORT_TOKEN_ADDRESS  # Stablecoin (e.g., USDC) as the index token
+    logger.info("Closing %s position...", 'long' if is_long else 'short')
+    market = market or ETH_MARKET
 
-    print(f"Closing {'long' if is_long else 'short'} position...")
+    # The SDK builds its own web3 connection; make it reuse the pooled session in this thread
+    http.bind_web3_session(rpc_url)
 
-    # Initialize the order with parameters as per the Order class requirements
-    order = DecreaseOrder(
-        config=config,
-        market_key=MARKET_KEY,
-        collateral_address=collateral_address,
-        index_token_address=index_token_address,
+    # The collateral withdrawn is in proportion to the size closed, so the rest keeps its leverage
+    order_preparer.submit(
+        market,
         is_long=is_long,
+        is_open=False,
         size_delta=int(size_delta_usd * 1e30),
-        initial_collateral_delta_amount=int(eth_price * 1e6 * percentage),  # Collateral in USD scaled
+        initial_collateral_delta_amount=order_collateral(market, is_long, False, size_delta_usd, leverage or LEVERAGE),
         slippage_percent=percentage,
-        swap_path=[index_token_address, collateral_address],
-        debug_mode=True  # Set to False to execute for real; True for simulation
     )
+    logger.info("%s position closed.", 'Long' if is_long else 'Short')
+
+
+# Trading parameters
+LEVERAGE = 5
+OPEN_PERCENTAGE = 0.1  # Example: Use 10% of wallet balance for opening positions
+CLOSE_PERCENTAGE = 0.1  # Example: Close 90% of the current position, retaining 10%
+MAX_EXPOSURE = 1.5  # Leveraged notional of all open positions, as a multiple of equity
+MAX_LIQUIDITY_SHARE = 0.05  # Largest share of a market's available liquidity one order may take
+ORDER_PERCENTAGE = .01  # Collateral fraction and slippage passed to the order
+
+current_position = 0
+current_position_value = 0  # Track the value of the current position
+
+# Check the journal against the chain: on every call while an order is unresolved, otherwise every
+# RECONCILE_INTERVAL. Unresolved orders older than PENDING_ORDER_TIMEOUT are then expired. Corrections
+# are applied to the tracked ETH position and the risk engine. Returns {symbol: (position, position_value)}.
+def reconcile_positions(markets=None):
+    global last_reconcile, current_position, current_position_value
+    changed = {}
+    due = last_reconcile is None or time.time() - last_reconcile >= RECONCILE_INTERVAL
+    if position_reader is not None and (journal.pending or due):
+        try:
+            changed = journal.reconcile(position_reader, markets)
+            last_reconcile = time.time()
+        except Exception as e:
+            logger.error("Error reconciling positions with the chain: %s", e)
+    journal.expire_pending()
+    for symbol, (position, position_value) in changed.items():
+        if risk is not None:
+            risk.set_exposure(symbol, position_value)
+        if symbol == "ETH":
+            current_position, current_position_value = position, position_value
+    return changed
+
+# Act on a freshly closed candle's signal
+@metrics.timed("bot.handle_signal")
+def handle_signal(latest_signal, eth_price, wallet_balance_usd):
+    global current_position, current_position_value
+    action = next_action(latest_signal['Position'], current_position)
+    journal.record_signal({"ETH": latest_signal['Position']}, latest_signal.get('Timestamp'))
+    if action is None:
+        return action
+    if "ETH" in journal.pending:
+        # Sending another order could duplicate the one in flight; wait for reconciliation
+        logger.warning("ETH order from before the restart is unresolved; skipping %s.", action)
+        return None
 
-    # Call order_builder to set up the transaction details
-    order.order_builder(is_close=True)  # Indicate this is a closing order
-
-    # Fetch the gas limits using the determine_gas_limits method
-    order.determine_gas_limits()  # This method should set self._gas_limits within the order instance
-
-    # Assuming that `user_wallet_address` and `private_key` are set in the config
-    user_wallet_address = wallet_address
-
-    # Setting multicall_args based on the order details
-    value_amount = int(eth_price * 1e6 * percentage)  # Value amount in Wei or smallest unit if needed
-    multicall_args = [
-        HexBytes(order._send_wnt(value_amount)),
-        HexBytes(order._create_order((user_wallet_address,)))  # Replace with correct arguments if needed
-    ]
-
-    # Submit the transaction with dynamically fetched gas limits
-    order._submit_transaction(
-        user_wallet_address=user_wallet_address,
-        value_amount=value_amount,
-        multicall_args=multicall_args,
-        gas_limits=order._gas_limits  # Uses the dynamically set gas limits
+    try:
+        if not _execute_action(action, eth_price):
+            return None
+    except Exception as e:
+        journal.order_failed("ETH", action, e)
+        raise
+    current_position = position_after(action, current_position)
+    journal.position_changed("ETH", current_position, current_position_value)
+    risk.on_fill("ETH", current_position_value)
+    return action
+
+# Place the order for one action, sized by the risk engine; the journal records it before it is sent.
+# Returns False when there is nothing to trade (e.g. no equity estimate or no room under the limits).
+def _execute_action(action, eth_price):
+    global current_position_value
+    if action in (OPEN_LONG, OPEN_SHORT):
+        # Equity from the risk engine rather than the scheduler's balance, so it is re-read after a fill
+        size_delta_usd = risk.open_size("ETH", is_long=action == OPEN_LONG)
+    else:
+        size_delta_usd = risk.close_size("ETH", current_position_value)
+    if size_delta_usd is None:
+        return False
+
+    # Open a Long Position
+    if action == OPEN_LONG:
+        journal.order_started("ETH", action, size_delta_usd, eth_price)
+        open_position(is_long=True, eth_price=eth_price, leverage=LEVERAGE, size_delta_usd=size_delta_usd, percentage=ORDER_PERCENTAGE)
+        current_position_value = size_delta_usd  # Track the initial position value
+        logger.info("Long position opened with size %s USD.", size_delta_usd)
+
+    # Open a Short Position
+    elif action == OPEN_SHORT:
+        journal.order_started("ETH", action, size_delta_usd, eth_price)
+        open_position(is_long=False, eth_price=eth_price, leverage=LEVERAGE, size_delta_usd=size_delta_usd, percentage=ORDER_PERCENTAGE)
+        current_position_value = size_delta_usd  # Track the initial position value
+        logger.info("Short position opened with size %s USD.", size_delta_usd)
+
+    # Close Long Position
+    elif action == CLOSE_LONG:
+        journal.order_started("ETH", action, size_delta_usd, eth_price)
+        close_position(is_long=True, eth_price=eth_price, size_delta_usd=size_delta_usd, percentage=ORDER_PERCENTAGE)
+        current_position_value = 0  # Reset position value after closing
+        logger.info("Long position closed with size %s USD.", size_delta_usd)
+
+    # Close Short Position
+    elif action == CLOSE_SHORT:
+        journal.order_started("ETH", action, size_delta_usd, eth_price)
+        close_position(is_long=False, eth_price=eth_price, size_delta_usd=size_delta_usd, percentage=ORDER_PERCENTAGE)
+        current_position_value = 0  # Reset position value after closing
+        logger.info("Short position closed with size %s USD.", size_delta_usd)
+
+    return True
+
+# Main trading loop: evaluate signals as soon as each 15-minute candle closes
+async def run_trading_bot_async():
+    from aggregator import TickAggregator
+    from indicators import IndicatorEngine
+    from scheduler import TradingScheduler
+    from signals import default_registry
+
+    logger.info("Starting trading bot with the %s strategy...", SIGNAL_STRATEGY)
+    historical_data = initialize_historical_data()
+    registry = default_registry(rsi_period=14, long_threshold=41, short_threshold=60)
+    # Funding/open-interest columns are fetched by the balance stage and read from memory on each candle
+    stat_columns = registry.columns([SIGNAL_STRATEGY]) - {"Close", "Volume"}
+    engine = IndicatorEngine(rsi_period=14, volume_ma_period=200, long_threshold=41, short_threshold=60,
+                             registry=registry, strategy=SIGNAL_STRATEGY,
+                             sources={name: functools.partial(market_stats.get, name) for name in stat_columns})
+    engine.seed(historical_data)
+    order_preparer.gas_cache.start()
+
+    def refresh_balance():
+        reconcile_positions(["ETH"])
+        refresh_market_stats(stat_columns)
+        return risk.refresh()
+
+    scheduler = TradingScheduler(
+        fetch_price=fetch_market_data,
+        engine=engine,
+        execute_signal=handle_signal,
+        fetch_balance=refresh_balance,
+        fetch_volume=fetch_candle_volume,  # Oracle ticks carry no volume
+        fetch_candles=fetch_recent_candles,
+        candle_interval=900,  # Matches the 15m historical candles
+        poll_interval=5,
+        balance_interval=60,
+        # Oracle ticks also build 1m/5m bars; the 15m bar drives the signal
+        aggregator=TickAggregator(intervals=(60, 300, 900), capacity=500),
     )
-    print(f"{'Long' if is_long else 'Short'} position closed.")
+    await scheduler.run()
 
+# Order executor for MultiMarketRunner backed by the GMX order functions above
+class GMXOrderExecutor:
 
-# Main trading loop
-def run_trading_bot():
-    global current_position
-    print("Starting trading bot...")
-    historical_data = initialize_historical_data()
-    current_position = 0
-    current_position_value = 0  # Track the value of the current position
+    def open_position(self, market, is_long, price, leverage, size_delta_usd, percentage):
+        open_position(is_long=is_long, eth_price=price, leverage=leverage, size_delta_usd=size_delta_usd,
+                      percentage=percentage, market=market)
 
-    while True:
-        print("Running bot iteration...")
-        eth_price = fetch_market_data()
+    def close_position(self, market, is_long, price, size_delta_usd, percentage):
+        close_position(is_long=is_long, eth_price=price, size_delta_usd=size_delta_usd,
+                       percentage=percentage, market=market)
 
-        # Ensure eth_price is valid before continuing
-        if eth_price is None:
-            print("Error fetching market data. Retrying in 1 minute.")
-            time.sleep(60)
-            continue
+# Average oracle price for a market's index token, served from the shared oracle price table
+def get_market_price(market):
+    table = get_price_table()
+    if table is None:
+        return None
+    max_price, min_price = table.prices(market.index_token_address)
+    if max_price and min_price:
+        return (max_price + min_price) / 2
+    return None
+
+# Average oracle prices for many markets in one vectorized lookup (NaN where a token has no price)
+def get_market_prices(markets):
+    table = get_price_table()
+    if table is None:
+        return [float("nan")] * len(markets)
+    return table.mid_prices([market.index_token_address for market in markets])
+
+# Trade several GMX markets at once with one signal pass per candle
+async def run_multi_market_bot_async(symbols):
+    from aggregator import TickAggregator
+    from candle_store import CandleStore
+    from multi_market import MultiMarketRunner
+    from scheduler import TradingScheduler
+
+    logger.info("Starting multi-market trading bot for %s...", ', '.join(symbols))
+    runner = MultiMarketRunner(market_table.select(symbols), GMXOrderExecutor(), price_source=get_market_price,
+                               rsi_period=14, long_threshold=41, short_threshold=60, leverage=LEVERAGE,
+                               open_percentage=OPEN_PERCENTAGE, close_percentage=CLOSE_PERCENTAGE,
+                               order_percentage=ORDER_PERCENTAGE, batch_price_source=get_market_prices,
+                               journal=journal, risk=risk)
+    store = CandleStore()
+    frames = {}
+    for symbol in runner.symbols:
+        try:
+            store.backfill(f"{symbol}-USD", "15m", candle_source())
+        except Exception as e:
+            logger.error("Error backfilling %s candles: %s", symbol, e)
+        frames[symbol] = store.load(f"{symbol}-USD", "15m", tail=200)
+    runner.seed_from_frames(frames)
+    order_preparer.prepare(runner.markets)
+    order_preparer.gas_cache.start()
+
+    def refresh_balance():
+        runner.sync_positions(reconcile_positions(runner.symbols))
+        return risk.refresh()
+
+    scheduler = TradingScheduler(
+        fetch_price=runner.fetch_prices,
+        engine=runner,
+        execute_signal=runner.execute_signal,
+        fetch_balance=refresh_balance,
+        candle_interval=900,
+        poll_interval=5,
+        balance_interval=60,
+        aggregator=TickAggregator(intervals=(60, 300, 900), capacity=500),
+    )
+    await scheduler.run()
+
+# METRICS_PORT serves Prometheus text at /metrics; METRICS_JSONL appends a snapshot every minute
+def start_metrics_exporters():
+    exporters = []
+    port = os.getenv("METRICS_PORT")
+    if port:
+        exporters.append(start_metrics_server(metrics, port=int(port)))
+    path = os.getenv("METRICS_JSONL")
+    if path:
+        writer = JsonlMetricsWriter(metrics, path, interval=int(os.getenv("METRICS_INTERVAL", "60")))
+        writer.start()
+        exporters.append(writer)
+    return exporters
+
+def run_trading_bot(symbols=None, refresh_markets=False):
+    import asyncio
 
-        # Update historical data and calculate RSI signals
-        latest_signal = generate_signals(historical_data)
-
-        # Get wallet balance and calculate appropriate size_delta_usd for open/close
-        wallet_balance_usd = get_wallet_balance()
-        open_percentage = 0.1  # Example: Use 10% of wallet balance for opening positions
-        close_percentage = 0.1  # Example: Close 90% of the current position, retaining 10%
-
-        # Open a Long Position
-        if latest_signal['Position'] == 1 and current_position == 0:
-            size_delta_usd = calculate_open_position_amount(wallet_balance_usd, open_percentage)
-            open_position(is_long=True, eth_price=eth_price, leverage=5, size_delta_usd=size_delta_usd, percentage=.01)
-            current_position = 1
-            current_position_value = size_delta_usd  # Track the initial position value
-            print(f"Long position opened with size {size_delta_usd} USD.")
-
-        # Open a Short Position
-        elif latest_signal['Position'] == -1 and current_position == 0:
-            size_delta_usd = calculate_open_position_amount(wallet_balance_usd, open_percentage)
-            open_position(is_long=False, eth_price=eth_price, leverage=5, size_delta_usd=size_delta_usd, percentage=.01)
-            current_position = -1
-            current_position_value = size_delta_usd  # Track the initial position value
-            print(f"Short position opened with size {size_delta_usd} USD.")
-
-        # Close Long Position
-        elif current_position == 1 and latest_signal['Position'] == 0:
-            # Calculate size_delta_usd for closing the position
-            size_delta_usd = calculate_close_position_amount(current_position_value, close_percentage)
-            close_position(is_long=True, eth_price=eth_price, size_delta_usd=size_delta_usd, percentage=.01)
-            current_position = 0
-            current_position_value = 0  # Reset position value after closing
-            print(f"Long position closed with size {size_delta_usd} USD.")
-
-        # Close Short Position
-        elif current_position == -1 and latest_signal['Position'] == 0:
-            # Calculate size_delta_usd for closing the position
-            size_delta_usd = calculate_close_position_amount(current_position_value, close_percentage)
-            close_position(is_long=False, eth_price=eth_price, size_delta_usd=size_delta_usd, percentage=.01)
-            current_position = 0
-            current_position_value = 0  # Reset position value after closing
-            print(f"Short position closed with size {size_delta_usd} USD.")
-
-        # Wait for the next iteration
-        print("Sleeping for 5 minutes...")
-        time.sleep(300)
-        print("\n")
+    try:
+        start(snapshot_max_age=0 if refresh_markets else MARKET_SNAPSHOT_MAX_AGE)
+    except RuntimeError as e:
+        logger.error("Cannot start the trading bot: %s", e)
+        raise SystemExit(1)
+    exporters = start_metrics_exporters()
+    try:
+        if symbols:
+            asyncio.run(run_multi_market_bot_async(symbols))
+        else:
+            asyncio.run(run_trading_bot_async())
+    except KeyboardInterrupt:
+        logger.info("Trading bot stopped.")
+    finally:
+        for exporter in exporters:
+            if isinstance(exporter, JsonlMetricsWriter):
+                exporter.stop()
+            else:
+                exporter.shutdown()
+        # Final snapshot, so the next start replays nothing
+        journal.close()
 
 # Run the bot
 if __name__ == "__main__":
-    run_trading_bot()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GMX RSI trading bot")
+    parser.add_argument("--markets", help="Comma-separated market symbols to trade together, e.g. ETH,BTC,SOL")
+    parser.add_argument("--refresh-markets", action="store_true", help="Query GMX for markets instead of using the snapshot")
+    args = parser.parse_args()
+    run_trading_bot(args.markets.split(",") if args.markets else None, args.refresh_markets)
+
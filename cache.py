@@ -0,0 +1,158 @@
+import functools
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+# Size-bounded LRU cache where every entry carries its own expiry time
+class TTLCache:
+
+    def __init__(self, maxsize=128, clock=time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Returns (True, value) on a fresh hit, (False, None) on a miss or an expired entry
+    def lookup(self, key, endpoint=None):
+        endpoint = endpoint or key
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if self._clock() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits[endpoint] += 1
+                    return True, value
+                del self._entries[key]
+            self.misses[endpoint] += 1
+            return False, None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    # Drop one key, every key whose first element matches an endpoint name, or everything
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                return
+            for cached_key in list(self._entries):
+                if cached_key == key or (isinstance(cached_key, tuple) and cached_key[0] == key):
+                    del self._entries[cached_key]
+
+    def stats(self):
+        with self._lock:
+            endpoints = set(self.hits) | set(self.misses)
+            per_endpoint = {}
+            for endpoint in endpoints:
+                hits, misses = self.hits[endpoint], self.misses[endpoint]
+                per_endpoint[endpoint] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                }
+            return per_endpoint
+
+
+# Cache a GetGMXv2Stats-style method using the owner's `cache` and per-method `cache_ttls`
+def cached_method(func):
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args):
+        ttl = self.cache_ttls.get(name)
+        if not ttl:
+            return func(self, *args)
+        key = (name,) + args
+        hit, value = self.cache.lookup(key, endpoint=name)
+        if hit:
+            return value
+        value = func(self, *args)
+        self.cache.set(key, value, ttl)
+        return value
+
+    return wrapper
+
+
+if __name__ == "__main__":
+    now = [0.0]
+
+    # A GetGMXv2Stats-shaped owner: cached getters with per-method TTLs, counting real fetches
+    class Stats:
+
+        def __init__(self, cache_ttls, maxsize=64):
+            self.cache = TTLCache(maxsize=maxsize, clock=lambda: now[0])
+            self.cache_ttls = cache_ttls
+            self.fetches = defaultdict(int)
+
+        @cached_method
+        def get_oracle_prices(self):
+            self.fetches["get_oracle_prices"] += 1
+            return {"fetched_at": now[0]}
+
+        @cached_method
+        def get_market(self, symbol):
+            self.fetches[symbol] += 1
+            return {"symbol": symbol, "fetched_at": now[0]}
+
+        @cached_method
+        def get_uncached(self):
+            self.fetches["get_uncached"] += 1
+            return now[0]
+
+    stats = Stats({"get_oracle_prices": 5, "get_market": 60})
+
+    # TTL expiry: served from the cache until the entry is `ttl` seconds old, then fetched again
+    first = stats.get_oracle_prices()
+    now[0] = 4.999
+    assert stats.get_oracle_prices() is first and stats.fetches["get_oracle_prices"] == 1
+    now[0] = 5.0
+    assert stats.get_oracle_prices()["fetched_at"] == 5.0 and stats.fetches["get_oracle_prices"] == 2
+    # A method without a TTL is never cached
+    stats.get_uncached()
+    stats.get_uncached()
+    assert stats.fetches["get_uncached"] == 2 and "get_uncached" not in stats.cache.stats()
+
+    # Hit/miss stats per endpoint: arguments share their method's counters
+    stats.get_market("ETH")
+    stats.get_market("BTC")
+    stats.get_market("ETH")
+    assert stats.cache.stats()["get_market"] == {"hits": 1, "misses": 2, "hit_rate": 1 / 3}
+    assert stats.cache.stats()["get_oracle_prices"] == {"hits": 1, "misses": 2, "hit_rate": 1 / 3}
+    assert stats.fetches["ETH"] == 1 and stats.fetches["BTC"] == 1
+
+    # invalidate(): one method (all its argument keys) or everything
+    stats.cache.invalidate("get_market")
+    assert len(stats.cache) == 1
+    stats.get_market("ETH")
+    assert stats.fetches["ETH"] == 2
+    stats.cache.invalidate()
+    assert len(stats.cache) == 0
+
+    # LRU eviction: a full cache drops the least recently used entry, and a hit counts as a use
+    stats = Stats({"get_market": 60}, maxsize=3)
+    for symbol in ("ETH", "BTC", "SOL"):
+        stats.get_market(symbol)
+    stats.get_market("ETH")  # ETH is now the most recently used
+    stats.get_market("ARB")  # Evicts BTC
+    assert len(stats.cache) == 3
+    stats.get_market("ETH")
+    stats.get_market("SOL")
+    assert stats.fetches["ETH"] == 1 and stats.fetches["SOL"] == 1
+    stats.get_market("BTC")
+    assert stats.fetches["BTC"] == 2
+    # An expired entry counts as a miss and is dropped on lookup
+    now[0] += 60
+    assert stats.cache.lookup(("get_market", "ETH"), endpoint="get_market") == (False, None)
+    assert len(stats.cache) == 2
+    print("TTL expiry, LRU eviction, invalidation and hit/miss stats check out on a simulated clock.")
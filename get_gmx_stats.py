@@ -1,6 +1,16 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from cache import TTLCache, cached_method
+from http_pool import get_session
+from metrics import metrics
+from price_table import OraclePriceTable
 from utils import _set_paths
 
-print("Setting paths...")
+logger = logging.getLogger(__name__)
+
+logger.debug("Setting paths...")
 _set_paths()
 
 from gmx_python_sdk.scripts.v2.get.get_available_liquidity import GetAvailableLiquidity
@@ -18,81 +28,237 @@ from gmx_python_sdk.scripts.v2.get.get_glv_stats import GlvStats
 from gmx_python_sdk.scripts.v2.gmx_utils import ConfigManager
 
 
+# OraclePrices that goes through the shared pooled session instead of a bare requests.get
+class PooledOraclePrices(OraclePrices):
+
+    def __init__(self, chain, http):
+        super().__init__(chain)
+        self.http = http
+
+    def _make_query(self):
+        response = self.http.get(self.oracle_url[self.chain], endpoint="gmx-oracle")
+        response.raise_for_status()
+        return response
+
+
 class GetGMXv2Stats:
 
-    def __init__(self, config, to_json, to_csv):
-        print("Initializing GetGMXv2Stats...")
+    # Getters included in a full snapshot, in the order they used to be run one by one
+    STATS_QUERIES = (
+        "get_available_markets",
+        "get_available_liquidity",
+        "get_borrow_apr",
+        "get_claimable_fees",
+        "get_contract_tvl",
+        "get_funding_apr",
+        "get_gm_price",
+        "get_open_interest",
+        "get_oracle_prices",
+        "get_pool_tvl",
+        "get_glv_stats",
+    )
+
+    # Seconds each getter's result stays cached; markets barely change, oracle prices go stale fast
+    DEFAULT_CACHE_TTLS = {
+        "get_available_markets": 3600,
+        "get_oracle_prices": 5,
+        "get_oracle_price_table": 5,
+        "get_available_liquidity": 60,
+        "get_borrow_apr": 60,
+        "get_claimable_fees": 60,
+        "get_contract_tvl": 60,
+        "get_funding_apr": 60,
+        "get_gm_price": 30,
+        "get_open_interest": 30,
+        "get_pool_tvl": 60,
+        "get_glv_stats": 60,
+    }
+
+    # With a snapshot_store (stats_store.StatsSnapshotStore), get_all_stats() results are appended to it
+    # and the SDK's per-getter CSV/JSON files are turned off.
+    def __init__(self, config, to_json, to_csv, cache_ttls=None, cache_size=64, http=None, snapshot_store=None):
+        logger.debug("Initializing GetGMXv2Stats...")
         self.config = config
+        self.snapshot_store = snapshot_store
+        if snapshot_store is not None and (to_json or to_csv):
+            logger.info("Writing stats snapshots to %s instead of per-getter CSV/JSON files.", snapshot_store.root)
+            to_json = to_csv = False
         self.to_json = to_json
         self.to_csv = to_csv
-        print(f"Initialized GetGMXv2Stats with to_json={self.to_json} and to_csv={self.to_csv}")
-
+        self.cache_ttls = dict(self.DEFAULT_CACHE_TTLS, **(cache_ttls or {}))
+        self.cache = TTLCache(maxsize=cache_size)
+        self.http = http or get_session()
+        self.http.bind_web3_session(self.config.rpc)
+        # address -> decimals for converting oracle prices to USD; set from the markets' token metadata
+        self.token_decimals = None
+        logger.debug("Initialized GetGMXv2Stats with to_json=%s and to_csv=%s", self.to_json, self.to_csv)
+
+    @cached_method
+    @metrics.timed("gmx_stats.get_available_liquidity")
     def get_available_liquidity(self):
-        print("Fetching available liquidity...")
+        logger.debug("Fetching available liquidity...")
         result = GetAvailableLiquidity(self.config).get_data(to_csv=self.to_csv, to_json=self.to_json)
-        print("Fetched available liquidity.")
+        logger.debug("Fetched available liquidity.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_borrow_apr")
     def get_borrow_apr(self):
-        print("Fetching borrow APR...")
+        logger.debug("Fetching borrow APR...")
         result = GetBorrowAPR(self.config).get_data(to_csv=self.to_csv, to_json=self.to_json)
-        print("Fetched borrow APR.")
+        logger.debug("Fetched borrow APR.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_claimable_fees")
     def get_claimable_fees(self):
-        print("Fetching claimable fees...")
+        logger.debug("Fetching claimable fees...")
         result = GetClaimableFees(self.config).get_data(to_csv=self.to_csv, to_json=self.to_json)
-        print("Fetched claimable fees.")
+        logger.debug("Fetched claimable fees.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_contract_tvl")
     def get_contract_tvl(self):
-        print("Fetching contract TVL...")
+        logger.debug("Fetching contract TVL...")
         result = ContractTVL(self.config).get_pool_balances(to_json=self.to_json)
-        print("Fetched contract TVL.")
+        logger.debug("Fetched contract TVL.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_funding_apr")
     def get_funding_apr(self):
-        print("Fetching funding APR...")
+        logger.debug("Fetching funding APR...")
         result = GetFundingFee(self.config).get_data(to_csv=self.to_csv, to_json=self.to_json)
-        print("Fetched funding APR.")
+        logger.debug("Fetched funding APR.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_gm_price")
     def get_gm_price(self):
-        print("Fetching GM prices...")
+        logger.debug("Fetching GM prices...")
         result = GMPrices(self.config).get_price_traders(to_csv=self.to_csv, to_json=self.to_json)
-        print("Fetched GM prices.")
+        logger.debug("Fetched GM prices.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_available_markets")
     def get_available_markets(self):
-        print("Fetching available markets...")
+        logger.debug("Fetching available markets...")
         result = Markets(self.config).get_available_markets()
-        print("Fetched available markets.")
+        logger.debug("Fetched available markets.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_open_interest")
     def get_open_interest(self):
-        print("Fetching open interest...")
+        logger.debug("Fetching open interest...")
         result = OpenInterest(self.config).get_data(to_csv=self.to_csv, to_json=self.to_json)
-        print("Fetched open interest.")
+        logger.debug("Fetched open interest.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_oracle_prices")
     def get_oracle_prices(self):
-        print("Fetching oracle prices...")
-        result = OraclePrices(self.config.chain).get_recent_prices()
-        print("Fetched oracle prices.")
+        logger.debug("Fetching oracle prices...")
+        result = PooledOraclePrices(self.config.chain, self.http).get_recent_prices()
+        logger.debug("Fetched oracle prices.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_pool_tvl")
     def get_pool_tvl(self):
-        print("Fetching pool TVL...")
+        logger.debug("Fetching pool TVL...")
         result = GetPoolTVL(self.config).get_pool_balances(to_csv=self.to_csv, to_json=self.to_json)
-        print("Fetched pool TVL.")
+        logger.debug("Fetched pool TVL.")
         return result
 
+    @cached_method
+    @metrics.timed("gmx_stats.get_glv_stats")
     def get_glv_stats(self):
-        print("Fetching GLV stats...")
+        logger.debug("Fetching GLV stats...")
         result = GlvStats(self.config).get_glv_stats()
-        print("Fetched GLV stats.")
+        logger.debug("Fetched GLV stats.")
         return result
 
+    # Oracle prices parsed once into an OraclePriceTable (O(1) lookups by symbol or address), in USD using
+    # token_decimals. Built from its own fetch so only the compact table, not the raw payload, stays cached.
+    @cached_method
+    @metrics.timed("gmx_stats.get_oracle_price_table")
+    def get_oracle_price_table(self):
+        return OraclePriceTable.from_payload(PooledOraclePrices(self.config.chain, self.http).get_recent_prices(),
+                                             token_decimals=self.token_decimals)
+
+    # Drop cached results for one getter (e.g. "get_oracle_prices") or for all of them
+    def invalidate_cache(self, name=None):
+        self.cache.invalidate(name)
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    # `fresh` skips the cached value (the fetched one is cached for later callers)
+    def _run_query(self, name, fresh=False):
+        # SDK getters build their own web3 providers; point this worker thread at the pooled session first
+        self.http.bind_web3_session(self.config.rpc)
+        if fresh:
+            self.cache.invalidate(name)
+        return getattr(self, name)()
+
+    # Run the stats getters concurrently; snapshot latency is set by the slowest query, not the sum.
+    # With fresh (the default when recording to a snapshot_store) every getter is fetched now rather than
+    # served from the cache, so stored values really are from the snapshot's timestamp.
+    def get_all_stats(self, queries=None, max_concurrency=4, timeout=30, fresh=None):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        if timeout <= 0:
+            raise ValueError(f"timeout must be positive, got {timeout}")
+        queries = list(queries or self.STATS_QUERIES)
+        if fresh is None:
+            fresh = self.snapshot_store is not None
+        started_at = time.time()
+        logger.debug("Fetching %s stats concurrently (max_concurrency=%s, timeout=%ss)...", len(queries), max_concurrency, timeout)
+        results = {}
+        errors = {}
+
+        # One thread per query so a timed-out call never holds a slot the remaining queries need;
+        # max_concurrency is enforced by how many queries are in flight at once.
+        executor = ThreadPoolExecutor(max_workers=len(queries) or 1, thread_name_prefix="gmx-stats")
+        pending = list(queries)
+        running = {}
+        try:
+            while pending or running:
+                while pending and len(running) < max_concurrency:
+                    name = pending.pop(0)
+                    running[executor.submit(self._run_query, name, fresh)] = (name, time.monotonic())
+
+                next_deadline = min(started for _, started in running.values()) + timeout
+                done, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, _ = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        logger.error("Error fetching %s: %s", name, e)
+                        errors[name] = e
+
+                now = time.monotonic()
+                for future, (name, started) in list(running.items()):
+                    if now - started >= timeout:
+                        # The worker thread cannot be interrupted; its result is simply discarded
+                        running.pop(future)
+                        future.cancel()
+                        logger.error("Timed out fetching %s after %ss.", name, timeout)
+                        errors[name] = TimeoutError(f"{name} did not complete within {timeout}s")
+        finally:
+            executor.shutdown(wait=False)
+
+        logger.debug("Fetched %s stats, %s failed.", len(results), len(errors))
+        if self.snapshot_store is not None:
+            # Stamped with when the fetches started: no value in the snapshot is older than that
+            self.snapshot_store.add(started_at, results, errors)
+        return {"results": results, "errors": errors}
+
 
 if __name__ == "__main__":
 
@@ -112,48 +278,11 @@ if __name__ == "__main__":
     )
     print("GetGMXv2Stats instance created.")
 
-    print("Fetching markets...")
-    markets = stats_object.get_available_markets()
-    print("Markets fetched:", markets)
-
-    print("Fetching available liquidity...")
-    liquidity = stats_object.get_available_liquidity()
-    print("Available liquidity:", liquidity)
-
-    print("Fetching borrow APR...")
-    borrow_apr = stats_object.get_borrow_apr()
-    print("Borrow APR:", borrow_apr)
-
-    print("Fetching claimable fees...")
-    claimable_fees = stats_object.get_claimable_fees()
-    print("Claimable fees:", claimable_fees)
-
-    print("Fetching contract TVL...")
-    contract_tvl = stats_object.get_contract_tvl()
-    print("Contract TVL:", contract_tvl)
-
-    print("Fetching funding APR...")
-    funding_apr = stats_object.get_funding_apr()
-    print("Funding APR:", funding_apr)
-
-    print("Fetching GM prices...")
-    gm_prices = stats_object.get_gm_price()
-    print("GM prices:", gm_prices)
-
-    print("Fetching open interest...")
-    open_interest = stats_object.get_open_interest()
-    print("Open interest:", open_interest)
-
-    print("Fetching oracle prices...")
-    oracle_prices = stats_object.get_oracle_prices()
-    print("Oracle prices:", oracle_prices)
-
-    print("Fetching pool TVL...")
-    pool_tvl = stats_object.get_pool_tvl()
-    print("Pool TVL:", pool_tvl)
-
-    print("Fetching GLV stats...")
-    glv_price = stats_object.get_glv_stats()
-    print("GLV stats:", glv_price)
+    print("Fetching all stats...")
+    snapshot = stats_object.get_all_stats()
+    for name, result in snapshot["results"].items():
+        print(f"{name}:", result)
+    for name, error in snapshot["errors"].items():
+        print(f"{name} failed:", error)
 
     print("Execution completed.")
@@ -0,0 +1,306 @@
+import json
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LatencyHistogram
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+
+# Stops calling an endpoint after repeated failures, then lets one probe through after reset_timeout.
+# Other calls keep failing fast while the probe is in flight; a probe that never reports back frees the
+# slot after another reset_timeout. Not thread-safe on its own; PooledSession calls it under its lock.
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state != "half-open":
+            return state == "closed"
+        now = self._clock()
+        if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+            return False
+        self.probe_started = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = self._clock()
+            self.probe_started = None
+
+
+# JSON-RPC methods whose effect a retry could repeat: a resent request may broadcast or sign twice
+NON_IDEMPOTENT_RPC_METHODS = frozenset({
+    "eth_sendRawTransaction", "eth_sendTransaction", "eth_sign", "eth_signTransaction",
+    "personal_sendTransaction", "personal_sign",
+})
+
+
+# JSON-RPC method names in a request body (one call or a batch); empty for anything else
+def rpc_methods(kwargs):
+    body = kwargs.get("json")
+    if body is None and kwargs.get("data") is not None:
+        try:
+            body = json.loads(kwargs["data"])
+        except (TypeError, ValueError):
+            return set()
+    calls = body if isinstance(body, list) else [body]
+    return {call.get("method") for call in calls if isinstance(call, dict)}
+
+
+# requests.Session with a bounded keep-alive pool, default timeouts, jittered retries,
+# a circuit breaker and a latency histogram per endpoint. Safe to share between threads.
+# JSON-RPC requests carrying a non-idempotent method (e.g. eth_sendRawTransaction) are never retried.
+class PooledSession(requests.Session):
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10, max_retries=3,
+                 backoff_base=0.25, backoff_max=5.0, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        super().__init__()
+        self.clock = clock
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # pool_block keeps the number of open connections per host at pool_size
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._histograms = {}
+        self._errors = {}
+
+    def _endpoint_state(self, endpoint):
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout, self.clock)
+                self._histograms[endpoint] = LatencyHistogram()
+                self._errors[endpoint] = 0
+            return self._breakers[endpoint], self._histograms[endpoint]
+
+    def _backoff(self, attempt):
+        # "Full jitter": a random delay up to the exponential cap spreads retries from concurrent callers
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    # `endpoint` labels metrics and the circuit breaker; defaults to the URL's host
+    def request(self, method, url, *args, endpoint=None, **kwargs):
+        endpoint = endpoint or urlparse(url).netloc
+        breaker, histogram = self._endpoint_state(endpoint)
+        kwargs.setdefault("timeout", self.timeout)
+        max_retries = self.max_retries
+        if rpc_methods(kwargs) & NON_IDEMPOTENT_RPC_METHODS:
+            max_retries = 0
+
+        attempt = 0
+        while True:
+            with self._lock:
+                allowed = breaker.allow()
+            if not allowed:
+                raise CircuitOpenError(f"Circuit open for {endpoint} after {breaker.failures} consecutive failures")
+            started = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._record(endpoint, breaker, histogram, started, failed=True)
+                if attempt >= max_retries:
+                    raise
+            else:
+                failed = response.status_code in self.RETRY_STATUSES
+                self._record(endpoint, breaker, histogram, started, failed=failed)
+                if not failed or attempt >= max_retries:
+                    return response
+                response.close()
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _record(self, endpoint, breaker, histogram, started, failed):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            histogram.observe(elapsed)
+            if failed:
+                self._errors[endpoint] += 1
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    "latency": self._histograms[endpoint].snapshot(),
+                    "errors": self._errors[endpoint],
+                    "circuit": self._breakers[endpoint].state,
+                }
+                for endpoint in self._breakers
+            }
+
+    # Make web3 providers created for endpoint_uri in the calling thread reuse this session.
+    # web3 v6 caches one session per (thread, endpoint); providers the GMX SDK builds internally
+    # pick it up as long as this runs first in that thread. This goes through web3's private
+    # web3._utils.request.cache_and_return_session, hence the web3 6.x pin in the README; on other
+    # versions it returns False and SDK providers keep their own sessions.
+    # Until something has imported web3 no provider can be using its session cache, so this does not
+    # import it (over a second) just to bind; the SDK imports web3 with its own modules, and callers
+    # bind again before each SDK call.
+    def bind_web3_session(self, endpoint_uri):
+        if not endpoint_uri or "web3" not in sys.modules:
+            return False
+        try:
+            from web3._utils.request import cache_and_return_session
+        except ImportError:
+            return False
+        return cache_and_return_session(endpoint_uri, self) is self
+
+    def web3_provider(self, endpoint_uri):
+        from web3 import Web3
+
+        return Web3.HTTPProvider(endpoint_uri, request_kwargs={"timeout": self.timeout}, session=self)
+
+
+_default_session = None
+_default_lock = threading.Lock()
+
+
+# Process-wide shared session used by the bot, GetGMXv2Stats and the order path
+def get_session():
+    global _default_session
+    with _default_lock:
+        if _default_session is None:
+            _default_session = PooledSession()
+        return _default_session
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    # Local HTTP stub: GET /fail/<n> answers 503 for the first n requests to that path, /slow sleeps,
+    # POST / is a JSON-RPC endpoint that always answers 503. Every request's client port is recorded.
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse shows up as repeated ports
+        counts = {}
+        ports = []
+        lock = threading.Lock()
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body=b"{}"):
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with self.lock:
+                self.ports.append(self.client_address[1])
+                self.counts[self.path] = self.counts.get(self.path, 0) + 1
+                count = self.counts[self.path]
+            if self.path.startswith("/fail/"):
+                self._reply(503 if count <= int(self.path.rsplit("/", 1)[1]) else 200)
+            elif self.path == "/slow":
+                time.sleep(0.3)
+                self._reply(200)
+            else:
+                self._reply(200)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            with self.lock:
+                self.counts[json.loads(body)["method"]] = self.counts.get(json.loads(body)["method"], 0) + 1
+            self._reply(503)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    now = [0.0]
+    session = PooledSession(pool_size=4, max_retries=3, backoff_base=0.001, failure_threshold=5, reset_timeout=30,
+                            clock=lambda: now[0])
+
+    # Retries: two 503s then a 200 is one successful call; a request that keeps failing gives up after max_retries
+    assert session.get(f"{base}/fail/2", endpoint="retry").status_code == 200
+    assert StubHandler.counts["/fail/2"] == 3
+    assert session.get(f"{base}/fail/99", endpoint="exhaust").status_code == 503
+    assert StubHandler.counts["/fail/99"] == 4
+    assert session.metrics()["retry"]["errors"] == 2
+
+    # Non-idempotent JSON-RPC calls are sent once; reads are retried
+    rpc = {"jsonrpc": "2.0", "id": 1, "params": []}
+    session.post(base, json=dict(rpc, method="eth_sendRawTransaction"), endpoint="rpc-send")
+    session.post(base, data=json.dumps(dict(rpc, method="eth_call")).encode(), endpoint="rpc-read")
+    assert StubHandler.counts["eth_sendRawTransaction"] == 1 and StubHandler.counts["eth_call"] == 4
+
+    # Pooling: sequential calls reuse one keep-alive connection; 16 concurrent calls open at most pool_size
+    del StubHandler.ports[:]
+    for _ in range(20):
+        session.get(f"{base}/ok", endpoint="pool")
+    assert len(set(StubHandler.ports)) == 1, StubHandler.ports
+    del StubHandler.ports[:]
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(lambda _: session.get(f"{base}/slow", endpoint="pool"), range(16)))
+    assert len(set(StubHandler.ports)) <= 4, set(StubHandler.ports)
+
+    # Breaker: opens after failure_threshold consecutive failures (the call that opens it stops retrying),
+    # fails fast while open, then lets exactly one probe through when half-open
+    assert session.get(f"{base}/fail/999", endpoint="breaker").status_code == 503
+    try:
+        session.get(f"{base}/fail/999", endpoint="breaker")
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError("the breaker did not open")
+    assert StubHandler.counts["/fail/999"] == 5 and session.metrics()["breaker"]["circuit"] == "open"
+    try:
+        session.get(f"{base}/ok", endpoint="breaker")
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError("an open breaker let a call through")
+    now[0] += 30
+
+    def probe(_):
+        try:
+            return session.get(f"{base}/slow", endpoint="breaker").status_code
+        except CircuitOpenError:
+            return "rejected"
+
+    with ThreadPoolExecutor(4) as pool:
+        outcomes = list(pool.map(probe, range(4)))
+    assert sorted(outcomes, key=str) == [200, "rejected", "rejected", "rejected"], outcomes
+    assert session.metrics()["breaker"]["circuit"] == "closed"
+    assert session.get(f"{base}/ok", endpoint="breaker").status_code == 200
+    server.shutdown()
+    print("Retries, non-idempotent RPC calls, connection pooling and the half-open breaker behave as expected.")
@@ -0,0 +1,287 @@
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Fixed-size circular buffer of floats; memory stays bounded no matter how long the bot runs
+class RingBuffer:
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("RingBuffer capacity must be positive")
+        self.capacity = capacity
+        self._data = np.full(capacity, np.nan)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value):
+        # Returns the value that fell out of the window (or None while filling up)
+        evicted = self._data[self._next] if self._size == self.capacity else None
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+        return evicted
+
+    def last(self):
+        if self._size == 0:
+            return None
+        return self._data[(self._next - 1) % self.capacity]
+
+    def to_array(self):
+        # Oldest-to-newest copy of the buffered values
+        if self._size < self.capacity:
+            return self._data[:self._size].copy()
+        return np.concatenate((self._data[self._next:], self._data[:self._next]))
+
+
+# Simple moving average kept as a running sum; matches ta.SMA once the window is full
+class StreamingSMA:
+
+    def __init__(self, period):
+        self.period = period
+        self._window = RingBuffer(period)
+        self._sum = 0.0
+        self.value = math.nan
+
+    def update(self, value):
+        evicted = self._window.append(value)
+        self._sum += value
+        if evicted is not None:
+            self._sum -= evicted
+        self.value = self._sum / self.period if len(self._window) == self.period else math.nan
+        return self.value
+
+
+# Wilder-smoothed RSI; seeded with a plain average of the first `period` changes like ta.RSI
+class StreamingRSI:
+
+    def __init__(self, period=14):
+        self.period = period
+        self._prev_close = None
+        self._count = 0
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+        self.value = math.nan
+
+    def update(self, close):
+        if self._prev_close is None:
+            self._prev_close = close
+            return self.value
+
+        change = close - self._prev_close
+        self._prev_close = close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        self._count += 1
+
+        if self._count < self.period:
+            self._avg_gain += gain
+            self._avg_loss += loss
+            return self.value
+        if self._count == self.period:
+            self._avg_gain = (self._avg_gain + gain) / self.period
+            self._avg_loss = (self._avg_loss + loss) / self.period
+        else:
+            self._avg_gain = (self._avg_gain * (self.period - 1) + gain) / self.period
+            self._avg_loss = (self._avg_loss * (self.period - 1) + loss) / self.period
+
+        total = self._avg_gain + self._avg_loss
+        self.value = 100.0 * self._avg_gain / total if total != 0 else 0.0
+        return self.value
+
+
+# Wilder RSI for many markets at once: one array update per candle instead of one object per market.
+# NaN closes (no price this candle) leave that market's state untouched.
+class VectorRSI:
+
+    def __init__(self, size, period=14):
+        self.period = period
+        self._prev_close = np.full(size, np.nan)
+        self._count = np.zeros(size, dtype=np.int64)
+        self._avg_gain = np.zeros(size)
+        self._avg_loss = np.zeros(size)
+        self.value = np.full(size, np.nan)
+
+    def update(self, closes):
+        closes = np.asarray(closes, dtype=np.float64)
+        valid = ~np.isnan(closes)
+        has_prev = valid & ~np.isnan(self._prev_close)
+        change = np.where(has_prev, closes - np.where(has_prev, self._prev_close, 0.0), 0.0)
+        gain = np.maximum(change, 0.0)
+        loss = np.maximum(-change, 0.0)
+        self._count += has_prev
+
+        seeding = has_prev & (self._count <= self.period)
+        smoothing = has_prev & (self._count > self.period)
+        at_seed = has_prev & (self._count == self.period)
+        period = self.period
+        self._avg_gain = np.where(seeding, self._avg_gain + gain, self._avg_gain)
+        self._avg_loss = np.where(seeding, self._avg_loss + loss, self._avg_loss)
+        self._avg_gain = np.where(at_seed, self._avg_gain / period, self._avg_gain)
+        self._avg_loss = np.where(at_seed, self._avg_loss / period, self._avg_loss)
+        self._avg_gain = np.where(smoothing, (self._avg_gain * (period - 1) + gain) / period, self._avg_gain)
+        self._avg_loss = np.where(smoothing, (self._avg_loss * (period - 1) + loss) / period, self._avg_loss)
+
+        ready = has_prev & (self._count >= period)
+        total = self._avg_gain + self._avg_loss
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rsi = np.where(total != 0, 100.0 * self._avg_gain / total, 0.0)
+        self.value = np.where(ready, rsi, self.value)
+        self._prev_close = np.where(valid, closes, self._prev_close)
+        return self.value
+
+
+# Streaming indicator engine: O(1) state per indicator, updated once per closed candle.
+#
+# Given a SignalRegistry, Position comes from its `strategy` signal instead of the engine's RSI thresholds.
+# The streamed indicators (RSI, Volume_MA) stand in for the registry's series of the same name, so a
+# strategy built only on them (the default "rsi") is evaluated on the current bar alone. Any other strategy
+# is computed over the buffered bars, with the streamed series buffered alongside the closes so it sees
+# the same RSI as the full history. `sources` maps the extra columns the strategy reads (e.g. Funding_Long)
+# to callables that are read once per bar and buffered the same way.
+class IndicatorEngine:
+
+    def __init__(self, rsi_period=14, volume_ma_period=200, long_threshold=41, short_threshold=60, capacity=200,
+                 registry=None, strategy="rsi", sources=None):
+        self.long_threshold = long_threshold
+        self.short_threshold = short_threshold
+        self.indicators = {
+            "RSI": (StreamingRSI(rsi_period), "Close"),
+            "Volume_MA": (StreamingSMA(volume_ma_period), "Volume"),
+        }
+        self.capacity = capacity
+        self.timestamps = [None] * capacity
+        self.closes = RingBuffer(capacity)
+        self.volumes = RingBuffer(capacity)
+        self.streamed = {name: RingBuffer(capacity) for name in self.indicators}
+        self.registry = registry
+        self.strategy = strategy
+        self.sources = {name: (source, RingBuffer(capacity)) for name, source in (sources or {}).items()}
+        self.per_bar = False
+        if registry is not None:
+            self._plan_strategy()
+        self._seeding = False
+        self._latest = None
+
+    # Register an extra indicator; it must expose update(value) and a `value` attribute
+    def add_indicator(self, name, indicator, source="Close"):
+        self.indicators[name] = (indicator, source)
+        self.streamed[name] = RingBuffer(self.capacity)
+        if self.registry is not None:
+            self._plan_strategy()
+
+    # Check the strategy's columns are available, and whether it reads nothing but streamed indicators
+    # (then the current bar is enough)
+    def _plan_strategy(self):
+        needed = self.registry.columns([self.strategy], provided=self.indicators)
+        missing = needed - {"Close", "Volume"} - set(self.sources) - set(self.indicators)
+        if missing:
+            raise ValueError(f"Strategy {self.strategy!r} needs sources for {sorted(missing)}")
+        self.per_bar = needed <= set(self.indicators)
+
+    # `columns` supplies the source columns' values for this bar (when replaying history) instead of reading the sources
+    def update(self, timestamp, close, volume=0.0, columns=None):
+        close = float(close)
+        volume = float(volume)
+        self.timestamps[self.closes._next] = timestamp
+        self.closes.append(close)
+        self.volumes.append(volume)
+        for name, (source, buffer) in self.sources.items():
+            buffer.append(self._read_source(name, source) if columns is None else columns.get(name, math.nan))
+
+        bar = {"Timestamp": timestamp, "Close": close, "Volume": volume}
+        for name, (indicator, source) in self.indicators.items():
+            bar[name] = indicator.update(bar[source])
+            self.streamed[name].append(bar[name])
+
+        if self.registry is None:
+            rsi = bar["RSI"]
+            bar["Long"] = 1 if rsi < self.long_threshold else 0
+            bar["Short"] = -1 if rsi > self.short_threshold else 0
+            bar["Position"] = bar["Long"] + bar["Short"]
+        elif not self._seeding:
+            self._apply_strategy(bar)
+        self._latest = bar
+        return bar
+
+    def _read_source(self, name, source):
+        try:
+            value = source()
+        except Exception as e:
+            logger.warning("Error reading signal source %s: %s", name, e)
+            return math.nan
+        return math.nan if value is None else float(value)
+
+    # Position from the registry strategy, on this bar's streamed values or over the buffered bars;
+    # the other series' latest values are added to the bar
+    def _apply_strategy(self, bar):
+        if self.per_bar:
+            columns = {name: np.array([bar[name]]) for name in self.indicators}
+        else:
+            columns = {"Close": self.closes.to_array(), "Volume": self.volumes.to_array()}
+            for name, buffer in self.streamed.items():
+                columns[name] = buffer.to_array()
+            for name, (_, buffer) in self.sources.items():
+                columns[name] = buffer.to_array()
+        series = self.registry.compute(columns, [self.strategy])
+        for name, values in series.items():
+            if name != self.strategy:
+                bar.setdefault(name, float(values[-1]))
+        position = int(series[self.strategy][-1])
+        bar["Long"] = 1 if position == 1 else 0
+        bar["Short"] = -1 if position == -1 else 0
+        bar["Position"] = position
+
+    # Replay a DataFrame with Timestamp/Close/Volume columns (e.g. from initialize_historical_data), plus any
+    # source columns it has; the strategy is evaluated once, on the last bar
+    def seed(self, data):
+        names = [name for name in self.sources if name in data]
+        self._seeding = self.registry is not None
+        try:
+            for timestamp, close, volume, *values in zip(data["Timestamp"], data["Close"], data["Volume"],
+                                                          *(data[name] for name in names)):
+                self.update(timestamp, close, volume, dict(zip(names, values)))
+        finally:
+            self._seeding = False
+        if self.registry is not None and self._latest is not None:
+            self._apply_strategy(self._latest)
+        return self._latest
+
+    def latest(self):
+        return self._latest
+
+    @property
+    def last_timestamp(self):
+        return self._latest["Timestamp"] if self._latest else None
+
+
+if __name__ == "__main__":
+    import talib as ta
+
+    print("Checking streaming indicators against TA-Lib...")
+    rng = np.random.default_rng(7)
+    closes = 2000 + np.cumsum(rng.normal(0, 5, 5000))
+    volumes = rng.uniform(1e6, 5e6, 5000)
+
+    engine = IndicatorEngine(capacity=500)
+    rsi_stream = np.array([engine.update(i, c, v)["RSI"] for i, (c, v) in enumerate(zip(closes, volumes))])
+    rsi_talib = ta.RSI(closes, timeperiod=14)
+    np.testing.assert_allclose(rsi_stream, rsi_talib, rtol=1e-9, equal_nan=True)
+
+    sma_stream = StreamingSMA(200)
+    sma_values = np.array([sma_stream.update(v) for v in volumes])
+    np.testing.assert_allclose(sma_values, ta.SMA(volumes, timeperiod=200), rtol=1e-9, equal_nan=True)
+    vector_rsi = VectorRSI(3)
+    matrix = np.column_stack((closes, closes[::-1], closes * 2))
+    vector_values = np.array([vector_rsi.update(row).copy() for row in matrix])
+    for column in range(3):
+        np.testing.assert_allclose(vector_values[:, column], ta.RSI(matrix[:, column], timeperiod=14),
+                                   rtol=1e-9, equal_nan=True)
+    print("Streaming RSI, VectorRSI and Volume_MA match TA-Lib.")
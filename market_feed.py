@@ -0,0 +1,421 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from candle_store import COLUMNS, interval_seconds
+from price_table import PRICE_DTYPE, OraclePriceTable, token_decimals_from_markets
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x4445454644494341  # b"ACIDFEED", little-endian
+VERSION = 1
+# tmpfs when the host has it, so the feed never touches the disk
+DEFAULT_PATH = "/dev/shm/acid_market_feed" if os.path.isdir("/dev/shm") else "data/market_feed.bin"
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "<u8"), ("version", "<u4"),
+    ("price_capacity", "<u4"), ("max_symbols", "<u4"), ("candle_capacity", "<u4"), ("meta_capacity", "<u4"),
+    ("interval", "<u4"),
+    ("seq", "<u8"),
+    ("prices_version", "<u8"), ("candles_version", "<u8"), ("markets_version", "<u8"),
+    ("prices_updated", "<f8"), ("candles_updated", "<f8"), ("markets_updated", "<f8"), ("eth_usd_updated", "<f8"),
+    ("eth_usd", "<f8"),
+    ("n_prices", "<u4"), ("n_symbols", "<u4"), ("meta_length", "<u4"),
+])
+CANDLE_DTYPE = np.dtype([("Timestamp", "<i8")] + [(column, "<f8") for column in COLUMNS])
+SYMBOL_DTYPE = np.dtype("U16")
+
+
+class FeedError(Exception):
+    pass
+
+
+def _align(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+# Typed views over the mapped file: header, oracle price records, candle rings (one row per symbol)
+# and a JSON blob for market metadata. Sizes come from the header, so readers need no configuration.
+class _FeedLayout:
+
+    def __init__(self, buffer, price_capacity, max_symbols, candle_capacity, meta_capacity):
+        self.size = 0
+        for name, shape, dtype in self._sections(price_capacity, max_symbols, candle_capacity, meta_capacity):
+            offset = _align(self.size)
+            array = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset) if buffer is not None else None
+            setattr(self, name, array)
+            self.size = offset + int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+    @staticmethod
+    def _sections(price_capacity, max_symbols, candle_capacity, meta_capacity):
+        return (
+            ("header", (), HEADER_DTYPE),
+            ("prices", (price_capacity,), PRICE_DTYPE),
+            ("symbols", (max_symbols,), SYMBOL_DTYPE),
+            ("candle_counts", (max_symbols,), np.uint64),
+            ("candles", (max_symbols, candle_capacity), CANDLE_DTYPE),
+            ("meta", (meta_capacity,), np.uint8),
+        )
+
+
+# Single writer of the shared market feed (the market data daemon).
+#
+# Readers never lock. Every update runs between two increments of the header's `seq`: it is odd
+# while an update is in progress, and a reader that sees it change while copying retries (a
+# seqlock). Each section also has a version, so readers only copy out what changed.
+class MarketFeedWriter:
+
+    def __init__(self, path=DEFAULT_PATH, interval="15m", price_capacity=1024, max_symbols=16,
+                 candle_capacity=1000, meta_capacity=1 << 20, clock=time.time):
+        self.path = path
+        self.clock = clock
+        size = _FeedLayout(None, price_capacity, max_symbols, candle_capacity, meta_capacity).size
+        # Build the file beside the old one and swap it in, so readers never map a half-initialized feed
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+        self._map = np.memmap(tmp_path, dtype=np.uint8, mode="r+", shape=(size,))
+        self._layout = _FeedLayout(self._map, price_capacity, max_symbols, candle_capacity, meta_capacity)
+        header = self._layout.header
+        header["price_capacity"] = price_capacity
+        header["max_symbols"] = max_symbols
+        header["candle_capacity"] = candle_capacity
+        header["meta_capacity"] = meta_capacity
+        header["interval"] = interval_seconds(interval)
+        header["version"] = VERSION
+        header["magic"] = MAGIC
+        os.replace(tmp_path, path)
+        self._slots = {}
+
+    @contextlib.contextmanager
+    def _update(self, section):
+        header = self._layout.header
+        header["seq"] += 1  # Odd: readers wait
+        try:
+            yield header
+        finally:
+            if section is not None:
+                header[f"{section}_version"] += 1
+            header["seq"] += 1
+
+    # Oracle prices from an OraclePriceTable (e.g. GetGMXv2Stats.get_oracle_price_table())
+    def publish_prices(self, table):
+        records = table.records
+        capacity = len(self._layout.prices)
+        if len(records) > capacity:
+            logger.warning("Feed holds %s oracle prices; dropping %s.", capacity, len(records) - capacity)
+            records = records[:capacity]
+        with self._update("prices") as header:
+            self._layout.prices[:len(records)] = records
+            header["n_prices"] = len(records)
+            header["prices_updated"] = self.clock()
+
+    # Closed candles as Timestamp (epoch seconds) and OHLCV arrays, e.g. CandleStore.load_arrays();
+    # bars not newer than the last published one are skipped
+    def publish_candles(self, symbol, arrays):
+        slot = self._slot(symbol)
+        ring = self._layout.candles[slot]
+        capacity = len(ring)
+        count = int(self._layout.candle_counts[slot])
+        timestamps = np.asarray(arrays["Timestamp"], dtype=np.int64)
+        if count:
+            last = ring[(count - 1) % capacity]["Timestamp"]
+            new = timestamps > last
+        else:
+            new = np.ones(len(timestamps), dtype=bool)
+        total = int(new.sum())
+        if total == 0:
+            return 0
+        bars = np.empty(total, dtype=CANDLE_DTYPE)
+        bars["Timestamp"] = timestamps[new]
+        for column in COLUMNS:
+            bars[column] = np.asarray(arrays[column], dtype=np.float64)[new]
+        kept = bars[-capacity:]  # Older bars would be overwritten in the ring anyway
+        positions = (count + total - len(kept) + np.arange(len(kept))) % capacity
+        with self._update("candles") as header:
+            ring[positions] = kept
+            self._layout.candle_counts[slot] = count + total
+            header["candles_updated"] = self.clock()
+        return total
+
+    def _slot(self, symbol):
+        slot = self._slots.get(symbol)
+        if slot is None:
+            slot = len(self._slots)
+            if slot >= len(self._layout.symbols):
+                raise FeedError(f"Feed already holds {slot} candle symbols; cannot add {symbol}")
+            with self._update(None) as header:
+                self._layout.symbols[slot] = symbol
+                header["n_symbols"] = slot + 1
+            self._slots[symbol] = slot
+        return slot
+
+    # get_available_markets() output, stored as JSON
+    def publish_markets(self, markets):
+        blob = np.frombuffer(json.dumps(markets, default=str).encode(), dtype=np.uint8)
+        if len(blob) > len(self._layout.meta):
+            raise FeedError(f"Market metadata is {len(blob)} bytes; the feed holds {len(self._layout.meta)}")
+        with self._update("markets") as header:
+            self._layout.meta[:len(blob)] = blob
+            header["meta_length"] = len(blob)
+            header["markets_updated"] = self.clock()
+
+    def publish_eth_usd(self, price):
+        with self._update(None) as header:
+            header["eth_usd"] = price
+            header["eth_usd_updated"] = self.clock()
+
+    def close(self):
+        self._map.flush()
+        del self._layout, self._map
+
+
+# Read-only view of the shared market feed for strategy processes: no network I/O of their own.
+#
+# The file is mapped once and sections are copied out under the sequence-number check only when their
+# version changes, so repeated price lookups are a header read plus a dict hit. Data older than
+# max_age seconds is treated as missing. A restarted daemon replaces the file; readers pick up the
+# new one once the old one goes stale.
+class MarketFeedReader:
+
+    def __init__(self, path=DEFAULT_PATH, max_age=30, retries=10000, clock=time.time):
+        self.path = path
+        self.max_age = max_age
+        self.retries = retries
+        self.clock = clock
+        self.retried = 0
+        self._open()
+
+    def _open(self):
+        self._inode = os.stat(self.path).st_ino
+        self._map = np.memmap(self.path, dtype=np.uint8, mode="r")
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._map)
+        if int(header["magic"]) != MAGIC or int(header["version"]) != VERSION:
+            raise FeedError(f"{self.path} is not a version {VERSION} market feed")
+        self._layout = _FeedLayout(self._map, int(header["price_capacity"]), int(header["max_symbols"]),
+                                   int(header["candle_capacity"]), int(header["meta_capacity"]))
+        self._header = self._layout.header
+        self._table = None
+        self._table_version = None
+        self._markets = None
+        self._markets_version = None
+
+    # Consistent copy of whatever read() returns, retrying while the writer is mid-update
+    def _read(self, read):
+        header = self._header
+        for _ in range(self.retries):
+            seq = int(header["seq"])
+            if not seq & 1:
+                value = read()
+                if int(header["seq"]) == seq:
+                    return value
+            self.retried += 1
+            time.sleep(0)
+        raise FeedError(f"No consistent read of {self.path} after {self.retries} attempts")
+
+    @property
+    def seq(self):
+        return int(self._header["seq"])
+
+    @property
+    def interval(self):
+        return int(self._header["interval"])
+
+    def age(self, section):
+        updated = float(self._header[f"{section}_updated"])
+        return None if updated == 0 else self.clock() - updated
+
+    def _fresh(self, section, max_age):
+        age = self.age(section)
+        max_age = self.max_age if max_age is None else max_age
+        if age is not None and age <= max_age:
+            return True
+        if os.path.exists(self.path) and os.stat(self.path).st_ino != self._inode:
+            logger.info("Market feed %s was replaced; remapping.", self.path)
+            self._open()
+            age = self.age(section)
+            return age is not None and age <= max_age
+        return False
+
+    # Latest oracle prices as an OraclePriceTable, or None when the feed has none fresh enough
+    def prices(self, max_age=None):
+        if not self._fresh("prices", max_age):
+            return None
+        version = int(self._header["prices_version"])
+        if version != self._table_version:
+            records, version = self._read(lambda: (self._layout.prices[:int(self._header["n_prices"])].copy(),
+                                                   int(self._header["prices_version"])))
+            self._table = OraclePriceTable.from_records(records)
+            self._table_version = version
+        return self._table
+
+    # (max_price, min_price) for a token symbol or address, like OraclePriceTable.prices
+    def price(self, key, max_age=None):
+        table = self.prices(max_age)
+        return (None, None) if table is None else table.prices(key)
+
+    def symbols(self):
+        return self._read(lambda: self._layout.symbols[:int(self._header["n_symbols"])].tolist())
+
+    # The last n closed candles of a symbol, oldest first, as a CANDLE_DTYPE array
+    def candles(self, symbol, n=None):
+        try:
+            slot = self.symbols().index(symbol)
+        except ValueError:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        ring = self._layout.candles[slot]
+        capacity = len(ring)
+
+        def read():
+            count = int(self._layout.candle_counts[slot])
+            size = min(count, capacity, capacity if n is None else n)
+            return ring[(count - size + np.arange(size)) % capacity]  # Fancy indexing copies
+
+        return self._read(read)
+
+    def markets(self):
+        version = int(self._header["markets_version"])
+        if version == 0:
+            return None
+        if version != self._markets_version:
+            blob, version = self._read(lambda: (self._layout.meta[:int(self._header["meta_length"])].tobytes(),
+                                                int(self._header["markets_version"])))
+            self._markets = json.loads(blob)
+            self._markets_version = version
+        return self._markets
+
+    def eth_usd(self, max_age=None):
+        if not self._fresh("eth_usd", max_age):
+            return None
+        return self._read(lambda: float(self._header["eth_usd"]))
+
+
+# Candle source (see candle_store) served from the shared feed instead of Yahoo
+class FeedSource:
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def fetch(self, symbol, interval, start=None):
+        import pandas as pd
+
+        if interval_seconds(interval) != self.reader.interval:
+            raise FeedError(f"Feed carries {self.reader.interval}s candles, not {interval}")
+        bars = self.reader.candles(symbol)
+        if start is not None:
+            bars = bars[bars["Timestamp"] >= start]
+        return pd.DataFrame({field: bars[field] for field in CANDLE_DTYPE.names})
+
+
+# CoinGecko ETH/USD rate through the shared HTTP session
+def fetch_eth_usd(http):
+    response = http.get("https://api.coingecko.com/api/v3/simple/price",
+                        params={"ids": "ethereum", "vs_currencies": "usd"}, endpoint="coingecko")
+    response.raise_for_status()
+    return response.json()["ethereum"]["usd"]
+
+
+# The one process that talks to GMX, Yahoo and CoinGecko, publishing everything into the feed.
+# Each task runs on its own interval; a failing task is logged and retried on its next turn.
+class MarketFeedDaemon:
+
+    def __init__(self, writer, stats, store, source, http, symbols=("ETH-USD",), interval="15m",
+                 price_interval=5, candle_interval=60, usd_interval=60, market_interval=3600):
+        self.writer = writer
+        self.stats = stats
+        self.store = store
+        self.source = source
+        self.http = http
+        self.symbols = tuple(symbols)
+        self.interval = interval
+        # Markets first: their token decimals are needed to convert oracle prices to USD
+        self.tasks = [
+            (self.publish_markets, market_interval),
+            (self.publish_prices, price_interval),
+            (self.publish_candles, candle_interval),
+            (self.publish_eth_usd, usd_interval),
+        ]
+        self._due = [0.0] * len(self.tasks)
+        self._stop = threading.Event()
+
+    def publish_prices(self):
+        self.writer.publish_prices(self.stats.get_oracle_price_table())
+
+    def publish_candles(self):
+        for symbol in self.symbols:
+            self.store.backfill(symbol, self.interval, self.source)
+            self.writer.publish_candles(symbol, self.store.load_arrays(symbol, self.interval))
+
+    def publish_eth_usd(self):
+        self.writer.publish_eth_usd(fetch_eth_usd(self.http))
+
+    def publish_markets(self):
+        markets = self.stats.get_available_markets()
+        self.stats.token_decimals = token_decimals_from_markets(markets)
+        self.writer.publish_markets(markets)
+
+    def run_once(self, now=None):
+        now = time.monotonic() if now is None else now
+        for i, (task, every) in enumerate(self.tasks):
+            if now < self._due[i]:
+                continue
+            self._due[i] = now + every
+            try:
+                task()
+            except Exception as e:
+                logger.error("Error in market feed task %s: %s", task.__name__, e)
+
+    def run(self, tick=1):
+        logger.info("Publishing market data for %s to %s.", ", ".join(self.symbols), self.writer.path)
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(tick)
+
+    def stop(self):
+        self._stop.set()
+
+
+# Run the daemon: one per host, shared by every bot started with MARKET_FEED=<path>
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+    from gmx_python_sdk.scripts.v2.gmx_utils import ConfigManager
+
+    from candle_store import CandleStore, YahooSource
+    from get_gmx_stats import GetGMXv2Stats
+    from http_pool import get_session
+    from metrics import configure_logging
+
+    parser = argparse.ArgumentParser(description="Shared market data feed for GMX bots on this host")
+    parser.add_argument("--path", default=os.getenv("MARKET_FEED", DEFAULT_PATH))
+    parser.add_argument("--symbols", default="ETH-USD", help="Comma-separated Yahoo symbols to publish candles for")
+    parser.add_argument("--interval", default="15m")
+    parser.add_argument("--price-interval", type=float, default=5)
+    args = parser.parse_args()
+
+    load_dotenv()
+    configure_logging()
+    config = ConfigManager("arbitrum")
+    config.set_config(filepath="config.yaml")
+    http = get_session()
+    daemon = MarketFeedDaemon(
+        MarketFeedWriter(args.path, interval=args.interval),
+        GetGMXv2Stats(config, to_json=False, to_csv=False, http=http),
+        CandleStore(),
+        YahooSource(),
+        http,
+        symbols=args.symbols.split(","),
+        interval=args.interval,
+        price_interval=args.price_interval,
+    )
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        logger.info("Market feed stopped.")
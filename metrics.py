@@ -0,0 +1,368 @@
+import bisect
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Cumulative-bucket latency histogram (Prometheus-style bounds, in seconds)
+class LatencyHistogram:
+
+    BOUNDS = (0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    # Upper bound of the bucket holding the q-th quantile
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.BOUNDS + (float("inf"),), self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(bound) for bound in self.BOUNDS] + ["+Inf"], self.buckets)),
+        }
+
+
+# Stage timings, call and error counts, plus pluggable collectors for metrics kept elsewhere
+# (HTTP endpoints, cache hit rates, order latencies). Collectors return {label: {field: number}}.
+class MetricsRegistry:
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._calls = {}
+        self._errors = {}
+        self._collectors = {}
+
+    def observe(self, name, seconds, error=False):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+                self._calls[name] = 0
+                self._errors[name] = 0
+            histogram.observe(seconds)
+            self._calls[name] += 1
+            if error:
+                self._errors[name] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, error)
+
+    # Decorator form of timer(); the stage name defaults to the function's qualified name
+    def timed(self, name=None):
+        def decorator(func):
+            stage = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                error = False
+                try:
+                    return func(*args, **kwargs)
+                except BaseException:
+                    error = True
+                    raise
+                finally:
+                    self.observe(stage, time.perf_counter() - started, error)
+
+            return wrapper
+
+        return decorator
+
+    def register_collector(self, name, collect):
+        self._collectors[name] = collect
+
+    def snapshot(self):
+        with self._lock:
+            stages = {
+                name: dict(histogram.snapshot(), calls=self._calls[name], errors=self._errors[name])
+                for name, histogram in self._histograms.items()
+            }
+        collected = {}
+        for name, collect in list(self._collectors.items()):
+            try:
+                collected[name] = collect()
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", name, e)
+        return {"timestamp": time.time(), "stages": stages, "collectors": collected}
+
+    # Prometheus text exposition format
+    def render_prometheus(self, prefix="acid"):
+        snapshot = self.snapshot()
+        lines = [
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        for name, stage in snapshot["stages"].items():
+            label = f'stage="{name}"'
+            cumulative = 0
+            for bound, bucket_count in stage["buckets"].items():
+                cumulative += bucket_count
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{prefix}_stage_duration_seconds_sum{{{label}}} {stage['sum']}")
+            lines.append(f"{prefix}_stage_duration_seconds_count{{{label}}} {stage['count']}")
+        lines.append(f"# TYPE {prefix}_stage_errors_total counter")
+        for name, stage in snapshot["stages"].items():
+            lines.append(f'{prefix}_stage_errors_total{{stage="{name}"}} {stage["errors"]}')
+        for collector, values in snapshot["collectors"].items():
+            for label, fields in values.items():
+                for field, value in _flatten(fields):
+                    lines.append(f'{prefix}_{collector}_{field}{{key="{label}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+# Numeric fields of a collector entry; nested summaries (e.g. a latency snapshot) become latency_p95 etc.
+def _flatten(fields, prefix=""):
+    for field, value in fields.items():
+        if field == "buckets":
+            continue
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{field}_")
+        elif isinstance(value, bool):
+            yield f"{prefix}{field}", int(value)
+        elif isinstance(value, (int, float)):
+            yield f"{prefix}{field}", value
+
+
+# Serve registry.render_prometheus() at http://host:port/metrics on a background thread
+def start_metrics_server(registry, port=9100, host="127.0.0.1"):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%s/metrics", host, server.server_port)
+    return server
+
+
+# Append a registry snapshot to a JSONL file every `interval` seconds, rotating at max_bytes
+class JsonlMetricsWriter:
+
+    def __init__(self, registry, path, interval=60, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        line = json.dumps(self.registry.snapshot(), default=str) + "\n"
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "a") as f:
+            f.write(line)
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except Exception as e:
+                logger.warning("Error writing metrics snapshot: %s", e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.write()
+
+
+# LOG_LEVEL=OFF disables logging entirely; otherwise any standard level name (default INFO)
+def configure_logging(level=None):
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    if level == "OFF":
+        logging.disable(logging.CRITICAL)
+        return
+    logging.disable(logging.NOTSET)
+    logging.basicConfig(level=getattr(logging, level, logging.INFO),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+# Process-wide registry used by the bot and GetGMXv2Stats; METRICS=off turns timing into a no-op
+metrics = MetricsRegistry(enabled=os.getenv("METRICS", "on").lower() != "off")
+
+
+if __name__ == "__main__":
+    import subprocess
+    import sys
+    import tempfile
+    import urllib.error
+    import urllib.request
+
+    # Buckets hold observations up to and including their bound; anything past the last bound lands in +Inf
+    histogram = LatencyHistogram()
+    for seconds in (0.00005, 0.0001, 0.003, 0.003, 40.0):
+        histogram.observe(seconds)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"]["0.0001"] == 2 and snapshot["buckets"]["0.005"] == 2 and snapshot["buckets"]["+Inf"] == 1
+    assert sum(snapshot["buckets"].values()) == snapshot["count"] == 5
+    assert (histogram.quantile(0.4), histogram.quantile(0.5), histogram.quantile(0.99)) == (0.0001, 0.005, float("inf"))
+    assert LatencyHistogram().snapshot()["p50"] is None
+
+    # Stage timings count calls and errors, from the decorator and the context manager alike
+    registry = MetricsRegistry()
+
+    @registry.timed("bot.fetch")
+    def fetch(fail=False):
+        if fail:
+            raise ConnectionError("RPC down")
+        return 1
+
+    fetch()
+    try:
+        fetch(fail=True)
+    except ConnectionError:
+        pass
+    with registry.timer("bot.sign"):
+        pass
+    registry.register_collector("http", lambda: {"rpc": {"open": True, "latency": {"p95": 0.1, "buckets": {"0.1": 3}},
+                                                         "endpoint": "https://arb1.arbitrum.io/rpc"}})
+    stages = registry.snapshot()["stages"]
+    assert (stages["bot.fetch"]["calls"], stages["bot.fetch"]["errors"], stages["bot.sign"]["calls"]) == (2, 1, 1)
+
+    failing = MetricsRegistry()
+    failing.register_collector("broken", lambda: 1 / 0)
+    assert failing.snapshot()["collectors"] == {} and "broken" not in failing.render_prometheus()
+
+    # Prometheus text: cumulative buckets ending at the count, sum/count and error series, numeric collector
+    # fields flattened (bools as 0/1, nested buckets and strings left out)
+    text = registry.render_prometheus()
+    samples = dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+    fetch_buckets = [int(value) for key, value in samples.items()
+                     if key.startswith('acid_stage_duration_seconds_bucket{stage="bot.fetch"')]
+    assert len(fetch_buckets) == len(LatencyHistogram.BOUNDS) + 1 and fetch_buckets == sorted(fetch_buckets)
+    assert samples['acid_stage_duration_seconds_bucket{stage="bot.fetch",le="+Inf"}'] == "2"
+    assert samples['acid_stage_duration_seconds_count{stage="bot.fetch"}'] == "2"
+    assert float(samples['acid_stage_duration_seconds_sum{stage="bot.fetch"}']) >= 0
+    assert samples['acid_stage_errors_total{stage="bot.fetch"}'] == "1"
+    assert samples['acid_http_open{key="rpc"}'] == "1" and samples['acid_http_latency_p95{key="rpc"}'] == "0.1"
+    assert not any("buckets" in key or "endpoint" in key for key in samples if key.startswith("acid_http"))
+    assert "# TYPE acid_stage_duration_seconds histogram" in text and text.endswith("\n")
+
+    server = start_metrics_server(registry, port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain") and b"bot.fetch" in response.read()
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/other")
+            raise AssertionError("expected a 404")
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.shutdown()
+
+    # A disabled registry records nothing, and METRICS=off disables the process-wide one
+    disabled = MetricsRegistry(enabled=False)
+    disabled.timed("stage")(lambda: None)()
+    with disabled.timer("stage"):
+        pass
+    assert disabled.snapshot()["stages"] == {}
+    probe = "import metrics; metrics.metrics.timed('x')(lambda: None)(); print(metrics.metrics.enabled, len(metrics.metrics.snapshot()['stages']))"
+    for value, expected in (("off", "False 0"), ("OFF", "False 0"), ("on", "True 1")):
+        output = subprocess.run([sys.executable, "-c", probe], env=dict(os.environ, METRICS=value), check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True).stdout
+        assert output.strip() == expected, (value, output)
+
+    # JSONL snapshots rotate at max_bytes, keeping backup_count older files; stop() writes a final snapshot
+    directory = tempfile.mkdtemp(prefix="metrics-")
+    path = os.path.join(directory, "metrics.jsonl")
+    line_bytes = len(json.dumps(registry.snapshot(), default=str)) + 1
+    writer = JsonlMetricsWriter(registry, path, max_bytes=int(line_bytes * 2.5), backup_count=2)
+    for _ in range(7):
+        writer.write()
+    files = sorted(name for name in os.listdir(directory))
+    assert files == ["metrics.jsonl", "metrics.jsonl.1", "metrics.jsonl.2"], files
+    for name in files:
+        with open(os.path.join(directory, name)) as f:
+            lines = [json.loads(line) for line in f]
+        assert 1 <= len(lines) <= 2 and os.path.getsize(os.path.join(directory, name)) <= writer.max_bytes
+        assert set(lines[0]) == {"timestamp", "stages", "collectors"}
+    with open(path) as f:
+        newest = [json.loads(line)["timestamp"] for line in f]
+    with open(path + ".2") as f:
+        oldest = [json.loads(line)["timestamp"] for line in f]
+    assert max(oldest) <= min(newest)
+
+    writer = JsonlMetricsWriter(registry, os.path.join(directory, "background.jsonl"), interval=0.01)
+    writer.start()
+    time.sleep(0.1)
+    writer.stop()
+    with open(writer.path) as f:
+        assert sum(1 for _ in f) >= 3
+    dropped = JsonlMetricsWriter(registry, os.path.join(directory, "single.jsonl"), max_bytes=1, backup_count=0)
+    dropped.write()
+    dropped.write()
+    assert not os.path.exists(dropped.path + ".1")
+    with open(dropped.path) as f:
+        assert sum(1 for _ in f) == 1
+    print("Histogram buckets, stage timings, Prometheus rendering and serving, METRICS=off and JSONL rotation check out.")
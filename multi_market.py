@@ -0,0 +1,347 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from indicators import VectorRSI
+from strategy import CLOSE_LONG, CLOSE_SHORT, OPEN_LONG, OPEN_SHORT
+
+logger = logging.getLogger(__name__)
+
+
+# Everything the bot needs to know about one traded market, plus its position state
+class MarketState:
+
+    __slots__ = ("symbol", "market_key", "index_token_address", "long_token_address", "short_token_address",
+                 "collateral_address", "position", "position_value")
+
+    def __init__(self, symbol, market_key, index_token_address, long_token_address, short_token_address):
+        self.symbol = symbol
+        self.market_key = market_key
+        self.index_token_address = index_token_address
+        self.long_token_address = long_token_address
+        self.short_token_address = short_token_address
+        self.collateral_address = short_token_address
+        self.position = 0
+        self.position_value = 0
+
+    @classmethod
+    def from_gmx(cls, details):
+        return cls(
+            symbol=details["market_symbol"],
+            market_key=details["gmx_market_address"],
+            index_token_address=details["index_token_address"],
+            long_token_address=details["long_token_address"],
+            short_token_address=details["short_token_address"],
+        )
+
+    def __repr__(self):
+        return f"MarketState({self.symbol}, position={self.position})"
+
+
+# Market states parsed once from get_available_markets() output, indexed by symbol, market key and
+# index token address. GMX lists several pools per index token (e.g. ETH/USDC and ETH/ETH); the first
+# one listed is the one used for its symbol and index token.
+class MarketTable:
+
+    def __init__(self, markets):
+        self.markets = list(markets)
+        self._index = {}
+        for market in self.markets:
+            self._index.setdefault(market.symbol, market)
+            self._index[market.market_key] = market
+            self._index[market.market_key.lower()] = market
+            self._index.setdefault(market.index_token_address.lower(), market)
+
+    @classmethod
+    def from_gmx(cls, markets):
+        seen = set()
+        states = []
+        for details in markets.values():
+            symbol = details.get("market_symbol")
+            if symbol is None or symbol in seen:
+                continue
+            seen.add(symbol)
+            states.append(MarketState.from_gmx(details))
+        return cls(states)
+
+    def __len__(self):
+        return len(self.markets)
+
+    def get(self, key):
+        market = self._index.get(key)
+        if market is None and isinstance(key, str):
+            market = self._index.get(key.lower())
+        return market
+
+    # Markets for the given symbols in that order (unknown ones skipped), or all of them
+    def select(self, symbols=None):
+        if symbols is None:
+            return list(self.markets)
+        return [market for market in (self._index.get(symbol) for symbol in symbols) if market is not None]
+
+
+# Build market states from get_available_markets() output, optionally limited to some symbols
+def select_markets(markets, symbols=None):
+    return MarketTable.from_gmx(markets).select(symbols)
+
+
+# Trades many markets with one signal pass per candle.
+#
+# Acts as the `engine` for TradingScheduler: fetch_prices() returns one price per market as an array,
+# update() runs VectorRSI over all markets at once and execute_signal() places orders only for markets
+# whose state changes. Adding a market adds one array slot, not another loop or process.
+class MultiMarketRunner:
+
+    def __init__(self, markets, executor, price_source=None, rsi_period=14, long_threshold=41,
+                 short_threshold=60, leverage=5, open_percentage=0.1, close_percentage=0.1,
+                 order_percentage=.01, batch_price_source=None, journal=None, risk=None):
+        self.markets = list(markets)
+        self.symbols = [market.symbol for market in self.markets]
+        self.executor = executor
+        self.price_source = price_source
+        self.batch_price_source = batch_price_source
+        self.long_threshold = long_threshold
+        self.short_threshold = short_threshold
+        self.leverage = leverage
+        self.open_percentage = open_percentage
+        self.close_percentage = close_percentage
+        self.order_percentage = order_percentage
+        self.rsi = VectorRSI(len(self.markets), rsi_period)
+        self.positions = np.zeros(len(self.markets), dtype=np.int8)
+        self._latest = None
+        self.journal = journal
+        if journal is not None:
+            # Start from the positions journaled before a restart
+            for i, market in enumerate(self.markets):
+                market.position, market.position_value = journal.position(market.symbol)
+                self.positions[i] = market.position
+        self.risk = risk
+        if risk is not None:
+            for market in self.markets:
+                risk.set_exposure(market.symbol, market.position_value)
+
+    # Apply corrected positions, e.g. from PositionJournal.reconcile(): {symbol: (position, position_value)}
+    def sync_positions(self, positions):
+        for i, market in enumerate(self.markets):
+            if market.symbol in positions:
+                market.position, market.position_value = positions[market.symbol]
+                self.positions[i] = market.position
+                if self.risk is not None:
+                    self.risk.set_exposure(market.symbol, market.position_value)
+
+    # Prices for every market from a shared source: batch_price_source(markets) -> array with NaN for
+    # missing prices, or price_source(market) -> price or None called once per market
+    def fetch_prices(self):
+        if self.batch_price_source is not None:
+            prices = np.asarray(self.batch_price_source(self.markets), dtype=np.float64)
+        else:
+            prices = np.array([self.price_source(market) or np.nan for market in self.markets], dtype=np.float64)
+        if np.isnan(prices).all():
+            logger.warning("No market prices available.")
+            return None
+        return prices
+
+    def update(self, timestamp, closes, volume=0.0):
+        closes = np.asarray(closes, dtype=np.float64)
+        rsi = self.rsi.update(closes)
+        with np.errstate(invalid="ignore"):
+            signal_position = (rsi < self.long_threshold).astype(np.int8) - (rsi > self.short_threshold).astype(np.int8)
+        self._latest = {"Timestamp": timestamp, "Close": closes, "RSI": rsi.copy(), "Position": signal_position}
+        return self._latest
+
+    def latest(self):
+        return self._latest
+
+    # Replay aligned history: closes has one row per candle and one column per market
+    def seed(self, closes):
+        for row in np.asarray(closes, dtype=np.float64):
+            self.rsi.update(row)
+
+    # Align per-symbol candle frames (Timestamp/Close) on timestamp and replay them
+    def seed_from_frames(self, frames):
+        closes = pd.concat(
+            [frames[symbol].set_index("Timestamp")["Close"].rename(symbol) for symbol in self.symbols if symbol in frames],
+            axis=1,
+        ).reindex(columns=self.symbols).sort_index()
+        self.seed(closes.to_numpy())
+
+    # Vectorized next_action over all markets
+    def actions(self, signal_position):
+        flat = self.positions == 0
+        closes_out = ~flat & (signal_position == 0)
+        return {
+            OPEN_LONG: np.flatnonzero(flat & (signal_position == 1)),
+            OPEN_SHORT: np.flatnonzero(flat & (signal_position == -1)),
+            CLOSE_LONG: np.flatnonzero(closes_out & (self.positions == 1)),
+            CLOSE_SHORT: np.flatnonzero(closes_out & (self.positions == -1)),
+        }
+
+    def execute_signal(self, signal, prices, wallet_balance_usd):
+        prices = np.asarray(prices, dtype=np.float64)
+        journal = self.journal
+        if journal is not None:
+            journal.record_signal(dict(zip(self.symbols, signal["Position"])), signal.get("Timestamp"))
+        executed = []
+        for action, indices in self.actions(signal["Position"]).items():
+            for i in indices:
+                market = self.markets[i]
+                price = prices[i]
+                if np.isnan(price):
+                    continue
+                if journal is not None and market.symbol in journal.pending:
+                    logger.warning("%s order from before the restart is unresolved; skipping %s.", market.symbol, action)
+                    continue
+                is_long = action in (OPEN_LONG, CLOSE_LONG)
+                try:
+                    if action in (OPEN_LONG, OPEN_SHORT):
+                        if self.risk is not None:
+                            # The engine's own equity is re-read after each fill, unlike wallet_balance_usd
+                            size_delta_usd = self.risk.open_size(market.symbol, is_long)
+                            if size_delta_usd is None:
+                                continue
+                        elif wallet_balance_usd is None:
+                            logger.error("Error: Wallet balance is None. Skipping %s position calculation.", market.symbol)
+                            continue
+                        else:
+                            size_delta_usd = wallet_balance_usd * self.open_percentage
+                        if journal is not None:
+                            journal.order_started(market.symbol, action, size_delta_usd, float(price))
+                        self.executor.open_position(market, is_long, price, self.leverage, size_delta_usd, self.order_percentage)
+                        market.position = 1 if is_long else -1
+                        market.position_value = size_delta_usd
+                    else:
+                        # Same sizing as the single-market bot when a risk engine is attached
+                        if self.risk is not None:
+                            size_delta_usd = self.risk.close_size(market.symbol, market.position_value)
+                            if size_delta_usd is None:
+                                continue
+                        else:
+                            size_delta_usd = market.position_value * (1 - self.close_percentage)
+                        if journal is not None:
+                            journal.order_started(market.symbol, action, size_delta_usd, float(price))
+                        self.executor.close_position(market, is_long, price, size_delta_usd, self.order_percentage)
+                        market.position = 0
+                        market.position_value = 0
+                except Exception as e:
+                    # One failed order must not hold up the other markets
+                    logger.error("Error executing %s for %s: %s", action, market.symbol, e)
+                    if journal is not None:
+                        journal.order_failed(market.symbol, action, e)
+                    continue
+                self.positions[i] = market.position
+                if journal is not None:
+                    journal.position_changed(market.symbol, market.position, market.position_value)
+                if self.risk is not None:
+                    self.risk.on_fill(market.symbol, market.position_value)
+                executed.append((market.symbol, action, size_delta_usd))
+                logger.info("%s: %s with size %s USD.", market.symbol, action, size_delta_usd)
+        return executed
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from indicators import StreamingRSI
+    from journal import PositionJournal
+    from price_table import OraclePriceTable
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+
+    # get_available_markets()-shaped dict: two ETH pools (the first listed wins), BTC, SOL and DOGE
+    usdc = "0xaf88d065e77c8cC2239327C5EDb3A432268e5831"
+    tokens = {"ETH": "0x82aF49447D8a07e3bd95BD0d56f35241523fBab1", "BTC": "0x47904963fc8b2340414262125aF798B9655E58Cd",
+              "SOL": "0x2bcC6D6CdBbDC0a4071e48bb3B969b06B3330c07", "DOGE": "0xC4da4c24fd591125c3F47b340b6f4f76111883d8"}
+    markets = {}
+    for n, (symbol, token) in enumerate([("ETH", tokens["ETH"]), ("ETH", tokens["ETH"]), ("BTC", tokens["BTC"]),
+                                         ("SOL", tokens["SOL"]), ("DOGE", tokens["DOGE"])]):
+        key = f"0x{n + 1:040x}"
+        markets[key] = {"gmx_market_address": key, "market_symbol": symbol, "index_token_address": token,
+                        "long_token_address": token, "short_token_address": usdc}
+    table = MarketTable.from_gmx(markets)
+    assert len(table) == 4 and table.get("ETH").market_key == f"0x{1:040x}"
+    assert table.get(tokens["BTC"].lower()) is table.get("BTC")
+    assert [market.symbol for market in table.select(["SOL", "XRP", "ETH"])] == ["SOL", "ETH"]
+
+    # Fake executor: records orders and fails any order for DOGE
+    class FakeExecutor:
+
+        def __init__(self):
+            self.orders = []
+
+        def open_position(self, market, is_long, price, leverage, size_delta_usd, percentage):
+            if market.symbol == "DOGE":
+                raise RuntimeError("order rejected")
+            self.orders.append(("open", market.symbol, is_long, price, size_delta_usd))
+
+        def close_position(self, market, is_long, price, size_delta_usd, percentage):
+            self.orders.append(("close", market.symbol, is_long, price, size_delta_usd))
+
+    # Prices from an oracle table (SOL has no price); an empty table gives all NaN instead of raising
+    oracle = {token: {"tokenSymbol": symbol, "maxPriceFull": str(price * 10 ** 12 + 10 ** 12),
+                      "minPriceFull": str(price * 10 ** 12 - 10 ** 12), "oracleDecimals": 12}
+              for (symbol, token), price in zip(tokens.items(), (3000, 60000, None, 1)) if price is not None}
+    prices_table = OraclePriceTable.from_payload(oracle)
+    assert np.isnan(OraclePriceTable.from_payload({}).mid_prices([tokens["ETH"], tokens["BTC"]])).all()
+
+    journal = PositionJournal(tempfile.mkdtemp(prefix="multi-market-")).open()
+    journal.position_changed("BTC", -1, 80.0)  # Short BTC from before a restart
+    executor = FakeExecutor()
+    runner = MultiMarketRunner(table.select(), executor, batch_price_source=lambda states: prices_table.mid_prices(
+        [market.index_token_address for market in states]), open_percentage=0.1, journal=journal)
+    assert list(runner.positions) == [0, -1, 0, 0]
+    prices = runner.fetch_prices()
+    np.testing.assert_array_equal(prices, [3000.0, 60000.0, np.nan, 1.0])
+    runner.batch_price_source = lambda states: OraclePriceTable.from_payload({}).mid_prices(
+        [market.index_token_address for market in states])
+    assert runner.fetch_prices() is None
+
+    # One signal pass: ETH opens long, BTC closes its short, SOL is skipped (no price), DOGE's failed order
+    # is journaled without holding up the others
+    executed = runner.execute_signal({"Timestamp": 0, "Position": np.array([1, 0, -1, -1], dtype=np.int8)},
+                                     prices, wallet_balance_usd=1000.0)
+    assert executed == [("ETH", OPEN_LONG, 100.0), ("BTC", CLOSE_SHORT, 72.0)], executed
+    assert executor.orders == [("open", "ETH", True, 3000.0, 100.0), ("close", "BTC", False, 60000.0, 72.0)]
+    assert list(runner.positions) == [1, 0, 0, 0] and journal.position("ETH") == (1, 100.0)
+    assert journal.position("BTC") == (0, 0) and "DOGE" not in journal.pending
+
+    # Holding signals change nothing; an unresolved order blocks only its own market
+    assert runner.execute_signal({"Timestamp": 900, "Position": np.array([1, 0, 0, 0], dtype=np.int8)},
+                                 prices, 1000.0) == []
+    journal.order_started("BTC", OPEN_LONG, 50.0, 60000.0)
+    executed = runner.execute_signal({"Timestamp": 1800, "Position": np.array([0, 1, 0, 0], dtype=np.int8)},
+                                     prices, 1000.0)
+    assert executed == [("ETH", CLOSE_LONG, 90.0)] and list(runner.positions) == [0, 0, 0, 0]
+
+    # With a risk engine, opens and closes are sized by it exactly as the single-market bot sizes them,
+    # whatever the runner's own percentages say
+    from risk import RiskEngine
+
+    risk = RiskEngine(lambda: 1.0, price_source=lambda: 2000.0, leverage=5, open_percentage=0.2, close_percentage=0.5)
+    executor = FakeExecutor()
+    sized = MultiMarketRunner(table.select(["ETH", "BTC"]), executor, open_percentage=0.1, close_percentage=0.1,
+                              journal=None, risk=risk)
+    executed = sized.execute_signal({"Timestamp": 0, "Position": np.array([1, 0], dtype=np.int8)},
+                                    [3000.0, 60000.0], wallet_balance_usd=None)
+    assert executed == [("ETH", OPEN_LONG, 400.0)] and risk.exposures == {"ETH": 400.0}
+    executed = sized.execute_signal({"Timestamp": 900, "Position": np.array([0, 0], dtype=np.int8)},
+                                    [3000.0, 60000.0], wallet_balance_usd=None)
+    assert executed == [("ETH", CLOSE_LONG, risk.close_size("ETH", 400.0))] == [("ETH", CLOSE_LONG, 200.0)]
+    assert executor.orders[-1] == ("close", "ETH", True, 3000.0, 200.0) and risk.exposures == {}
+
+    # Reconciled positions flow back into the runner
+    runner.sync_positions({"BTC": (1, 55.0)})
+    assert list(runner.positions) == [0, 1, 0, 0] and runner.markets[1].position_value == 55.0
+
+    # Vector RSI over all markets matches one streaming RSI per market
+    closes = 100 + np.cumsum(np.random.default_rng(2).normal(0, 1, (300, 4)), axis=0)
+    runner = MultiMarketRunner(table.select(), FakeExecutor())
+    runner.seed(closes[:-1])
+    latest = runner.update(300 * 900, closes[-1])
+    for column in range(4):
+        single = StreamingRSI(14)
+        for close in closes[:, column]:
+            single.update(close)
+        assert abs(latest["RSI"][column] - single.value) < 1e-9
+    journal.close()
+    print("Market table, batched prices, vectorized actions, risk sizing, failed orders and journal interplay check out.")
@@ -0,0 +1,305 @@
+import logging
+import threading
+import time
+
+if __name__ == "__main__":
+    # The self-check at the bottom runs against the in-process SDK stubs from benchmarks.py, so it needs
+    # neither the SDK nor a network
+    import benchmarks
+
+    benchmarks.install_sdk_stubs()
+
+from gmx_python_sdk.scripts.v2.gas_utils import get_gas_limits
+from gmx_python_sdk.scripts.v2.gmx_utils import create_connection, get_datastore_contract
+from gmx_python_sdk.scripts.v2.order.create_decrease_order import DecreaseOrder
+from gmx_python_sdk.scripts.v2.order.create_increase_order import IncreaseOrder
+
+from metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+# Stand-in for an uncalled datastore getter: the SDK only ever does `gas_limits[key].call()`
+class CachedValue:
+
+    def __init__(self, value):
+        self.value = value
+
+    def call(self):
+        return self.value
+
+
+# Datastore gas limits and the fee cap, refreshed in the background so orders never wait on them
+class GasCache:
+
+    def __init__(self, config, refresh_interval=30, fee_multiplier=1.35, clock=time.monotonic):
+        self.config = config
+        self.refresh_interval = refresh_interval
+        self.fee_multiplier = fee_multiplier
+        self.clock = clock
+        self.gas_limits = None
+        self.max_fee_per_gas = None
+        self.updated_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        datastore = get_datastore_contract(self.config)
+        gas_limits = {key: CachedValue(getter.call()) for key, getter in get_gas_limits(datastore).items()}
+        block = create_connection(self.config).eth.get_block("latest")
+        with self._lock:
+            self.gas_limits = gas_limits
+            # Same fee cap the SDK derives when max_fee_per_gas is not given
+            self.max_fee_per_gas = block["baseFeePerGas"] * self.fee_multiplier
+            self.updated_at = self.clock()
+
+    # Current values, refreshing synchronously only if nothing has been fetched yet or they are too old
+    def get(self):
+        with self._lock:
+            fresh = self.updated_at is not None and self.clock() - self.updated_at < self.refresh_interval * 3
+        if not fresh:
+            self.refresh()
+        with self._lock:
+            return self.gas_limits, self.max_fee_per_gas
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Error refreshing gas estimates: %s", e)
+
+    def start(self):
+        if self._thread is None:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Error fetching initial gas estimates: %s", e)
+            self._thread = threading.Thread(target=self._run, name="gas-cache", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# SDK orders build and submit inside __init__; these subclasses take gas limits from the cache
+# and time the gas and sign/submit stages of that call
+class _TemplatedOrderMixin:
+
+    _gas_limits_key = None
+
+    def __init__(self, *args, gas_cache=None, timings=None, **kwargs):
+        self._gas_cache = gas_cache
+        self._timings = timings if timings is not None else {}
+        super().__init__(*args, **kwargs)
+
+    def determine_gas_limits(self):
+        started = time.perf_counter()
+        if self._gas_cache is not None:
+            self._gas_limits, _ = self._gas_cache.get()
+            self._gas_limits_order_type = self._gas_limits[self._gas_limits_key]
+        else:
+            super().determine_gas_limits()
+        self._timings["gas"] = self._timings.get("gas", 0.0) + time.perf_counter() - started
+
+    def _submit_transaction(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super()._submit_transaction(*args, **kwargs)
+        finally:
+            self._timings["submit"] = self._timings.get("submit", 0.0) + time.perf_counter() - started
+
+
+class TemplatedIncreaseOrder(_TemplatedOrderMixin, IncreaseOrder):
+    _gas_limits_key = "increase_order"
+
+
+class TemplatedDecreaseOrder(_TemplatedOrderMixin, DecreaseOrder):
+    _gas_limits_key = "decrease_order"
+
+
+# Everything about an order that is fixed per (market, side, open/close)
+class OrderTemplate:
+
+    def __init__(self, market, is_long, is_open):
+        self.market_key = market.market_key
+        self.is_long = is_long
+        self.is_open = is_open
+        if is_long:
+            self.collateral_address = market.collateral_address  # Assume stablecoin (e.g., USDC) as collateral
+            self.index_token_address = market.index_token_address  # ETH as the index token
+        else:
+            self.collateral_address = market.long_token_address  # ETH as collateral
+            self.index_token_address = market.short_token_address  # Stablecoin (e.g., USDC) as the index token
+        if is_open:
+            self.swap_path = [self.collateral_address, self.index_token_address]
+            self.order_class = TemplatedIncreaseOrder
+        else:
+            self.swap_path = [self.index_token_address, self.collateral_address]
+            self.order_class = TemplatedDecreaseOrder
+
+
+# Prepares and submits orders with pre-built templates and background gas estimates,
+# so signal time only fills in size and price. Records per-stage latency histograms.
+class OrderPreparer:
+
+    STAGES = ("build", "gas", "submit", "total")
+
+    def __init__(self, config, gas_cache=None, debug_mode=True, token_decimals=None):
+        self.config = config
+        self.gas_cache = gas_cache or GasCache(config)
+        self.debug_mode = debug_mode
+        self.token_decimals = token_decimals or {}  # address -> decimals, for collateral amounts
+        self.templates = {}
+        self.latency = {stage: LatencyHistogram() for stage in self.STAGES}
+        self._lock = threading.Lock()
+
+    def prepare(self, markets):
+        for market in markets:
+            for is_long in (True, False):
+                for is_open in (True, False):
+                    self.template(market, is_long, is_open)
+
+    def template(self, market, is_long, is_open):
+        key = (market.market_key, is_long, is_open)
+        template = self.templates.get(key)
+        if template is None:
+            template = self.templates[key] = OrderTemplate(market, is_long, is_open)
+        return template
+
+    # initial_collateral_delta_amount for an order of notional_usd at `leverage`: notional_usd / leverage
+    # worth of the template's collateral token at collateral_price USD, in the token's smallest units.
+    # None when the token's decimals are unknown, since guessing them would be off by orders of magnitude.
+    def collateral_amount(self, market, is_long, is_open, notional_usd, leverage, collateral_price):
+        address = self.template(market, is_long, is_open).collateral_address
+        decimals = self.token_decimals.get(address)
+        if decimals is None:
+            logger.error("No decimals known for collateral token %s; cannot size the collateral.", address)
+            return None
+        return int(notional_usd / leverage / collateral_price * 10 ** decimals)
+
+    def submit(self, market, is_long, is_open, size_delta, initial_collateral_delta_amount, slippage_percent):
+        template = self.template(market, is_long, is_open)
+        _, max_fee_per_gas = self.gas_cache.get()
+        timings = {}
+        started = time.perf_counter()
+        order = template.order_class(
+            config=self.config,
+            market_key=template.market_key,
+            collateral_address=template.collateral_address,
+            index_token_address=template.index_token_address,
+            is_long=is_long,
+            size_delta=size_delta,
+            initial_collateral_delta_amount=initial_collateral_delta_amount,
+            slippage_percent=slippage_percent,
+            swap_path=template.swap_path,
+            max_fee_per_gas=max_fee_per_gas,
+            debug_mode=self.debug_mode,
+            gas_cache=self.gas_cache,
+            timings=timings,
+        )
+        total = time.perf_counter() - started
+        timings["build"] = total - timings.get("gas", 0.0) - timings.get("submit", 0.0)
+        timings["total"] = total
+        with self._lock:
+            for stage, seconds in timings.items():
+                self.latency[stage].observe(seconds)
+        logger.debug("Order latency - build: %.3fs, gas: %.3fs, submit: %.3fs, total: %.3fs",
+                     timings["build"], timings.get("gas", 0.0), timings.get("submit", 0.0), total)
+        return order
+
+    def latency_stats(self):
+        with self._lock:
+            return {stage: histogram.snapshot() for stage, histogram in self.latency.items()}
+
+
+if __name__ == "__main__":
+    from gmx_python_sdk.scripts.v2.gmx_utils import ConfigManager
+
+    from multi_market import MarketState
+
+    config = ConfigManager("arbitrum")
+    config.set_config()
+    usdc = benchmarks.USDC_ADDRESS
+    eth = MarketState("ETH", benchmarks.ETH_MARKET_ADDRESS, benchmarks.ETH_ADDRESS, benchmarks.ETH_ADDRESS, usdc)
+    btc = MarketState("BTC", "0x47c031236e19d024b42f8AE6780E44A573170703", "0x47904963fc8b2340414262125aF798B9655E58Cd",
+                      "0x47904963fc8b2340414262125aF798B9655E58Cd", usdc)
+
+    # Count datastore reads, and fail them on demand
+    datastore_reads = {"count": 0, "fail": False}
+    sdk_get_gas_limits = get_gas_limits
+
+    def get_gas_limits(datastore):
+        datastore_reads["count"] += 1
+        if datastore_reads["fail"]:
+            raise ConnectionError("RPC down")
+        return sdk_get_gas_limits(datastore)
+
+    # GasCache: the first get() fetches, later ones are served from memory until the values are three
+    # refresh intervals old, and a failed refresh keeps the last good values
+    now = [0.0]
+    cache = GasCache(config, refresh_interval=30, clock=lambda: now[0])
+    gas_limits, max_fee_per_gas = cache.get()
+    assert datastore_reads["count"] == 1 and gas_limits["increase_order"].call() == 3_000_000
+    assert max_fee_per_gas == 10 ** 7 * 1.35
+    now[0] += 89
+    assert cache.get()[0] is gas_limits and datastore_reads["count"] == 1
+    now[0] += 1
+    assert cache.get()[0] is not gas_limits and datastore_reads["count"] == 2
+    datastore_reads["fail"] = True
+    gas_limits = cache.gas_limits
+    try:
+        cache.refresh()
+    except ConnectionError:
+        pass
+    assert cache.gas_limits is gas_limits and cache.updated_at == 90
+    datastore_reads["fail"] = False
+
+    # The background thread refreshes every refresh_interval
+    background = GasCache(config, refresh_interval=0.02)
+    reads = datastore_reads["count"]
+    background.start()
+    time.sleep(0.15)
+    background.stop()
+    assert datastore_reads["count"] - reads >= 4, datastore_reads["count"] - reads
+
+    # Templates: four per market, built once and reused
+    preparer = OrderPreparer(config, GasCache(config, refresh_interval=30, clock=lambda: now[0]), debug_mode=True)
+    preparer.prepare([eth, btc])
+    assert len(preparer.templates) == 8
+    assert preparer.template(eth, True, True) is preparer.templates[(eth.market_key, True, True)]
+    open_long, close_long = preparer.template(eth, True, True), preparer.template(eth, True, False)
+    assert open_long.order_class is TemplatedIncreaseOrder and close_long.order_class is TemplatedDecreaseOrder
+    assert (open_long.collateral_address, open_long.index_token_address) == (usdc, benchmarks.ETH_ADDRESS)
+    assert open_long.swap_path == [usdc, benchmarks.ETH_ADDRESS] and close_long.swap_path == open_long.swap_path[::-1]
+    open_short = preparer.template(btc, False, True)
+    assert (open_short.collateral_address, open_short.index_token_address) == (btc.long_token_address, usdc)
+
+    # Orders take gas limits and the fee cap from the cache: one datastore read however many orders go out
+    reads = datastore_reads["count"]
+    orders = [preparer.submit(market, is_long, is_open, 10 ** 30, 10 ** 6, 0.01)
+              for market in (eth, btc) for is_long in (True, False) for is_open in (True, False)]
+    assert datastore_reads["count"] - reads == 1
+    execution_fee = int(3_000_000 * 10 ** 7 * 1.35 * 1.3)
+    for order in orders:
+        (addresses, numbers, *_), = order.submitted
+        assert numbers[4] == execution_fee and addresses[4] == order.market_key and order.max_fee_per_gas == 10 ** 7 * 1.35
+    assert orders[0].submitted[0][0][6] == [usdc, benchmarks.ETH_ADDRESS]
+
+    # Collateral is notional / leverage in the collateral token's own units: 2500 USD at 5x is 500 USDC
+    # (6 decimals) on a long, or 0.2 ETH at 2500 USD (18 decimals) on a short, whatever the ETH price
+    # is quoted in elsewhere
+    preparer.token_decimals = {usdc: 6, benchmarks.ETH_ADDRESS: 18}
+    collateral = preparer.collateral_amount(eth, True, True, 2500.0, 5, 1.0)
+    assert collateral == 500 * 10 ** 6, collateral
+    assert preparer.collateral_amount(eth, False, True, 2500.0, 5, 2500.0) == 2 * 10 ** 17
+    assert preparer.collateral_amount(eth, True, False, 450.0, 5, 1.0) == 90 * 10 ** 6
+    assert preparer.collateral_amount(btc, False, True, 2500.0, 5, 60_000.0) is None  # WBTC decimals unknown
+    order = preparer.submit(eth, True, True, 2500 * 10 ** 30, collateral, 0.01)
+    assert order.submitted[0][1][:2] == (2500 * 10 ** 30, 500 * 10 ** 6)
+    orders.append(order)
+    latency = preparer.latency_stats()
+    assert all(latency[stage]["count"] == len(orders) for stage in ("build", "gas", "submit", "total"))
+    print(f"GasCache refreshes and fallbacks, {len(preparer.templates)} order templates and {len(orders)} "
+          f"templated orders check out against the SDK stubs.")
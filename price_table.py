@@ -0,0 +1,107 @@
+import numpy as np
+
+PRICE_DTYPE = np.dtype([("symbol", "U16"), ("address", "U42"), ("min_price", "f8"), ("max_price", "f8")])
+# GMX prices carry 30 decimals of USD per whole token, so a *PriceFull value is price * 10 ** (30 - token decimals)
+PRICE_PRECISION = 30
+DEFAULT_TOKEN_DECIMALS = 18
+
+
+# Power of ten an oracle entry's *PriceFull values are scaled by. Token decimals come from token_decimals
+# (address or symbol -> decimals) when listed, else from the entry's oracleDecimals (already 30 - decimals)
+# when the API fills it in; otherwise the token is assumed to have 18 decimals, like ETH.
+def price_exponent(entry, address=None, token_decimals=None):
+    if token_decimals:
+        decimals = token_decimals.get(address or entry.get("tokenAddress"), token_decimals.get(entry.get("tokenSymbol")))
+        if decimals is not None:
+            return PRICE_PRECISION - int(decimals)
+    if entry.get("oracleDecimals") is not None:
+        return int(entry["oracleDecimals"])
+    return PRICE_PRECISION - DEFAULT_TOKEN_DECIMALS
+
+
+# address -> decimals for every token in a markets dict (GetGMXv2Stats.get_available_markets() output)
+def token_decimals_from_markets(markets):
+    token_decimals = {}
+    for market in (markets or {}).values():
+        for address_key, metadata_key in (("index_token_address", "market_metadata"),
+                                          ("long_token_address", "long_token_metadata"),
+                                          ("short_token_address", "short_token_metadata")):
+            metadata = market.get(metadata_key) or {}
+            if metadata.get("decimals") is not None and market.get(address_key):
+                token_decimals[market[address_key]] = int(metadata["decimals"])
+    return token_decimals
+
+
+# Oracle prices parsed once per payload into a structured array, indexed by token symbol and address.
+#
+# Prices are converted to USD with price_exponent() for all tokens in one pass, so a lookup is a dict hit
+# plus an array read instead of a scan and a string-to-int parse.
+class OraclePriceTable:
+
+    __slots__ = ("records", "min_prices", "max_prices", "_rows")
+
+    def __init__(self, records, rows):
+        self.records = records
+        self.min_prices = records["min_price"]
+        self.max_prices = records["max_price"]
+        self._rows = rows
+
+    @classmethod
+    def from_payload(cls, oracle_prices, token_decimals=None):
+        addresses = list(oracle_prices)
+        entries = list(oracle_prices.values())
+        symbols = [entry.get("tokenSymbol") or "" for entry in entries]
+
+        records = np.empty(len(entries), dtype=PRICE_DTYPE)
+        records["symbol"] = symbols
+        records["address"] = addresses
+        scales = 10.0 ** np.array([price_exponent(entry, address, token_decimals)
+                                   for address, entry in zip(addresses, entries)], dtype=np.float64)
+        # numpy's string-to-float cast parses the whole column at once
+        records["max_price"] = np.array([entry.get("maxPriceFull") or "nan" for entry in entries]).astype(np.float64) / scales
+        records["min_price"] = np.array([entry.get("minPriceFull") or "nan" for entry in entries]).astype(np.float64) / scales
+        return cls.from_records(records)
+
+    # Index already-parsed records (e.g. a copy read from the shared market feed)
+    @classmethod
+    def from_records(cls, records):
+        rows = {}
+        for i, (address, symbol) in enumerate(zip(records["address"].tolist(), records["symbol"].tolist())):
+            rows[address] = i
+            rows[address.lower()] = i
+            if symbol:
+                rows.setdefault(symbol, i)
+        return cls(records, rows)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, key):
+        return self.row(key) is not None
+
+    def row(self, key):
+        i = self._rows.get(key)
+        if i is None and isinstance(key, str):
+            i = self._rows.get(key.lower())
+        return i
+
+    # (max_price, min_price) for a symbol or address, like parse_oracle_entry; (None, None) if unknown
+    def prices(self, key):
+        i = self.row(key)
+        if i is None:
+            return None, None
+        return float(self.max_prices[i]), float(self.min_prices[i])
+
+    # Average of max and min price for many tokens at once; NaN for unknown ones
+    def mid_prices(self, keys):
+        rows = [self.row(key) for key in keys]
+        rows = np.array([-1 if i is None else i for i in rows], dtype=np.int64)
+        # Only known rows are indexed, so an empty table (e.g. a failed oracle fetch) gives all NaN
+        known = rows >= 0
+        mid = np.full(len(rows), np.nan)
+        mid[known] = (self.max_prices[rows[known]] + self.min_prices[rows[known]]) / 2
+        return mid
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Equity view and position sizing kept in memory, so sizing an order is arithmetic, not I/O.
+#
+# The native balance (RPC) and available liquidity (GMX stats) are refreshed by refresh(), which the
+# scheduler calls on its balance schedule, and again on the next sizing call after a fill. The balance
+# is valued at the USD price from price_source(), normally the oracle price the bot trades on.
+#
+# An open is sized as open_percentage of equity (pre-leverage USD, like size_delta_usd), then cut so
+# that the leveraged notional of all open positions stays within max_exposure x equity and the new
+# notional takes at most max_liquidity_share of the market's available liquidity on that side.
+class RiskEngine:
+
+    def __init__(self, fetch_native_balance, price_source, liquidity_source=None, leverage=5, open_percentage=0.1,
+                 close_percentage=0.1, max_exposure=1.5, max_liquidity_share=0.05, min_size_usd=1.0,
+                 refresh_interval=60, clock=time.monotonic):
+        self.fetch_native_balance = fetch_native_balance
+        self.price_source = price_source
+        self.liquidity_source = liquidity_source
+        self.leverage = leverage
+        self.open_percentage = open_percentage
+        self.close_percentage = close_percentage
+        self.max_exposure = max_exposure
+        self.max_liquidity_share = max_liquidity_share
+        self.min_size_usd = min_size_usd
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.native_balance = None
+        self.last_price = None
+        self.liquidity = {}  # (symbol, is_long) -> available liquidity in USD
+        self.exposures = {}  # symbol -> open position value (pre-leverage USD)
+        self.last_limit = None  # What bounded the last open_size(): percentage, exposure, liquidity or equity
+        self._updated = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    # Re-read the balance and liquidity; returns the resulting equity in USD (None if unknown)
+    def refresh(self):
+        balance = self.fetch_native_balance()
+        liquidity = None
+        if self.liquidity_source is not None:
+            try:
+                liquidity = parse_liquidity(self.liquidity_source())
+            except Exception as e:
+                logger.warning("Error fetching available liquidity; keeping the previous values: %s", e)
+        with self._lock:
+            if balance is not None:
+                self.native_balance = balance
+                self._updated = self.clock()
+                self._stale = False
+            if liquidity is not None:
+                self.liquidity = liquidity
+        return self._value()
+
+    def _value(self):
+        if self.native_balance is None:
+            return None
+        price = self.price_source()
+        if price is None:
+            return None
+        self.last_price = price
+        return self.native_balance * price
+
+    # Equity in USD, refreshing first if a fill happened or the balance is older than three schedules
+    def equity(self):
+        with self._lock:
+            needs_refresh = self._stale or self._updated is None or self.clock() - self._updated > self.refresh_interval * 3
+        if needs_refresh:
+            return self.refresh()
+        return self._value()
+
+    def set_exposure(self, symbol, position_value):
+        with self._lock:
+            if position_value:
+                self.exposures[symbol] = position_value
+            else:
+                self.exposures.pop(symbol, None)
+
+    # After an order fills the balance has changed (collateral, fees), so the next sizing re-reads it
+    def on_fill(self, symbol, position_value):
+        self.set_exposure(symbol, position_value)
+        with self._lock:
+            self._stale = True
+
+    # size_delta_usd for opening a position, or None if there is nothing (or too little) to trade.
+    # `equity` may be passed in when the caller already holds a fresh value.
+    def open_size(self, symbol, is_long, equity=None):
+        equity = self.equity() if equity is None else equity
+        if equity is None:
+            self.last_limit = "equity"
+            logger.error("Error: No equity estimate. Skipping %s position calculation.", symbol)
+            return None
+        size = equity * self.open_percentage
+        limit = "percentage"
+
+        with self._lock:
+            others = sum(value for other, value in self.exposures.items() if other != symbol)
+            available = self.liquidity.get((symbol, is_long))
+        headroom = self.max_exposure * equity / self.leverage - others
+        if headroom < size:
+            size, limit = headroom, "exposure"
+        if available is not None and available * self.max_liquidity_share / self.leverage < size:
+            size, limit = available * self.max_liquidity_share / self.leverage, "liquidity"
+
+        self.last_limit = limit
+        if size < self.min_size_usd:
+            logger.warning("%s %s size %.2f USD is below the %.2f USD minimum (limited by %s); skipping.",
+                           symbol, "long" if is_long else "short", size, self.min_size_usd, limit)
+            return None
+        return size
+
+    # size_delta_usd for closing, keeping close_percentage of the position open
+    def close_size(self, symbol, position_value):
+        if position_value is None:
+            logger.error("Error: Current %s position value is None. Skipping position calculation.", symbol)
+            return None
+        return position_value * (1 - self.close_percentage)
+
+    # For the metrics registry; cached values only, never triggers a refresh
+    def stats(self):
+        with self._lock:
+            age = None if self._updated is None else self.clock() - self._updated
+            stats = {"equity": {
+                "native_balance": self.native_balance,
+                "usd": None if self.native_balance is None or self.last_price is None else self.native_balance * self.last_price,
+                "balance_age_seconds": age,
+            }}
+            for symbol, value in self.exposures.items():
+                stats[symbol] = {"position_value": value, "notional": value * self.leverage}
+        return stats
+
+
+# {(symbol, is_long): USD} from get_available_liquidity() output ({"long": {symbol: USD}, "short": {...}})
+def parse_liquidity(raw):
+    liquidity = {}
+    for side, is_long in (("long", True), ("short", False)):
+        for symbol, value in (raw.get(side) or {}).items():
+            try:
+                liquidity[(symbol, is_long)] = float(value)
+            except (TypeError, ValueError):
+                continue
+    return liquidity
+
+
+if __name__ == "__main__":
+    # Sizing against mocked balances, prices and liquidity
+    now = [0.0]
+    balance = {"eth": 2.0, "calls": 0}
+    liquidity = {"long": {"ETH": 1_000_000.0, "DOGE": 4_000.0}, "short": {"ETH": 500_000.0}, "parameter": "liquidity"}
+
+    def fetch_native_balance():
+        balance["calls"] += 1
+        return balance["eth"]
+
+    engine = RiskEngine(fetch_native_balance, price_source=lambda: 3000.0, liquidity_source=lambda: liquidity,
+                        leverage=5, open_percentage=0.1, max_exposure=1.5, max_liquidity_share=0.05,
+                        refresh_interval=60, clock=lambda: now[0])
+
+    # 2 ETH at 3000 = 6000 USD of equity; 10% of it, well inside every limit
+    assert engine.open_size("ETH", True) == 600.0 and engine.last_limit == "percentage"
+    assert balance["calls"] == 1
+    engine.open_size("ETH", False)
+    assert balance["calls"] == 1, "sizing within the refresh window must not refetch the balance"
+
+    # Liquidity: 5% of 4000 USD of DOGE long liquidity is 200 USD of notional, 40 USD before leverage
+    assert engine.open_size("DOGE", True) == 40.0 and engine.last_limit == "liquidity"
+    # No liquidity figure for a side means no liquidity cap
+    assert engine.open_size("DOGE", False) == 600.0
+
+    # Exposure: 1.5 x 6000 = 9000 USD notional in total. Two 600 USD positions (6000 notional) leave 600 USD
+    # (3000 notional) of headroom, one more leaves 0
+    engine.on_fill("ETH", 600.0)
+    engine.on_fill("BTC", 600.0)
+    assert engine.open_size("SOL", True) == 600.0 and balance["calls"] == 2, "a fill forces a refresh"
+    engine.on_fill("SOL", 600.0)
+    assert engine.open_size("ARB", True) is None and engine.last_limit == "exposure"
+    # Resizing an existing market does not count its own exposure against it
+    assert engine.open_size("SOL", True) == 600.0
+    engine.on_fill("BTC", 0)
+    assert engine.open_size("ARB", True) == 600.0
+
+    # Balance and price changes flow into equity on the next refresh
+    engine.on_fill("SOL", 0)
+    assert engine.open_size("ARB", True) == 600.0
+    calls = balance["calls"]
+    balance["eth"] = 1.0
+    now[0] += 200  # Older than three refresh intervals
+    assert engine.open_size("ARB", True) == 300.0 and balance["calls"] == calls + 1
+    assert engine.open_size("ARB", True, equity=10_000.0) == 1000.0
+
+    # A failed balance read keeps the last known balance; no balance at all means no trade
+    balance["eth"] = None
+    engine.on_fill("ETH", 600.0)
+    assert engine.open_size("ARB", True) == 300.0
+    empty = RiskEngine(lambda: None, price_source=lambda: 3000.0)
+    assert empty.open_size("ETH", True) is None and empty.last_limit == "equity"
+
+    assert engine.close_size("ETH", 600.0) == 540.0 and engine.close_size("ETH", None) is None
+
+    # Equity valued from a GMX oracle payload as the API returns it: *PriceFull is the USD price times
+    # 10 ** (30 - token decimals) and oracleDecimals is often null, so decimals come from the markets' metadata
+    from price_table import OraclePriceTable, token_decimals_from_markets
+
+    weth, wbtc, usdc = ("0x82aF49447D8a07e3bd95BD0d56f35241523fBab1", "0x47904963fc8b2340414262125aF798B9655E58Cd",
+                        "0xaf88d065e77c8cC2239327C5EDb3A432268e5831")
+    markets = {"0x70d95587d40A2caf56bd97485aB3Eec10Bee6336": {
+        "index_token_address": weth, "market_metadata": {"symbol": "ETH", "decimals": 18},
+        "long_token_address": weth, "long_token_metadata": {"symbol": "ETH", "decimals": 18},
+        "short_token_address": usdc, "short_token_metadata": {"symbol": "USDC", "decimals": 6}},
+        "0x47c031236e19d024b42f8AE6780E44A573170703": {
+        "index_token_address": wbtc, "market_metadata": {"symbol": "BTC", "decimals": 8},
+        "long_token_address": wbtc, "long_token_metadata": {"symbol": "BTC", "decimals": 8},
+        "short_token_address": usdc, "short_token_metadata": {"symbol": "USDC", "decimals": 6}}}
+    payload = {
+        weth: {"tokenAddress": weth, "tokenSymbol": "ETH", "minPriceFull": "3428110000000000",
+               "maxPriceFull": "3428430000000000", "oracleDecimals": None},
+        wbtc: {"tokenAddress": wbtc, "tokenSymbol": "BTC", "minPriceFull": "671050000000000000000000000",
+               "maxPriceFull": "671150000000000000000000000", "oracleDecimals": None},
+        usdc: {"tokenAddress": usdc, "tokenSymbol": "USDC", "minPriceFull": "999900000000000000000000",
+               "maxPriceFull": "1000100000000000000000000", "oracleDecimals": None},
+    }
+    table = OraclePriceTable.from_payload(payload, token_decimals_from_markets(markets))
+    assert [round(price, 2) for price in table.prices("ETH")] == [3428.43, 3428.11]
+    assert [round(price, 2) for price in table.prices("BTC")] == [67115.0, 67105.0]
+    assert [round(price, 4) for price in table.prices(usdc)] == [1.0001, 0.9999]
+    # Without metadata an 18-decimal token still prices correctly; a filled-in oracleDecimals wins
+    assert round(OraclePriceTable.from_payload(payload).prices("ETH")[0], 2) == 3428.43
+    payload[wbtc] = dict(payload[wbtc], oracleDecimals=22)
+    assert round(OraclePriceTable.from_payload(payload).prices("BTC")[0], 2) == 67115.0
+
+    def oracle_price():
+        max_price, min_price = table.prices("ETH")
+        return (max_price + min_price) / 2
+
+    # 2 ETH at ~3428 USD is ~6857 USD of equity, so a 10% open is ~686 USD
+    priced = RiskEngine(lambda: 2.0, price_source=oracle_price, leverage=5, open_percentage=0.1)
+    assert abs(priced.open_size("ETH", True) - 685.654) < 1e-6 and priced.last_limit == "percentage"
+    print("Risk engine sizing checks passed:", engine.stats())
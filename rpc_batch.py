@@ -0,0 +1,298 @@
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+from eth_abi import decode, encode
+from web3.providers import JSONBaseProvider
+
+from http_pool import get_session
+
+# Multicall3 is deployed at the same address on Arbitrum, Avalanche and most EVM chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+AGGREGATE3_SELECTOR = bytes.fromhex("82ad56cb")  # aggregate3((address,bool,bytes)[])
+GET_ETH_BALANCE_SELECTOR = bytes.fromhex("4d2301cc")  # getEthBalance(address)
+
+
+# Collects JSON-RPC requests from any thread and sends them as batch requests.
+# A batch goes out when it reaches max_batch_size or flush_interval after its first request,
+# so reads issued together in one bot iteration share a single HTTP round-trip.
+class RpcBatcher:
+
+    def __init__(self, endpoint_uri, http=None, max_batch_size=50, flush_interval=0.005):
+        self.endpoint_uri = endpoint_uri
+        self.http = http or get_session()
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self._ids = itertools.count(1)
+        self._pending = []
+        self._first_pending_at = None
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="rpc-batcher", daemon=True)
+        self._worker.start()
+
+    # Queue a request; the future resolves to the raw JSON-RPC response ({"result": ...} or {"error": ...})
+    def submit(self, method, params):
+        future = Future()
+        request = {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("RpcBatcher is closed")
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.append((request, future))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._condition.notify()
+        return future
+
+    # Blocking convenience: return the result or raise on a JSON-RPC error
+    def call(self, method, params, timeout=30):
+        response = self.submit(method, params).result(timeout=timeout)
+        if "error" in response:
+            raise ValueError(f"{method} failed: {response['error']}")
+        return response["result"]
+
+    # Send everything queued right now instead of waiting for the flush interval
+    def flush(self):
+        with self._condition:
+            batch = self._take_batch()
+        while batch:
+            self._send(batch)
+            with self._condition:
+                batch = self._take_batch()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+        self.flush()
+
+    def _take_batch(self):
+        batch = self._pending[:self.max_batch_size]
+        del self._pending[:self.max_batch_size]
+        self._first_pending_at = time.monotonic() if self._pending else None
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._pending:
+                        if len(self._pending) >= self.max_batch_size:
+                            break
+                        remaining = self._first_pending_at + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        self._condition.wait()
+                if self._closed:
+                    return
+                batch = self._take_batch()
+            self._send(batch)
+
+    def _send(self, batch):
+        try:
+            response = self.http.post(self.endpoint_uri, json=[request for request, _ in batch], endpoint="rpc-batch")
+            response.raise_for_status()
+            payload = response.json()
+            if isinstance(payload, dict):
+                # Some nodes answer a rejected batch with a single error object
+                payload = [dict(payload, id=request["id"]) for request, _ in batch]
+            by_id = {item.get("id"): item for item in payload}
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for request, future in batch:
+            item = by_id.get(request["id"])
+            if item is None:
+                future.set_exception(ValueError(f"No response for JSON-RPC request {request['id']} ({request['method']})"))
+            else:
+                future.set_result(item)
+
+
+# web3 provider that routes every request through an RpcBatcher, so reads made concurrently
+# from several threads (e.g. scheduler stages) are folded into one batch request
+class BatchingHTTPProvider(JSONBaseProvider):
+
+    def __init__(self, batcher, timeout=30):
+        super().__init__()
+        self.batcher = batcher
+        self.timeout = timeout
+        self.endpoint_uri = batcher.endpoint_uri
+
+    def make_request(self, method, params):
+        return self.batcher.submit(method, params).result(timeout=self.timeout)
+
+    def is_connected(self, show_traceback=False):
+        try:
+            return "result" in self.make_request("web3_clientVersion", [])
+        except Exception:
+            if show_traceback:
+                raise
+            return False
+
+
+# Aggregates eth_calls into Multicall3 aggregate3 calls, max_calls per eth_call
+class Multicall:
+
+    def __init__(self, batcher, address=MULTICALL3_ADDRESS, max_calls=100, block="latest"):
+        self.batcher = batcher
+        self.address = address
+        self.max_calls = max_calls
+        self.block = block
+        self._calls = []
+
+    # Queue a call; the future resolves to the raw return data, or raises if the call reverted
+    def add(self, target, calldata, allow_failure=True):
+        future = Future()
+        self._calls.append(((target, allow_failure, bytes(calldata)), future))
+        return future
+
+    def add_eth_balance(self, address):
+        return self.add(self.address, GET_ETH_BALANCE_SELECTOR + encode(["address"], [address]))
+
+    # Send all queued calls; chunks are submitted together so they share one JSON-RPC batch
+    def execute(self):
+        calls, self._calls = self._calls, []
+        chunks = [calls[i:i + self.max_calls] for i in range(0, len(calls), self.max_calls)]
+        responses = []
+        for chunk in chunks:
+            data = AGGREGATE3_SELECTOR + encode(["(address,bool,bytes)[]"], [[call for call, _ in chunk]])
+            responses.append(self.batcher.submit("eth_call", [{"to": self.address, "data": "0x" + data.hex()}, self.block]))
+        self.batcher.flush()
+
+        for chunk, response_future in zip(chunks, responses):
+            try:
+                response = response_future.result()
+                if "error" in response:
+                    raise ValueError(f"Multicall failed: {response['error']}")
+                results = decode(["(bool,bytes)[]"], bytes.fromhex(response["result"][2:]))[0]
+            except Exception as e:
+                for _, future in chunk:
+                    future.set_exception(e)
+                continue
+            for (call, future), (success, return_data) in zip(chunk, results):
+                if success:
+                    future.set_result(return_data)
+                else:
+                    future.set_exception(ValueError(f"Call to {call[0]} reverted"))
+        return len(calls)
+
+
+# Native balances (in Wei) for many wallets in a single eth_call
+def get_eth_balances(batcher, addresses):
+    multicall = Multicall(batcher)
+    futures = [multicall.add_eth_balance(address) for address in addresses]
+    multicall.execute()
+    return {address: decode(["uint256"], future.result())[0] for address, future in zip(addresses, futures)}
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    from web3 import Web3
+
+    # Stub RPC node: answers eth_blockNumber, eth_getBalance and Multicall3 aggregate3 eth_calls, and
+    # records every HTTP request so batching shows up as the number of POSTs
+    class StubResponse:
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self.payload
+
+    class StubNode:
+        REVERTING = "0x000000000000000000000000000000000000dEaD"
+
+        def __init__(self):
+            self.posts = []
+            self.lock = threading.Lock()
+
+        @staticmethod
+        def balance(address):
+            return int(address, 16) % 10 ** 18
+
+        def post(self, url, json=None, endpoint=None):
+            with self.lock:
+                self.posts.append(json)
+            return StubResponse([self.answer(request) for request in json if request["method"] != "drop_me"])
+
+        def answer(self, request):
+            method, params = request["method"], request["params"]
+            if method == "eth_blockNumber":
+                return {"jsonrpc": "2.0", "id": request["id"], "result": "0x10"}
+            if method == "eth_getBalance":
+                return {"jsonrpc": "2.0", "id": request["id"], "result": hex(self.balance(params[0]))}
+            if method == "eth_call" and params[0]["to"] == MULTICALL3_ADDRESS:
+                data = bytes.fromhex(params[0]["data"][2:])
+                assert data[:4] == AGGREGATE3_SELECTOR
+                results = []
+                for target, _, calldata in decode(["(address,bool,bytes)[]"], data[4:])[0]:
+                    if target.lower() == self.REVERTING.lower():
+                        results.append((False, b""))
+                    else:
+                        assert calldata[:4] == GET_ETH_BALANCE_SELECTOR
+                        owner = decode(["address"], calldata[4:])[0]
+                        results.append((True, encode(["uint256"], [self.balance(owner)])))
+                return {"jsonrpc": "2.0", "id": request["id"], "result": "0x" + encode(["(bool,bytes)[]"], [results]).hex()}
+            return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": "method not found"}}
+
+    addresses = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 251)]
+
+    # Reads issued together from many threads go out as one batch
+    node = StubNode()
+    batcher = RpcBatcher("http://stub", http=node, max_batch_size=50, flush_interval=0.05)
+    with ThreadPoolExecutor(20) as pool:
+        balances = list(pool.map(lambda address: int(batcher.call("eth_getBalance", [address, "latest"]), 16),
+                                 addresses[:20]))
+    assert balances == [StubNode.balance(address) for address in addresses[:20]]
+    assert len(node.posts) <= 2 and sum(len(batch) for batch in node.posts) == 20, [len(batch) for batch in node.posts]
+
+    # max_batch_size splits a burst; JSON-RPC errors and missing responses fail only their own request
+    node.posts.clear()
+    futures = [batcher.submit("eth_blockNumber", []) for _ in range(120)]
+    failing = batcher.submit("eth_unknown", [])
+    dropped = batcher.submit("drop_me", [])
+    batcher.flush()
+    assert all(future.result(timeout=5)["result"] == "0x10" for future in futures)
+    sizes = [len(batch) for batch in node.posts]
+    assert max(sizes) == 50 and sum(sizes) == 122 and len(sizes) <= 4, sizes
+    assert "error" in failing.result(timeout=5)
+    try:
+        dropped.result(timeout=5)
+    except ValueError as e:
+        assert "No response" in str(e)
+    else:
+        raise AssertionError("a request without a response resolved")
+
+    # web3 through the batching provider
+    w3 = Web3(BatchingHTTPProvider(batcher))
+    assert w3.eth.block_number == 16 and w3.eth.get_balance(addresses[7]) == StubNode.balance(addresses[7])
+
+    # Multicall3: 250 balances in three aggregate3 calls sharing one POST, decoded back per address
+    node.posts.clear()
+    assert get_eth_balances(batcher, addresses) == {address: StubNode.balance(address) for address in addresses}
+    assert len(node.posts) == 1 and [request["method"] for request in node.posts[0]] == ["eth_call"] * 3
+
+    # A reverted call fails only its own future
+    multicall = Multicall(batcher)
+    good = multicall.add_eth_balance(addresses[0])
+    reverted = multicall.add(StubNode.REVERTING, b"\x12\x34\x56\x78")
+    assert multicall.execute() == 2
+    assert decode(["uint256"], good.result())[0] == StubNode.balance(addresses[0])
+    try:
+        reverted.result()
+    except ValueError as e:
+        assert "reverted" in str(e)
+    else:
+        raise AssertionError("a reverted call resolved")
+    batcher.close()
+    print("Batching, per-request errors, the web3 provider and Multicall3 encoding/decoding check out against the stub node.")
@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import math
+import time
+
+from aggregator import TickAggregator
+
+logger = logging.getLogger(__name__)
+
+
+# Epoch seconds of a candle timestamp: seeded history may carry pandas Timestamps, live bars carry ints
+def _epoch_seconds(timestamp):
+    if timestamp is None:
+        return None
+    return int(timestamp.timestamp()) if hasattr(timestamp, "timestamp") else int(timestamp)
+
+
+# Event-driven trading loop: independent stages connected by bounded queues.
+#
+#   price feed --ticks--> candle aggregator --signals--> order executor
+#   balance refresher (on its own schedule, read by the order executor)
+#
+# Signals are evaluated the moment a candle_interval bar closes rather than on a fixed sleep. The
+# aggregator may build other timeframes alongside it. Blocking callables (SDK, RPC, HTTP) are run
+# in the default thread pool so they never stall the loop.
+#
+# The candle the first tick lands in only saw part of its interval, so signals start with the next
+# one. When it closes, it and any bar between the engine's seeded history and it are fed to the engine
+# from fetch_candles(start) (closed candles from `start` on, e.g. from a candle source), so the
+# indicators have no hole after a restart; a bar the source does not have yet is taken from the ticks.
+# Oracle ticks carry no traded volume: fetch_volume(candle_timestamp), if given, looks up the closed
+# candle's volume, and the last known volume is carried forward when it has none, so Volume_MA is not
+# dragged towards zero.
+class TradingScheduler:
+
+    def __init__(self, fetch_price, engine, execute_signal, fetch_balance=None, fetch_volume=None,
+                 fetch_candles=None, candle_interval=900, poll_interval=5, balance_interval=60,
+                 tick_queue_size=64, aggregator=None, clock=time.time, sleep=asyncio.sleep):
+        self.fetch_price = fetch_price
+        self.engine = engine
+        self.execute_signal = execute_signal
+        self.fetch_balance = fetch_balance
+        self.fetch_volume = fetch_volume
+        self.fetch_candles = fetch_candles
+        self.candle_interval = candle_interval
+        self.poll_interval = poll_interval
+        self.balance_interval = balance_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.aggregator = aggregator or TickAggregator(intervals=(candle_interval,))
+        if candle_interval not in self.aggregator.intervals:
+            raise ValueError(f"Aggregator does not build {candle_interval}s candles")
+
+        self.ticks = asyncio.Queue(maxsize=tick_queue_size)
+        # Only the newest signal matters; a stale one still waiting for the executor is replaced
+        self.signals = asyncio.Queue(maxsize=1)
+        self.wallet_balance_usd = None
+        self.last_price = None
+        self.skipped_candles = 0  # Closed candles that produced no signal (the partial first one)
+        self.backfilled_candles = 0  # Bars fed to the engine to close the gap before the first full candle
+        self._live_from = None  # Start of the first candle_interval bar seen from its beginning
+        self._last_volume = None
+        self._stop = asyncio.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    # Stage 1: poll the oracle price and push timestamped ticks downstream
+    async def price_feed(self):
+        while not self.stopped:
+            try:
+                price = await self._call(self.fetch_price)
+            except Exception as e:
+                logger.error("Error fetching price: %s", e)
+                price = None
+            if price is not None:
+                # Blocks when the aggregator falls behind, which slows polling instead of piling up ticks
+                await self.ticks.put((self.clock(), price))
+            await self.sleep(self.poll_interval)
+
+    # Stage 2: fold ticks into candles and emit a signal as soon as a candle closes
+    async def candle_aggregator(self):
+        while True:
+            timestamp, price = await self.ticks.get()
+            try:
+                for candle in self._on_tick(timestamp, price):
+                    await self._close_candle(candle)
+            except Exception as e:
+                logger.error("Error aggregating tick: %s", e)
+            finally:
+                self.ticks.task_done()
+
+    # Closed candle_interval bars the tick completed
+    def _on_tick(self, timestamp, price):
+        self.last_price = price
+        if self._live_from is None:
+            self._live_from = math.ceil(timestamp / self.candle_interval) * self.candle_interval
+        return [bar for interval, bar in self.aggregator.add(timestamp, price) if interval == self.candle_interval]
+
+    async def _close_candle(self, candle):
+        if candle["Timestamp"] < self._live_from:
+            self.skipped_candles += 1
+            await self._backfill(candle)
+            logger.info("No signal on the partial candle at %s; signals start with the first full one.", candle["Timestamp"])
+            return
+        volume = await self._candle_volume(candle)
+        signal = self.engine.update(candle["Timestamp"], candle["Close"], volume)
+        logger.debug("Candle closed at %s - Close: %s, RSI: %s, Position: %s",
+                     candle["Timestamp"], candle["Close"], signal["RSI"], signal["Position"])
+        if self.signals.full():
+            self.signals.get_nowait()
+            self.signals.task_done()
+        self.signals.put_nowait((signal, candle["Close"]))
+
+    # Feed the engine every bar after its last one up to `candle`, the partly observed first candle. Bars
+    # come from fetch_candles when it has them; otherwise `candle` itself is used, whose close is the last
+    # tick before the boundary. Signals are not emitted for these bars.
+    async def _backfill(self, candle):
+        last = _epoch_seconds(getattr(self.engine, "last_timestamp", None))
+        start = candle["Timestamp"] if last is None else last + self.candle_interval
+        if start > candle["Timestamp"]:
+            return
+        bars = []
+        if self.fetch_candles is not None:
+            try:
+                fetched = await self._call(self.fetch_candles, start)
+                bars = [(int(timestamp), float(close), float(volume))
+                        for timestamp, close, volume in zip(fetched["Timestamp"], fetched["Close"], fetched["Volume"])
+                        if start <= timestamp <= candle["Timestamp"] and close == close]
+            except Exception as e:
+                logger.warning("Error fetching candles from %s for the backfill: %s", start, e)
+        if not bars or bars[-1][0] != candle["Timestamp"]:
+            bars.append((candle["Timestamp"], candle["Close"], await self._candle_volume(candle)))
+        missing = (candle["Timestamp"] - start) // self.candle_interval + 1 - len(bars)
+        if missing:
+            logger.warning("%s candles before %s are missing from the candle source; the indicators skip them.",
+                           missing, candle["Timestamp"])
+        for timestamp, close, volume in bars:
+            self.engine.update(timestamp, close, self._volume_or_carried(volume, timestamp, default=0.0))
+        self.backfilled_candles += len(bars)
+
+    async def _candle_volume(self, candle):
+        volume = None
+        if self.fetch_volume is not None:
+            try:
+                volume = await self._call(self.fetch_volume, candle["Timestamp"])
+            except Exception as e:
+                logger.warning("Error fetching volume for the candle at %s: %s", candle["Timestamp"], e)
+        return self._volume_or_carried(volume, candle["Timestamp"], default=candle["Volume"])
+
+    def _volume_or_carried(self, volume, timestamp, default):
+        if volume is None or volume != volume:
+            if self._last_volume is None:
+                # Before any lookup succeeds, carry the last volume the engine was seeded with
+                volumes = getattr(self.engine, "volumes", None)
+                seeded = volumes.last() if volumes is not None else None
+                self._last_volume = float(seeded) if seeded is not None and seeded == seeded else None
+            if self._last_volume is None:
+                return default
+            logger.debug("No volume for the candle at %s; carrying %s forward.", timestamp, self._last_volume)
+            return self._last_volume
+        self._last_volume = volume
+        return volume
+
+    # Stage 3: keep a recent wallet balance around so order sizing never waits on RPC
+    async def balance_refresher(self):
+        if self.fetch_balance is None:
+            return
+        while not self.stopped:
+            try:
+                balance = await self._call(self.fetch_balance)
+                if balance is not None:
+                    self.wallet_balance_usd = balance
+            except Exception as e:
+                logger.error("Error refreshing wallet balance: %s", e)
+            await self.sleep(self.balance_interval)
+
+    # Stage 4: act on signals one at a time
+    async def order_executor(self):
+        while True:
+            signal, price = await self.signals.get()
+            try:
+                await self._call(self.execute_signal, signal, price, self.wallet_balance_usd)
+            except Exception as e:
+                logger.error("Error executing signal: %s", e)
+            finally:
+                self.signals.task_done()
+
+    async def run(self):
+        logger.info("Starting trading scheduler...")
+        producers = [
+            asyncio.create_task(self.price_feed()),
+            asyncio.create_task(self.balance_refresher()),
+        ]
+        consumers = [
+            asyncio.create_task(self.candle_aggregator()),
+            asyncio.create_task(self.order_executor()),
+        ]
+        try:
+            await self._stop.wait()
+        finally:
+            logger.info("Stopping trading scheduler...")
+            self._stop.set()
+            for task in producers:
+                task.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+            # Let in-flight ticks and signals finish before tearing down the consumers
+            await self.ticks.join()
+            await self.signals.join()
+            for task in consumers:
+                task.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+            logger.info("Trading scheduler stopped.")
+
+
+if __name__ == "__main__":
+    import heapq
+
+    import numpy as np
+    import pandas as pd
+
+    from indicators import IndicatorEngine, StreamingRSI
+
+    # Virtual time: the clock jumps to the earliest sleeper's deadline once every sleeping stage is waiting,
+    # so hours of polling replay in moments and in the same order every run
+    class SimulatedClock:
+
+        def __init__(self, now, sleepers):
+            self.now = now
+            self.sleepers = sleepers
+            self._waiting = []
+            self._order = 0
+
+        def __call__(self):
+            return self.now
+
+        async def sleep(self, seconds):
+            future = asyncio.get_running_loop().create_future()
+            self._order += 1
+            heapq.heappush(self._waiting, (self.now + seconds, self._order, future))
+            await future
+
+        async def drive(self):
+            while True:
+                while len(self._waiting) < self.sleepers:
+                    await asyncio.sleep(0.0005)
+                self.now, _, future = heapq.heappop(self._waiting)
+                future.set_result(None)
+
+    interval = 900
+    first_bucket = 1_700_000_100  # A candle boundary
+    start = first_bucket + 437  # The bot starts mid-candle
+
+    def price_at(timestamp):
+        return 2000 + 25 * np.sin(timestamp / 1800) + (timestamp % 97) / 10
+
+    # History is seeded up to (not including) history_end, as pandas Timestamps like CandleStore.load() gives
+    def simulate(volumes, signals_wanted=4, history_end=first_bucket, fetch_candles=None):
+        engine = IndicatorEngine(capacity=200)
+        history = history_end - interval * np.arange(200, 0, -1)
+        engine.seed(pd.DataFrame({"Timestamp": pd.to_datetime(history, unit="s", utc=True),
+                                  "Close": [price_at(t) for t in history], "Volume": np.full(200, 3e6)}))
+        # Timestamps of the bars fed to the engine after seeding
+        engine.live_updates = []
+        seeded_update = engine.update
+
+        def update(timestamp, close, volume=0.0, columns=None):
+            engine.live_updates.append(timestamp)
+            return seeded_update(timestamp, close, volume, columns)
+
+        engine.update = update
+        clock = SimulatedClock(start, sleepers=2)
+        ticks, balances, executed = [], [], []
+
+        def fetch_price():
+            ticks.append(clock())
+            return price_at(clock())
+
+        def fetch_balance():
+            balances.append(clock())
+            return 1000.0 + len(balances)
+
+        async def main():
+            loop = asyncio.get_running_loop()
+
+            def execute_signal(signal, price, wallet_balance_usd):
+                executed.append((signal["Timestamp"], price, wallet_balance_usd))
+                if len(executed) == signals_wanted:
+                    loop.call_soon_threadsafe(scheduler.stop)
+
+            scheduler = TradingScheduler(fetch_price, engine, execute_signal, fetch_balance=fetch_balance,
+                                         fetch_volume=volumes.get if volumes is not None else None,
+                                         fetch_candles=fetch_candles,
+                                         candle_interval=interval, poll_interval=5, balance_interval=60,
+                                         clock=clock, sleep=clock.sleep)
+            driver = asyncio.create_task(clock.drive())
+            try:
+                await scheduler.run()
+            finally:
+                driver.cancel()
+            return scheduler
+
+        return asyncio.run(main()), engine, ticks, balances, executed
+
+    candles = [first_bucket + interval * i for i in range(1, 5)]
+    volumes = {candles[0]: 2e6, candles[1]: None, candles[2]: 4e6, candles[3]: 5e6}
+    scheduler, engine, ticks, balances, executed = simulate(volumes)
+
+    # Ticks every poll_interval and balance reads every balance_interval of simulated time
+    assert ticks[:3] == [start, start + 5, start + 10] and np.all(np.diff(ticks) == 5)
+    assert balances[:3] == [start, start + 60, start + 120]
+    # The partial first candle is skipped; every later one closes at its last tick's price
+    assert scheduler.skipped_candles == 1
+    assert [timestamp for timestamp, _, _ in executed] == candles
+    for timestamp, price, _ in executed:
+        last_tick = max(tick for tick in ticks if tick < timestamp + interval)
+        assert price == price_at(last_tick)
+    # Looked-up volumes reach the engine, and a missing one carries the previous volume
+    assert list(engine.volumes.to_array()[-4:]) == [2e6, 2e6, 4e6, 5e6]
+    assert engine.latest()["Volume_MA"] == (196 * 3e6 + 13e6) / 200
+    # Orders see the balance most recently read by the balance stage
+    assert executed[0][2] == 1000.0 + sum(1 for read in balances if read < candles[0] + interval + 5)
+
+    # The partial candle still reaches the indicators (no signal): without a candle source its close is the
+    # last tick before the boundary
+    assert engine.live_updates == [first_bucket] + candles and scheduler.backfilled_candles == 1
+    assert engine.closes.to_array()[-5] == price_at(max(tick for tick in ticks if tick < first_bucket + interval))
+
+    # With history ending two bars early, the two missing bars and the partial one come from the candle
+    # source, and RSI matches one computed over the unbroken series
+    source_candles = {"Timestamp": first_bucket - interval * np.arange(2, -1, -1)}
+    source_candles.update(Close=[price_at(t) + 0.5 for t in source_candles["Timestamp"]], Volume=[6e6, 7e6, 8e6])
+    fetches = []
+
+    def fetch_candles(start):
+        fetches.append(start)
+        return source_candles
+
+    scheduler, engine, ticks, _, executed = simulate(volumes, history_end=first_bucket - 2 * interval,
+                                                     fetch_candles=fetch_candles)
+    assert fetches == [first_bucket - 2 * interval] and scheduler.backfilled_candles == 3
+    assert engine.live_updates == list(source_candles["Timestamp"]) + candles
+    assert list(engine.closes.to_array()[-7:-4]) == source_candles["Close"]
+    assert list(engine.volumes.to_array()[-7:]) == [6e6, 7e6, 8e6, 2e6, 2e6, 4e6, 5e6]
+    reference = StreamingRSI(14)
+    history = first_bucket - 2 * interval - interval * np.arange(200, 0, -1)
+    for close in [price_at(t) for t in history] + list(engine.closes.to_array()[-7:]):
+        reference.update(close)
+    assert abs(engine.latest()["RSI"] - reference.value) < 1e-9
+
+    # Without a volume lookup the seeded volume is carried, so Volume_MA holds instead of sinking towards 0
+    _, engine, _, _, _ = simulate(None)
+    assert engine.latest()["Volume_MA"] == 3e6
+    print(f"Simulated {len(ticks)} ticks over {len(candles) + 1} candles: signals on {len(executed)} full candles, "
+          f"partial and missing candles backfilled, volumes carried.")
@@ -0,0 +1,314 @@
+import numpy as np
+
+from ta_numpy import load_ta
+
+# Raw columns the default strategies read, besides Close and Volume. Funding rates are
+# GetFundingFee's hourly percentages (negative: that side pays); open interest is in USD.
+FUNDING_COLUMNS = ("Funding_Long", "Funding_Short")
+OPEN_INTEREST_COLUMNS = ("OI_Long", "OI_Short")
+
+
+# Named indicator and signal series over shared price arrays, declared once and computed together.
+#
+# An indicator is a TA function, looked up by name on the TA backend (TA-Lib, or ta_numpy without it),
+# applied to raw columns or other series. A signal is a plain array function of registered series
+# returning 1 long, -1 short, 0 neutral. compute() resolves only what the requested names need and
+# calls each distinct (function, inputs, params) once, so strategies that share an RSI or an EMA, or
+# the three BBANDS outputs, reuse one array. Columns may be 1-D or (bars x markets), and a column named
+# after a registered series (e.g. a streamed RSI) is used as that series instead of computing it.
+class SignalRegistry:
+
+    def __init__(self, ta=None):
+        self.ta = ta if ta is not None else load_ta()
+        self.series = {}  # name -> (function, inputs, params, output, is_indicator)
+
+    # `output` picks one result of a multi-output function, e.g. 0/1/2 for BBANDS upper/middle/lower
+    def indicator(self, name, function, inputs=("Close",), output=None, **params):
+        self.series[name] = (function, tuple(inputs), params, output, True)
+        return self
+
+    def signal(self, name, function, inputs, **params):
+        self.series[name] = (function, tuple(inputs), params, None, False)
+        return self
+
+    # Raw columns that computing `names` reads, stopping at the series in `provided`
+    def columns(self, names=None, provided=()):
+        needed = set()
+        pending = list(self.series if names is None else names)
+        seen = set()
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            if name in self.series and name not in provided:
+                pending.extend(self.series[name][1])
+            else:
+                needed.add(name)
+        return needed
+
+    # {name: array} for `names` (default: everything registered) and the series they were built from
+    def compute(self, columns, names=None):
+        results = {}
+        calls = {}
+        for name in (self.series if names is None else names):
+            self._resolve(name, columns, results, calls)
+        return results
+
+    def _resolve(self, name, columns, results, calls):
+        if name in results:
+            return results[name]
+        if name in columns:
+            results[name] = np.asarray(columns[name], dtype=np.float64)
+            return results[name]
+        if name not in self.series:
+            raise KeyError(f"Series {name!r} is neither registered nor a provided column")
+
+        function, inputs, params, output, is_indicator = self.series[name]
+        arrays = [self._resolve(source, columns, results, calls) for source in inputs]
+        if is_indicator:
+            key = (function, inputs, tuple(sorted(params.items())))
+            if key not in calls:
+                calls[key] = self._call(function, arrays, params)
+            value = calls[key] if output is None else calls[key][output]
+        else:
+            value = function(*arrays, **params)
+        results[name] = value
+        return value
+
+    def _call(self, function, arrays, params):
+        if not isinstance(function, str):
+            return function(*arrays, **params)
+        function = getattr(self.ta, function)
+        if arrays[0].ndim == 1 or getattr(self.ta, "VECTORIZED", False):
+            return function(*(np.ascontiguousarray(array) for array in arrays), **params)
+        # TA-Lib takes one contiguous 1-D series at a time
+        per_column = [function(*(np.ascontiguousarray(array[:, column]) for array in arrays), **params)
+                      for column in range(arrays[0].shape[1])]
+        if isinstance(per_column[0], tuple):
+            return tuple(np.column_stack(outputs) for outputs in zip(*per_column))
+        return np.column_stack(per_column)
+
+
+# 1 below long_below, -1 above short_above; NaN (warm-up, missing data) is neutral
+def threshold_signal(values, long_below, short_above):
+    with np.errstate(invalid="ignore"):
+        return (values < long_below).astype(np.int8) - (values > short_above).astype(np.int8)
+
+
+# 1 while the fast series is more than `spread` (relative) above the slow one, -1 while as far below.
+# The neutral band in between is what closes a position, as next_action only closes on a 0 signal.
+def crossover_signal(fast, slow, spread=0.001):
+    with np.errstate(invalid="ignore"):
+        return (fast > slow * (1 + spread)).astype(np.int8) - (fast < slow * (1 - spread)).astype(np.int8)
+
+
+# Mean reversion on Bollinger bands: long below the lower band, short above the upper one
+def band_signal(close, upper, lower):
+    with np.errstate(invalid="ignore"):
+        return (close < lower).astype(np.int8) - (close > upper).astype(np.int8)
+
+
+# Fade the side paying funding: long when shorts pay more than `threshold` %/hour, short when longs do
+def funding_signal(funding_long, funding_short, threshold):
+    with np.errstate(invalid="ignore"):
+        return (funding_short < -threshold).astype(np.int8) - (funding_long < -threshold).astype(np.int8)
+
+
+# Fade open-interest imbalance: (long - short) / (long + short) beyond +/- threshold
+def open_interest_signal(oi_long, oi_short, threshold):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        imbalance = (oi_long - oi_short) / (oi_long + oi_short)
+        return (imbalance < -threshold).astype(np.int8) - (imbalance > threshold).astype(np.int8)
+
+
+# A direction only where every input signal agrees on it
+def consensus_signal(*signals):
+    stacked = np.stack(signals)
+    agreed = (stacked == stacked[0]).all(axis=0)
+    return np.where(agreed, stacked[0], 0).astype(np.int8)
+
+
+# The bot's strategies. "rsi" is the original RSI threshold strategy.
+def default_registry(rsi_period=14, long_threshold=41, short_threshold=60, fast_period=12, slow_period=26,
+                     crossover_spread=0.001, band_period=20, band_deviations=2.0, volume_ma_period=200,
+                     funding_threshold=0.005, open_interest_threshold=0.2, ta=None):
+    registry = SignalRegistry(ta)
+    registry.indicator("RSI", "RSI", timeperiod=rsi_period)
+    registry.indicator("Volume_MA", "SMA", inputs=("Volume",), timeperiod=volume_ma_period)
+    registry.indicator("EMA_Fast", "EMA", timeperiod=fast_period)
+    registry.indicator("EMA_Slow", "EMA", timeperiod=slow_period)
+    for output, name in enumerate(("BB_Upper", "BB_Middle", "BB_Lower")):
+        registry.indicator(name, "BBANDS", output=output, timeperiod=band_period,
+                           nbdevup=band_deviations, nbdevdn=band_deviations, matype=0)
+
+    registry.signal("rsi", threshold_signal, ("RSI",), long_below=long_threshold, short_above=short_threshold)
+    registry.signal("ema_cross", crossover_signal, ("EMA_Fast", "EMA_Slow"), spread=crossover_spread)
+    registry.signal("bollinger", band_signal, ("Close", "BB_Upper", "BB_Lower"))
+    registry.signal("funding", funding_signal, FUNDING_COLUMNS, threshold=funding_threshold)
+    registry.signal("open_interest", open_interest_signal, OPEN_INTEREST_COLUMNS, threshold=open_interest_threshold)
+    registry.signal("rsi_funding", consensus_signal, ("rsi", "funding"))
+    return registry
+
+
+# Funding and open-interest columns for candle timestamps (epoch seconds), from a StatsSnapshotStore.
+# Each bar takes the latest snapshot at or before it; bars before the first snapshot are NaN.
+def stats_columns(store, timestamps, symbol="ETH"):
+    import pandas as pd
+
+    keys = {
+        ("get_funding_apr", f"long.{symbol}"): "Funding_Long",
+        ("get_funding_apr", f"short.{symbol}"): "Funding_Short",
+        ("get_open_interest", f"long.{symbol}"): "OI_Long",
+        ("get_open_interest", f"short.{symbol}"): "OI_Short",
+    }
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    bars = pd.DataFrame({"timestamp": pd.to_datetime(timestamps, unit="s", utc=True)})
+    if len(timestamps):
+        stored = store.query(int(timestamps.min()) - 86400, int(timestamps.max()) + 1,
+                             queries=["get_funding_apr", "get_open_interest"], keys=[key for _, key in keys])
+    else:
+        stored = None
+    columns = {}
+    for (query, key), column in keys.items():
+        rows = stored[(stored["query"] == query) & (stored["key"] == key)] if stored is not None else None
+        if rows is None or rows.empty:
+            columns[column] = np.full(len(timestamps), np.nan)
+            continue
+        rows = rows[["timestamp", "value"]].astype({"timestamp": bars["timestamp"].dtype})
+        columns[column] = pd.merge_asof(bars, rows, on="timestamp")["value"].to_numpy(dtype=np.float64)
+    return columns
+
+
+if __name__ == "__main__":
+    import functools
+    import tempfile
+    import time
+    from collections import Counter
+
+    import pandas as pd
+
+    import ta_numpy
+    from backtest import run_backtest
+    from indicators import IndicatorEngine
+    from stats_store import StatsSnapshotStore
+
+    rng = np.random.default_rng(5)
+    bars = 20_000
+    closes = 2000 + np.cumsum(rng.normal(0, 5, bars))
+    columns = {
+        "Close": closes,
+        "Volume": rng.uniform(1e6, 5e6, bars),
+        "Funding_Long": rng.normal(0, 0.004, bars),
+        "Funding_Short": rng.normal(0, 0.004, bars),
+        "OI_Long": rng.uniform(1e7, 3e7, bars),
+        "OI_Short": rng.uniform(1e7, 3e7, bars),
+    }
+
+    # Every distinct TA call runs once, however many series and strategies use it
+    class CountingBackend:
+        VECTORIZED = True
+
+        def __init__(self):
+            self.calls = Counter()
+
+        def __getattr__(self, name):
+            function = getattr(ta_numpy, name)
+
+            def counted(*args, **params):
+                self.calls[name] += 1
+                return function(*args, **params)
+            return counted
+
+    backend = CountingBackend()
+    registry = default_registry(ta=backend)
+    everything = registry.compute(columns)
+    assert backend.calls == Counter({"RSI": 1, "SMA": 1, "EMA": 2, "BBANDS": 1}), backend.calls
+    print(f"All strategies from one pass: {dict(backend.calls)}")
+    assert registry.columns(["rsi_funding"]) == {"Close", "Funding_Long", "Funding_Short"}
+    assert set(registry.compute(columns, ["rsi"])) == {"Close", "RSI", "rsi"}
+    for name in ("rsi", "ema_cross", "bollinger", "funding", "open_interest", "rsi_funding"):
+        assert set(np.unique(everything[name])) <= {-1, 0, 1} and everything[name].any(), name
+    assert not (everything["rsi_funding"] & ~(everything["rsi"] == everything["funding"])).any()
+
+    # The same strategies on (bars x markets) columns, in one vectorized pass
+    markets = {name: np.column_stack((values, values[::-1], values * 1.5)) for name, values in columns.items()}
+    stacked = default_registry(ta=ta_numpy).compute(markets)
+    for market in range(3):
+        single = default_registry(ta=ta_numpy).compute({name: values[:, market] for name, values in markets.items()})
+        for name, values in single.items():
+            np.testing.assert_allclose(stacked[name][:, market], values, rtol=1e-12, equal_nan=True, err_msg=name)
+    print("(bars x markets) columns match per-market results.")
+
+    try:
+        import talib
+    except ImportError:
+        talib = None
+        print("TA-Lib is not installed; skipping the parity checks.")
+    if talib is not None:
+        with_talib = default_registry(ta=talib).compute(columns)
+        with_numpy = default_registry(ta=ta_numpy).compute(columns)
+        for name, values in with_talib.items():
+            np.testing.assert_allclose(with_numpy[name], values, rtol=1e-9, equal_nan=True, err_msg=name)
+        stacked_talib = default_registry(ta=talib).compute(markets)
+        for name, values in stacked.items():
+            np.testing.assert_allclose(values, stacked_talib[name], rtol=1e-9, equal_nan=True, err_msg=name)
+
+        candles = pd.DataFrame({"Timestamp": np.arange(bars) * 900, **columns})
+        reports = [run_backtest(candles, strategy=strategy, registry=default_registry(ta=backend))
+                   for backend in (talib, ta_numpy) for strategy in ("rsi", "bollinger")]
+        assert reports[0]["final_equity"] == reports[2]["final_equity"] and reports[0]["num_trades"] > 0
+        assert reports[1]["final_equity"] == reports[3]["final_equity"] and reports[1]["num_trades"] > 0
+        print("NumPy and TA-Lib backends agree on every series, 2-D columns and backtests.")
+
+        timings = {}
+        for label, backend in (("TA-Lib", talib), ("NumPy", ta_numpy)):
+            started = time.perf_counter()
+            default_registry(ta=backend).compute(columns)
+            timings[label] = (time.perf_counter() - started) * 1000
+        print(f"All strategies over {bars} bars: " + ", ".join(f"{label} {ms:.1f}ms" for label, ms in timings.items()))
+
+    # Live engine, default strategy: Position comes from the streamed RSI with no TA call per bar, and
+    # matches the batch signal over the full history bar for bar
+    backend = CountingBackend()
+    engine = IndicatorEngine(capacity=200, registry=default_registry(ta=backend), strategy="rsi")
+    assert engine.per_bar
+    live = [engine.update(i * 900, closes[i], columns["Volume"][i])["Position"] for i in range(5000)]
+    assert not backend.calls, backend.calls
+    assert (np.array(live) == everything["rsi"][:5000]).all()
+
+    # Live engine, other strategies: computed over the buffered window with the streamed RSI, so they give
+    # the batch result for the same bars
+    funding = {}
+    engine = IndicatorEngine(capacity=200, registry=default_registry(ta=ta_numpy), strategy="rsi_funding",
+                             sources={name: functools.partial(funding.get, name) for name in FUNDING_COLUMNS})
+    history = pd.DataFrame({"Timestamp": np.arange(300) * 900, "Close": closes[:300], "Volume": columns["Volume"][:300],
+                            "Funding_Long": columns["Funding_Long"][:300]})
+    engine.seed(history)
+    assert np.isnan(engine.sources["Funding_Short"][1].to_array()).all()
+    live = []
+    for i in range(300, 1300):
+        funding["Funding_Long"], funding["Funding_Short"] = columns["Funding_Long"][i], columns["Funding_Short"][i]
+        live.append(engine.update(i * 900, closes[i], columns["Volume"][i])["Position"])
+    assert not engine.per_bar
+    assert (np.array(live) == everything["rsi_funding"][300:1300]).all()
+    print("Live engine positions match the batch signals bar for bar.")
+    try:
+        IndicatorEngine(registry=default_registry(ta=ta_numpy), strategy="funding")
+    except ValueError as e:
+        print(f"Missing sources are rejected: {e}")
+    else:
+        raise AssertionError("expected a ValueError for a strategy without its sources")
+
+    # Funding/open-interest history from stats snapshots, aligned to candle timestamps
+    store = StatsSnapshotStore(tempfile.mkdtemp(prefix="signal-stats-"))
+    day = 1_767_225_600
+    for hour in range(24):
+        store.add(day + hour * 3600, {"get_funding_apr": {"long": {"ETH": -0.01 * hour}, "short": {"ETH": 0.01}},
+                                      "get_open_interest": {"long": {"ETH": 2e7}, "short": {"ETH": 1e7 + hour}}})
+    store.flush()
+    aligned = stats_columns(store, day - 900 + np.arange(8) * 900)
+    assert np.isnan(aligned["Funding_Long"][0]) and list(aligned["Funding_Long"][1:5]) == [0.0] * 4
+    assert list(aligned["Funding_Long"][5:]) == [-0.01] * 3 and list(aligned["OI_Short"][5:]) == [1e7 + 1] * 3
+    signal = default_registry().compute(aligned, ["funding", "open_interest"])
+    print(f"Stats-aligned signals: funding {signal['funding'].tolist()}, open interest {signal['open_interest'].tolist()}")
@@ -0,0 +1,330 @@
+import logging
+import math
+import os
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("query", pa.string()),
+    ("key", pa.string()),
+    ("value", pa.float64()),
+    ("text", pa.string()),
+])
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+ERROR_KEY = "__error__"
+
+
+# (dotted key, leaf) pairs of a getter's nested dict/list output
+def _leaves(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _leaves(item, f"{prefix}{key}.")
+    elif isinstance(value, (list, tuple)):
+        for i, item in enumerate(value):
+            yield from _leaves(item, f"{prefix}{i}.")
+    else:
+        yield prefix[:-1], value
+
+
+# One get_all_stats() snapshot as long-format rows: numbers go to `value`, anything else to `text`
+def flatten_snapshot(results, errors=None):
+    rows = []
+    for query, result in results.items():
+        for key, leaf in _leaves(result):
+            if leaf is None:
+                continue
+            if isinstance(leaf, (bool, int, float)):
+                rows.append((query, key, float(leaf), None))
+            else:
+                rows.append((query, key, math.nan, str(leaf)))
+    for query, error in (errors or {}).items():
+        rows.append((query, ERROR_KEY, math.nan, str(error)))
+    return rows
+
+
+def _timestamp_ms(value):
+    import pandas as pd
+
+    if isinstance(value, (int, float)):
+        return int(value * 1000)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return int(timestamp.timestamp() * 1000)
+
+
+def _date(timestamp_ms):
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp_ms / 1000))
+
+
+# Stats snapshots in a date-partitioned, zstd-compressed Parquet dataset (<root>/date=YYYY-MM-DD/).
+#
+# Every getter's output for one timestamp is flattened into rows of one snapshot and buffered in
+# memory. A background thread writes the buffer out every flush_interval seconds (sooner once
+# max_rows are waiting), one file per day touched, so a collector running every minute adds a
+# handful of files a day instead of one per getter per run. query() prunes by date partition and
+# filters on timestamp, query and key inside the files.
+class StatsSnapshotStore:
+
+    def __init__(self, root="data/stats", flush_interval=600, max_rows=200_000, compression="zstd"):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.compression = compression
+        self._buffer = {}  # date -> column lists
+        self._buffered_rows = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, timestamp, results, errors=None):
+        rows = flatten_snapshot(results, errors)
+        timestamp_ms = _timestamp_ms(timestamp)
+        with self._lock:
+            columns = self._buffer.setdefault(_date(timestamp_ms), {name: [] for name in SCHEMA.names})
+            columns["timestamp"].extend([timestamp_ms] * len(rows))
+            for name, values in zip(("query", "key", "value", "text"), zip(*rows)):
+                columns[name].extend(values)
+            self._buffered_rows += len(rows)
+            full = self._buffered_rows >= self.max_rows
+        if full:
+            self._wake.set()
+        return len(rows)
+
+    # Write buffered snapshots out; returns the files written
+    def flush(self):
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+            self._buffered_rows = 0
+        paths = []
+        for date, columns in sorted(buffer.items()):
+            table = pa.Table.from_pydict(columns, schema=SCHEMA)
+            directory = os.path.join(self.root, f"date={date}")
+            os.makedirs(directory, exist_ok=True)
+            first, last = columns["timestamp"][0], columns["timestamp"][-1]
+            path = os.path.join(directory, f"part-{first}-{last}-{os.getpid()}.parquet")
+            pq.write_table(table, path + ".tmp", compression=self.compression)
+            os.replace(path + ".tmp", path)  # Readers never see a half-written file
+            paths.append(path)
+        if paths:
+            logger.debug("Flushed %s stats rows to %s files.", sum(len(columns["timestamp"]) for columns in buffer.values()), len(paths))
+        return paths
+
+    # Merge one day's files into a single file, e.g. once the day is over
+    def compact(self, date):
+        directory = os.path.join(self.root, f"date={date}")
+        parts = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".parquet"))
+        if len(parts) < 2:
+            return None
+        table = pa.concat_tables([pq.read_table(path, schema=SCHEMA) for path in parts]).sort_by("timestamp")
+        path = os.path.join(directory, f"part-{table['timestamp'][0].value}-{table['timestamp'][-1].value}-compacted.parquet")
+        pq.write_table(table, path + ".tmp", compression=self.compression)
+        os.replace(path + ".tmp", path)
+        for part in parts:
+            if part != path:
+                os.remove(part)
+        return path
+
+    def dataset(self):
+        return ds.dataset(self.root, schema=SCHEMA.append(pa.field("date", pa.string())), format="parquet",
+                          partitioning=PARTITIONING)
+
+    # Flushed rows between start (inclusive) and end (exclusive), as a DataFrame. start/end are epoch
+    # seconds or anything pandas parses as a time. wide=True pivots to one column per query.key.
+    def query(self, start=None, end=None, queries=None, keys=None, wide=False):
+        import pandas as pd
+
+        if not os.path.isdir(self.root):
+            frame = SCHEMA.empty_table().to_pandas()
+        else:
+            # Error rows only come back when asked for by key
+            condition = ds.field("key").isin(list(keys)) if keys is not None else ds.field("key") != ERROR_KEY
+            if start is not None:
+                start_ms = _timestamp_ms(start)
+                condition &= (ds.field("date") >= _date(start_ms)) & (ds.field("timestamp") >= pd.Timestamp(start_ms, unit="ms", tz="UTC"))
+            if end is not None:
+                end_ms = _timestamp_ms(end)
+                condition &= (ds.field("date") <= _date(end_ms)) & (ds.field("timestamp") < pd.Timestamp(end_ms, unit="ms", tz="UTC"))
+            if queries is not None:
+                condition &= ds.field("query").isin(list(queries))
+            frame = self.dataset().to_table(filter=condition, columns=SCHEMA.names).to_pandas()
+            frame = frame.sort_values("timestamp", kind="stable", ignore_index=True)
+        if wide:
+            frame = frame.assign(column=frame["query"] + "." + frame["key"]).pivot_table(
+                index="timestamp", columns="column", values="value", aggfunc="last")
+        return frame
+
+    # Failed queries recorded alongside the snapshots
+    def errors(self, start=None, end=None):
+        return self.query(start, end, keys=[ERROR_KEY])[["timestamp", "query", "text"]]
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing stats snapshots: %s", e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stats-store", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GMX stats snapshots in a partitioned Parquet store")
+    parser.add_argument("--root", default="data/stats")
+    commands = parser.add_subparsers(dest="command", required=True)
+    collect = commands.add_parser("collect", help="Run get_all_stats() every --interval seconds into the store")
+    collect.add_argument("--interval", type=float, default=60)
+    collect.add_argument("--flush-interval", type=float, default=600)
+    query = commands.add_parser("query", help="Print stored rows in a time range")
+    query.add_argument("--start")
+    query.add_argument("--end")
+    query.add_argument("--queries", help="Comma-separated getter names, e.g. get_borrow_apr,get_funding_apr")
+    query.add_argument("--wide", action="store_true", help="One column per query.key")
+    commands.add_parser("check", help="Collect from the stubbed SDK and check what reads back")
+    args = parser.parse_args()
+
+    if args.command == "collect":
+        from dotenv import load_dotenv
+        from gmx_python_sdk.scripts.v2.gmx_utils import ConfigManager
+
+        from get_gmx_stats import GetGMXv2Stats
+        from metrics import configure_logging
+
+        load_dotenv()
+        configure_logging()
+        config = ConfigManager("arbitrum")
+        config.set_config(filepath="config.yaml")
+        store = StatsSnapshotStore(args.root, flush_interval=args.flush_interval)
+        store.start()
+        stats = GetGMXv2Stats(config, to_json=False, to_csv=False, snapshot_store=store)
+        try:
+            while True:
+                started = time.monotonic()
+                stats.get_all_stats()
+                time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            logger.info("Stats collector stopped.")
+        finally:
+            store.stop()
+
+    elif args.command == "query":
+        store = StatsSnapshotStore(args.root)
+        frame = store.query(args.start, args.end, queries=args.queries.split(",") if args.queries else None, wide=args.wide)
+        print(frame.to_string())
+
+    else:
+        import tempfile
+
+        import benchmarks
+
+        # GetGMXv2Stats against the stubbed SDK, with HTTP answered from fixtures
+        benchmarks.prepare_environment(benchmarks.FixtureAdapter(benchmarks.make_oracle_payload()))
+        from gmx_python_sdk.scripts.v2.gmx_utils import ConfigManager
+
+        from get_gmx_stats import GetGMXv2Stats
+
+        config = ConfigManager("arbitrum")
+        config.set_config()
+        store = StatsSnapshotStore(tempfile.mkdtemp(prefix="stats-"), flush_interval=3600)
+        stats = GetGMXv2Stats(config, to_json=True, to_csv=True, snapshot_store=store)
+        assert not stats.to_json and not stats.to_csv
+        # Values already in the TTL cache are fetched again, so the snapshot's timestamp holds for all of them
+        stats.get_borrow_apr()
+        snapshot = stats.get_all_stats()
+        assert not snapshot["errors"], snapshot["errors"]
+        assert stats.cache_stats()["get_borrow_apr"] == {"hits": 0, "misses": 2, "hit_rate": 0.0}
+        assert len(store.flush()) == 1
+        stored = store.query(queries=["get_borrow_apr"])
+        assert stored.set_index("key")["value"]["long.ETH"] == snapshot["results"]["get_borrow_apr"]["long"]["ETH"]
+        stats.get_all_stats(queries=["get_borrow_apr"], fresh=False)
+        assert stats.cache_stats()["get_borrow_apr"]["hits"] == 1
+        print(f"get_all_stats(): {len(store.query())} rows from {len(snapshot['results'])} getters in one snapshot.")
+
+        # Concurrency: no more than max_concurrency getters in flight, a slow one timed out without holding up
+        # the rest, a failing one reported, and a non-positive limit rejected up front
+        stats = GetGMXv2Stats(config, to_json=False, to_csv=False)
+        in_flight = {"now": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def stub_query(name, fresh=False):
+            with lock:
+                in_flight["now"] += 1
+                in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            try:
+                time.sleep(1.0 if name == "get_glv_stats" else 0.05)
+                if name == "get_gm_price":
+                    raise RuntimeError("stub failure")
+                return {"query": name}
+            finally:
+                with lock:
+                    in_flight["now"] -= 1
+
+        stats._run_query = stub_query
+        started = time.monotonic()
+        concurrent = stats.get_all_stats(max_concurrency=3, timeout=0.3)
+        elapsed = time.monotonic() - started
+        assert in_flight["peak"] == 3, in_flight
+        assert set(concurrent["errors"]) == {"get_gm_price", "get_glv_stats"}, concurrent["errors"]
+        assert isinstance(concurrent["errors"]["get_glv_stats"], TimeoutError)
+        assert len(concurrent["results"]) == len(GetGMXv2Stats.STATS_QUERIES) - 2
+        assert elapsed < 0.9, f"the timed-out getter held up the snapshot ({elapsed:.2f}s)"
+        assert len(stats.get_all_stats(queries=["get_borrow_apr"], max_concurrency=16)["results"]) == 1
+        for bad in ({"max_concurrency": 0}, {"max_concurrency": -1}, {"timeout": 0}):
+            try:
+                stats.get_all_stats(**bad)
+            except ValueError as e:
+                assert "must be" in str(e)
+            else:
+                raise AssertionError(f"get_all_stats accepted {bad}")
+        print(f"get_all_stats(max_concurrency=3, timeout=0.3): {in_flight['peak']} in flight at most, "
+              f"1 timeout, 1 failure, {elapsed:.2f}s.")
+
+        # Two days of one-minute snapshots, flushed hourly, then one day compacted
+        store = StatsSnapshotStore(tempfile.mkdtemp(prefix="stats-"))
+        results = {name: result for name, result in snapshot["results"].items() if name != "get_oracle_prices"}
+        day = 1_767_225_600  # 2026-01-01T00:00:00Z
+        for minute in range(2 * 1440):
+            store.add(day + 60 * minute, results, {"get_glv_stats": TimeoutError("stub")} if minute == 30 else None)
+            if minute % 60 == 59:
+                store.flush()
+        files = sum(len(names) for _, _, names in os.walk(store.root))
+        store.compact("2026-01-01")
+        print(f"2880 snapshots: {files} files after hourly flushes, "
+              f"{sum(len(names) for _, _, names in os.walk(store.root))} after compacting the first day "
+              f"(per-getter CSV+JSON would be {2880 * len(results) * 2}).")
+
+        rows_per_snapshot = len(flatten_snapshot(results))
+        started = time.perf_counter()
+        window = store.query("2026-01-01T23:00", "2026-01-02T05:00")
+        elapsed = time.perf_counter() - started
+        assert len(window) == 360 * rows_per_snapshot
+        assert window["timestamp"].min().isoformat() == "2026-01-01T23:00:00+00:00"
+        assert window["timestamp"].max().isoformat() == "2026-01-02T04:59:00+00:00"
+        wide = store.query("2026-01-01T23:00", "2026-01-02T05:00", queries=["get_funding_apr"], wide=True)
+        assert wide.shape == (360, sum(1 for row in flatten_snapshot({"x": results["get_funding_apr"]}) if row[3] is None))
+        errors = store.errors()
+        assert list(errors["query"]) == ["get_glv_stats"] and "stub" in errors["text"].iloc[0]
+        print(f"6h range query: {len(window)} rows in {elapsed * 1000:.1f}ms; wide funding APR frame {wide.shape}.")
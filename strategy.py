@@ -0,0 +1,30 @@
+# Position state machine shared by the live loop, the async scheduler and the backtester
+
+OPEN_LONG = "open_long"
+OPEN_SHORT = "open_short"
+CLOSE_LONG = "close_long"
+CLOSE_SHORT = "close_short"
+
+
+# Decide what to do given the signal's Position (1 long, -1 short, 0 neutral) and the current position
+def next_action(signal_position, current_position):
+    if signal_position == 1 and current_position == 0:
+        return OPEN_LONG
+    if signal_position == -1 and current_position == 0:
+        return OPEN_SHORT
+    if current_position == 1 and signal_position == 0:
+        return CLOSE_LONG
+    if current_position == -1 and signal_position == 0:
+        return CLOSE_SHORT
+    return None
+
+
+# Position held after an action has been carried out
+def position_after(action, current_position):
+    if action == OPEN_LONG:
+        return 1
+    if action == OPEN_SHORT:
+        return -1
+    if action in (CLOSE_LONG, CLOSE_SHORT):
+        return 0
+    return current_position
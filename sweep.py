@@ -0,0 +1,169 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest import compute_positions, compute_signals, load_candles, simulate
+from ta_numpy import load_ta
+
+# Worker-process globals, filled once per process by _init_worker
+_closes = None
+_rsi = None
+_timestamps = None
+_shm = None
+
+
+def _init_worker(shm_name, length, rsi_periods):
+    global _closes, _rsi, _timestamps, _shm
+    # Attach to the parent's close prices and RSI series (one row each) without copying them into the worker
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    series = np.ndarray((1 + len(rsi_periods), length), dtype=np.float64, buffer=_shm.buf)
+    _closes = series[0]
+    _rsi = dict(zip(rsi_periods, series[1:]))
+    _timestamps = np.arange(length)
+
+
+# Evaluate threshold/sizing combinations that share one RSI period against the parent's RSI series
+def _run_period_group(rsi_period, combos, simulate_args):
+    rsi = _rsi[rsi_period]
+    results = []
+    positions_cache = {}
+    for combo in combos:
+        thresholds = (combo["long_threshold"], combo["short_threshold"])
+        positions = positions_cache.get(thresholds)
+        if positions is None:
+            positions = compute_positions(compute_signals(rsi, *thresholds))
+            positions_cache[thresholds] = positions
+        report = simulate(
+            _timestamps, _closes, positions,
+            leverage=combo["leverage"],
+            open_percentage=combo["open_percentage"],
+            close_percentage=combo["close_percentage"],
+            **simulate_args
+        )
+        results.append({
+            **combo,
+            "final_equity": report["final_equity"],
+            "total_return_pct": report["total_return_pct"],
+            "max_drawdown_pct": report["max_drawdown_pct"],
+            "num_trades": report["num_trades"],
+            "win_rate_pct": report["win_rate_pct"],
+        })
+    return results
+
+
+def _combo_key(combo):
+    return (combo["rsi_period"], combo["long_threshold"], combo["short_threshold"],
+            combo["leverage"], combo["open_percentage"], combo["close_percentage"])
+
+
+# Expand a parameter grid into a list of combination dicts
+def build_grid(rsi_periods=(14,), long_thresholds=(41,), short_thresholds=(60,),
+               leverages=(5,), open_percentages=(0.1,), close_percentages=(0.1,)):
+    grid = []
+    for values in itertools.product(rsi_periods, long_thresholds, short_thresholds,
+                                    leverages, open_percentages, close_percentages):
+        rsi_period, long_threshold, short_threshold, leverage, open_percentage, close_percentage = values
+        if long_threshold >= short_threshold:
+            continue
+        grid.append({
+            "rsi_period": rsi_period,
+            "long_threshold": long_threshold,
+            "short_threshold": short_threshold,
+            "leverage": leverage,
+            "open_percentage": open_percentage,
+            "close_percentage": close_percentage,
+        })
+    return grid
+
+
+# Combinations already written to a results file by an earlier (possibly interrupted) sweep
+def load_completed(results_path):
+    completed = set()
+    if not os.path.exists(results_path):
+        return completed
+    with open(results_path) as f:
+        for line in f:
+            try:
+                completed.add(_combo_key(json.loads(line)))
+            except (ValueError, KeyError):
+                continue  # A partially written last line from an interrupted run
+    return completed
+
+
+# Run a parameter sweep across all cores, streaming one JSON line per combination to results_path
+def run_sweep(closes, grid, results_path, max_workers=None, **simulate_args):
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    completed = load_completed(results_path)
+    remaining = [combo for combo in grid if _combo_key(combo) not in completed]
+    print(f"Sweep: {len(grid)} combinations, {len(completed)} already done, {len(remaining)} to run.")
+    if not remaining:
+        return 0
+
+    groups = {}
+    for combo in remaining:
+        groups.setdefault(combo["rsi_period"], []).append(combo)
+
+    # RSI is computed once per period here; chunks of a period's group share the series
+    rsi_periods = list(groups)
+    shm = shared_memory.SharedMemory(create=True, size=closes.nbytes * (1 + len(rsi_periods)))
+    try:
+        series = np.ndarray((1 + len(rsi_periods), len(closes)), dtype=np.float64, buffer=shm.buf)
+        series[0] = closes
+        ta = load_ta()
+        for row, rsi_period in enumerate(rsi_periods, start=1):
+            series[row] = ta.RSI(closes, timeperiod=rsi_period)
+        del series  # The buffer cannot be released while a view of it is alive
+        written = 0
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(shm.name, len(closes), rsi_periods)) as executor, \
+                open(results_path, "a") as out:
+            futures = []
+            # Split large period groups so every core gets work even with few distinct periods
+            chunk_size = max(1, len(remaining) // ((max_workers or os.cpu_count()) * 4))
+            for rsi_period, combos in groups.items():
+                for i in range(0, len(combos), chunk_size):
+                    futures.append(executor.submit(_run_period_group, rsi_period, combos[i:i + chunk_size], simulate_args))
+            for future in as_completed(futures):
+                for result in future.result():
+                    out.write(json.dumps(result) + "\n")
+                    written += 1
+                out.flush()
+                print(f"Sweep progress: {written}/{len(remaining)} ({time.perf_counter() - started:.1f}s)")
+        return written
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _parse_list(value, cast=float):
+    return [cast(item) for item in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grid search RSI strategy parameters over local candles")
+    parser.add_argument("path", help="CSV or Parquet file with a Close column")
+    parser.add_argument("--results", default="sweep_results.jsonl", help="JSONL output; reruns resume from it")
+    parser.add_argument("--rsi-periods", default="7,14,21", type=lambda v: _parse_list(v, int))
+    parser.add_argument("--long-thresholds", default="25,30,35,41", type=_parse_list)
+    parser.add_argument("--short-thresholds", default="60,65,70,75", type=_parse_list)
+    parser.add_argument("--leverages", default="2,5", type=_parse_list)
+    parser.add_argument("--open-percentages", default="0.1", type=_parse_list)
+    parser.add_argument("--close-percentages", default="0.1", type=_parse_list)
+    parser.add_argument("--fee-rate", type=float, default=0.0006)
+    parser.add_argument("--slippage", type=float, default=0.0005)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    candles = load_candles(args.path)
+    grid = build_grid(args.rsi_periods, args.long_thresholds, args.short_thresholds,
+                      args.leverages, args.open_percentages, args.close_percentages)
+    run_sweep(candles["Close"].to_numpy(), grid, args.results, max_workers=args.workers,
+              fee_rate=args.fee_rate, slippage=args.slippage)
+    print(f"Results written to {args.results}")